@@ -7,14 +7,23 @@ Exports:
 Implementations:
   - Windows: use pycaw (if installed)
   - macOS: use AppleScript via `osascript`
-  - Linux: try `amixer` if available
+  - Linux: ALSA mixer opened once through libasound (ctypes), falling back
+    to the `amixer` command line tool
   - Fallback: no-op with logging
+
+On Linux the mixer backend can be replaced with `set_linux_mixer()`, e.g. to
+substitute a fake mixer in tests.
 """
 from typing import Union
 import sys
 import subprocess
 import shutil
 import logging
+import re
+import ctypes
+import ctypes.util
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +37,7 @@ def _to_int(value: Union[int, float]) -> int:
 _HAS_PYCAW = False
 try:
     if sys.platform.startswith("win"):
+        import comtypes  # type: ignore
         from comtypes import CLSCTX_ALL  # type: ignore
         from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume  # type: ignore
         _HAS_PYCAW = True
@@ -35,15 +45,135 @@ except Exception:
     _HAS_PYCAW = False
 
 
+_com_thread_state = threading.local()
+
+
+def _pycaw_get_speakers():
+    # COM must be initialised on every thread that talks to the endpoint (e.g. the volume actuator)
+    if not getattr(_com_thread_state, "initialized", False):
+        comtypes.CoInitialize()
+        _com_thread_state.initialized = True
+    return AudioUtilities.GetSpeakers()
+
+
+def _pycaw_device_id(device):
+    # Older pycaw returns the raw IMMDevice, newer versions wrap it in AudioDevice
+    if hasattr(device, "GetId"):
+        return device.GetId()
+    return getattr(device, "id", None)
+
+
+def _pycaw_activate(device):
+    if hasattr(device, "EndpointVolume"):
+        return device.EndpointVolume
+    interface = device.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
+    return interface.QueryInterface(IAudioEndpointVolume)
+
+
+class _WindowsEndpointCache:
+    """Caches the IAudioEndpointVolume interface instead of re-activating it on every call.
+
+    The interface is rebuilt when a call through it fails, or when the default
+    output device id changed (checked at most every `device_check_interval`
+    seconds). Interfaces are kept per thread because COM objects must not be
+    shared across apartments. `get_speakers`, `device_id` and `activate` can be
+    replaced by fakes, so the cache logic also runs without COM.
+    """
+
+    def __init__(self, get_speakers=None, device_id=None, activate=None, device_check_interval: float = 2.0):
+        self.get_speakers = get_speakers or _pycaw_get_speakers
+        self.device_id = device_id or _pycaw_device_id
+        self.activate = activate or _pycaw_activate
+        self.device_check_interval = device_check_interval
+        self._local = threading.local()
+        self.calls = 0
+        self.hits = 0
+        self.activations = 0
+        self.invalidations = 0
+        self.failures = 0
+        self.activate_seconds = 0.0
+        self.call_seconds = 0.0
+
+    def invalidate(self):
+        if getattr(self._local, "interface", None) is not None:
+            self.invalidations += 1
+        self._local.interface = None
+
+    def _interface(self):
+        local = self._local
+        now = time.monotonic()
+        interface = getattr(local, "interface", None)
+        if interface is not None and now - local.checked < self.device_check_interval:
+            self.hits += 1
+            return interface
+
+        start = time.perf_counter()
+        device = self.get_speakers()
+        current_id = self.device_id(device)
+        if interface is not None and current_id == local.device_id:
+            local.checked = now
+            self.hits += 1
+            return interface
+        if interface is not None:
+            self.invalidations += 1  # default device changed
+        interface = self.activate(device)
+        self.activations += 1
+        self.activate_seconds += time.perf_counter() - start
+        local.interface, local.device_id, local.checked = interface, current_id, now
+        return interface
+
+    def call(self, fn):
+        """Run fn(interface), rebuilding the interface and retrying once if the call fails."""
+        self.calls += 1
+        start = time.perf_counter()
+        try:
+            for attempt in range(2):
+                try:
+                    return fn(self._interface())
+                except Exception:
+                    self.failures += 1
+                    self.invalidate()
+                    if attempt:
+                        raise
+        finally:
+            self.call_seconds += time.perf_counter() - start
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hits": self.hits,
+            "activations": self.activations,
+            "invalidations": self.invalidations,
+            "failures": self.failures,
+            "activate_seconds": self.activate_seconds,
+            "call_seconds": self.call_seconds,
+        }
+
+
+_windows_endpoint = None
+
+
+def set_windows_endpoint_cache(cache):
+    """Replace the Windows endpoint cache (e.g. with one built on fake COM objects). None rebuilds the default."""
+    global _windows_endpoint
+    _windows_endpoint = cache
+
+
+def _get_windows_endpoint():
+    global _windows_endpoint
+    if _windows_endpoint is None:
+        _windows_endpoint = _WindowsEndpointCache()
+    return _windows_endpoint
+
+
 def _windows_get_set_volume(percent: Union[int, float] = None):
     # Use pycaw to get/set master volume as scalar (0.0 - 1.0)
-    devices = AudioUtilities.GetSpeakers()
-    interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
-    volumeInterface = interface.QueryInterface(IAudioEndpointVolume)
+    endpoint = _get_windows_endpoint()
     if percent is None:
-        return int(round(volumeInterface.GetMasterVolumeLevelScalar() * 100))
+        return endpoint.call(lambda volume: int(round(volume.GetMasterVolumeLevelScalar() * 100)))
     else:
-        volumeInterface.SetMasterVolumeLevelScalar(max(0.0, min(1.0, float(percent) / 100.0)), None)
+        scalar = max(0.0, min(1.0, float(percent) / 100.0))
+        endpoint.call(lambda volume: volume.SetMasterVolumeLevelScalar(scalar, None))
         return None
 
 
@@ -65,32 +195,200 @@ def _darwin_set_volume(percent: Union[int, float]):
         logger.debug("osascript set volume failed: %s", e)
 
 
-def _linux_get_volume():
-    # Try amixer
-    amixer = shutil.which("amixer")
-    if not amixer:
+class _PollFd(ctypes.Structure):
+    _fields_ = [("fd", ctypes.c_int), ("events", ctypes.c_short), ("revents", ctypes.c_short)]
+
+
+class _AlsaMixer:
+    """Playback element of an ALSA mixer, opened once and kept open via libasound."""
+
+    def __init__(self, card: str = "default", element: str = "Master"):
+        libname = ctypes.util.find_library("asound")
+        if not libname:
+            raise OSError("libasound not found")
+        lib = ctypes.CDLL(libname)
+        lib.snd_mixer_find_selem.restype = ctypes.c_void_p
+        lib.snd_mixer_find_selem.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        lib.snd_mixer_attach.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+        for name in ("snd_mixer_load", "snd_mixer_handle_events", "snd_mixer_close"):
+            getattr(lib, name).argtypes = [ctypes.c_void_p]
+        lib.snd_mixer_selem_register.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+        lib.snd_mixer_selem_id_set_index.argtypes = [ctypes.c_void_p, ctypes.c_uint]
+        lib.snd_mixer_selem_id_set_name.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+        lib.snd_mixer_selem_id_free.argtypes = [ctypes.c_void_p]
+        lib.snd_mixer_selem_get_playback_volume_range.argtypes = [
+            ctypes.c_void_p, ctypes.POINTER(ctypes.c_long), ctypes.POINTER(ctypes.c_long)]
+        lib.snd_mixer_selem_get_playback_volume.argtypes = [
+            ctypes.c_void_p, ctypes.c_int, ctypes.POINTER(ctypes.c_long)]
+        lib.snd_mixer_selem_set_playback_volume_all.argtypes = [ctypes.c_void_p, ctypes.c_long]
+        lib.snd_mixer_poll_descriptors_count.argtypes = [ctypes.c_void_p]
+        lib.snd_mixer_poll_descriptors.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint]
+        self._lib = lib
+
+        handle = ctypes.c_void_p()
+        if lib.snd_mixer_open(ctypes.byref(handle), 0) < 0:
+            raise OSError("snd_mixer_open failed")
+        self._handle = handle
+        try:
+            if lib.snd_mixer_attach(handle, card.encode()) < 0:
+                raise OSError(f"snd_mixer_attach({card!r}) failed")
+            if lib.snd_mixer_selem_register(handle, None, None) < 0:
+                raise OSError("snd_mixer_selem_register failed")
+            if lib.snd_mixer_load(handle) < 0:
+                raise OSError("snd_mixer_load failed")
+
+            sid = ctypes.c_void_p()
+            if lib.snd_mixer_selem_id_malloc(ctypes.byref(sid)) < 0:
+                raise OSError("snd_mixer_selem_id_malloc failed")
+            lib.snd_mixer_selem_id_set_index(sid, 0)
+            lib.snd_mixer_selem_id_set_name(sid, element.encode())
+            self._elem = lib.snd_mixer_find_selem(handle, sid)
+            lib.snd_mixer_selem_id_free(sid)
+            if not self._elem:
+                raise OSError(f"mixer element {element!r} not found on {card!r}")
+
+            vmin, vmax = ctypes.c_long(), ctypes.c_long()
+            lib.snd_mixer_selem_get_playback_volume_range(self._elem, ctypes.byref(vmin), ctypes.byref(vmax))
+            self._min, self._max = vmin.value, vmax.value
+            if self._max <= self._min:
+                raise OSError(f"mixer element {element!r} has no playback volume range")
+        except Exception:
+            self.close()
+            raise
+        self._value = ctypes.c_long()
+        self.card = card
+        self.element = element
+
+    def get_volume(self) -> int:
+        # Pick up changes made by other programs since the last call (non-blocking)
+        self._lib.snd_mixer_handle_events(self._handle)
+        self._lib.snd_mixer_selem_get_playback_volume(self._elem, 0, ctypes.byref(self._value))
+        # Same linear mapping as `amixer sget`
+        return int(round((self._value.value - self._min) * 100.0 / (self._max - self._min)))
+
+    def set_volume(self, percent: Union[int, float]):
+        p = max(0, min(100, _to_int(percent)))
+        raw = self._min + int(round(p * (self._max - self._min) / 100.0))
+        self._lib.snd_mixer_selem_set_playback_volume_all(self._elem, raw)
+
+    def poll_descriptors(self):
+        """Return [(fd, events)] that become ready when the mixer changes (for select.poll)."""
+        count = self._lib.snd_mixer_poll_descriptors_count(self._handle)
+        if count <= 0:
+            return []
+        fds = (_PollFd * count)()
+        filled = self._lib.snd_mixer_poll_descriptors(self._handle, fds, count)
+        return [(fds[i].fd, fds[i].events) for i in range(max(0, filled))]
+
+    def close(self):
+        if self._handle:
+            self._lib.snd_mixer_close(self._handle)
+            self._handle = None
+
+
+class _AmixerMixer:
+    """Fallback backend running the `amixer` command line tool (resolved once)."""
+
+    def __init__(self, element: str = "Master"):
+        self.element = element
+        self.amixer = shutil.which("amixer")
+
+    def get_volume(self) -> int:
+        if not self.amixer:
+            return 0
+        try:
+            out = subprocess.check_output([self.amixer, "sget", self.element]).decode()
+            # parse like: [66%]
+            m = re.search(r"(\d{1,3})%", out)
+            if m:
+                return int(m.group(1))
+        except Exception:
+            pass
         return 0
+
+    def set_volume(self, percent: Union[int, float]):
+        if not self.amixer:
+            return
+        p = max(0, min(100, _to_int(percent)))
+        try:
+            subprocess.check_call([self.amixer, "sset", self.element, f"{p}%"])
+        except Exception as e:
+            logger.debug("amixer set volume failed: %s", e)
+
+    def close(self):
+        pass
+
+
+def open_alsa_mixer(card: str = "default", element: str = "Master"):
+    """Open a separate ALSA mixer handle (raises OSError when libasound/the element is unavailable).
+
+    Useful for watching volume changes from another thread via poll_descriptors().
+    """
+    return _AlsaMixer(card, element)
+
+
+_linux_mixer = None
+
+
+def set_linux_mixer(mixer):
+    """Replace the Linux mixer backend.
+
+    `mixer` is any object with get_volume() -> int and set_volume(percent)
+    methods (e.g. a fake in tests). Pass None to close the current backend and
+    detect a real one again on the next call.
+    """
+    global _linux_mixer
+    if _linux_mixer is not None and mixer is not _linux_mixer and hasattr(_linux_mixer, "close"):
+        _linux_mixer.close()
+    _linux_mixer = mixer
+
+
+def _get_linux_mixer():
+    global _linux_mixer
+    if _linux_mixer is None:
+        try:
+            _linux_mixer = _AlsaMixer()
+        except Exception as e:
+            logger.debug("ALSA mixer unavailable, falling back to amixer: %s", e)
+            _linux_mixer = _AmixerMixer()
+    return _linux_mixer
+
+
+def is_linux_mixer(mixer) -> bool:
+    """True if `mixer` is the Linux backend currently in use."""
+    return mixer is not None and mixer is _linux_mixer
+
+
+def open_linux_watch_mixer():
+    """Return a mixer whose poll_descriptors() report volume changes of the Linux backend, or None.
+
+    For the ALSA backend this is a separate handle on the same element, which the
+    caller closes. A mixer installed with set_linux_mixer() is returned itself when
+    it has poll_descriptors() (it stays open for the backend). The amixer fallback
+    cannot be watched.
+    """
+    mixer = _get_linux_mixer()
+    if isinstance(mixer, _AlsaMixer):
+        return _AlsaMixer(mixer.card, mixer.element)
+    if hasattr(mixer, "poll_descriptors"):
+        return mixer
+    return None
+
+
+def _linux_get_volume():
     try:
-        out = subprocess.check_output([amixer, "sget", "Master"]).decode()
-        # parse like: [66%]
-        import re
-        m = re.search(r"(\d{1,3})%", out)
-        if m:
-            return int(m.group(1))
+        return _get_linux_mixer().get_volume()
     except Exception:
-        pass
-    return 0
+        logger.debug("linux get volume failed", exc_info=True)
+        return 0
 
 
 def _linux_set_volume(percent: Union[int, float]):
-    amixer = shutil.which("amixer")
-    if not amixer:
-        return
-    p = _to_int(percent)
     try:
-        subprocess.check_call([amixer, "sset", "Master", f"{p}%"])
-    except Exception as e:
-        logger.debug("amixer set volume failed: %s", e)
+        # Every backend, including one installed with set_linux_mixer(), sees 0-100
+        _get_linux_mixer().set_volume(max(0, min(100, _to_int(percent))))
+    except Exception:
+        logger.debug("linux set volume failed", exc_info=True)
 
 
 def get_volume() -> int:
@@ -0,0 +1,363 @@
+"""Benchmarks for the detection and control hot paths.
+
+Replays synthetic frames (or frames from a video / .npy file) through each
+stage and reports p50/p95/p99 latency, throughput and memory allocated per
+frame in the steady state (after the warm-up, so reused buffers are not
+counted). Runs headless on a CPU-only machine without a camera; stages whose
+dependencies are missing (e.g. mediapipe) are reported as skipped.
+
+Usage:
+  python benchmark.py                          # all stages, 200 synthetic frames
+  python benchmark.py --stages findPositions fingersUp --frames 1000
+  python benchmark.py --input clip.mp4 --output bench.json
+  python benchmark.py --output new.json --compare old.json
+  python benchmark.py --stages --roi-accuracy hand.jpg   # ROI vs full-frame landmark accuracy
+
+--roi-accuracy pans and zooms a photo with a visible hand along a smooth path
+and runs real MediaPipe on every frame, with and without roiTracking. The
+landmarks MediaPipe finds on the photo itself, moved along the same path,
+are the reference; the report gives the mean and p95 landmark error in pixels.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+
+import cv2
+import numpy as np
+
+STAGES = ["frameRing", "publish", "detectHands", "findPositions", "fingersUp", "findDistance", "overlay", "process_frame"]
+ALLOCATION_SAMPLES = 20
+
+# Normalized (x, y) of an open right hand with the pinky up, roughly centered in the frame
+_HAND_SHAPE = np.array([
+    (0.50, 0.80), (0.44, 0.74), (0.40, 0.66), (0.38, 0.59), (0.36, 0.53),
+    (0.46, 0.58), (0.45, 0.48), (0.45, 0.42), (0.45, 0.37),
+    (0.50, 0.58), (0.50, 0.63), (0.50, 0.66), (0.50, 0.68),
+    (0.54, 0.60), (0.54, 0.65), (0.54, 0.68), (0.54, 0.70),
+    (0.58, 0.62), (0.60, 0.54), (0.61, 0.49), (0.62, 0.45),
+], dtype=np.float32)
+
+
+def synthetic_frames(count, width, height, seed=0):
+    """Return `count` deterministic noise frames (a few distinct buffers reused in a cycle)."""
+    rng = np.random.default_rng(seed)
+    distinct = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(min(count, 8))]
+    return [distinct[i % len(distinct)] for i in range(count)]
+
+
+def load_frames(path, count, width, height):
+    """Load up to `count` frames from a .npy stack or a video file, resized to width x height."""
+    if path.endswith(".npy"):
+        stack = np.load(path, mmap_mode="r")
+        frames = [np.ascontiguousarray(stack[i % len(stack)]) for i in range(count)]
+    else:
+        capture = cv2.VideoCapture(path)
+        frames = []
+        while len(frames) < count:
+            success, frame = capture.read()
+            if not success:
+                break
+            frames.append(frame)
+        capture.release()
+        if not frames:
+            raise ValueError(f"No frames could be read from {path}")
+        frames = [frames[i % len(frames)] for i in range(count)]
+    return [frame if frame.shape[:2] == (height, width) else cv2.resize(frame, (width, height)) for frame in frames]
+
+
+def synthetic_landmarks(count, seed=0):
+    """Return `count` (1, 21, 3) float32 landmark arrays of a slightly moving hand."""
+    rng = np.random.default_rng(seed)
+    result = []
+    for i in range(count):
+        landmarks = np.zeros((1, 21, 3), dtype=np.float32)
+        landmarks[0, :, :2] = _HAND_SHAPE + 0.05 * np.sin(i / 10.0) + rng.normal(0, 0.002, _HAND_SHAPE.shape)
+        result.append(landmarks)
+    return result
+
+
+def moving_hand_frames(image, count, center, slowdown=1.0):
+    """Return (frames, transforms): `image` panned and zoomed around `center` along a smooth path,
+    with the 2x3 affine of each frame."""
+    height, width = image.shape[:2]
+    centerX, centerY = center
+    frames, transforms = [], []
+    for i in range(count):
+        t = i / slowdown
+        scale = 1.0 + 0.15 * np.sin(t / 23.0)
+        transform = np.array([[scale, 0, centerX * (1 - scale) + 0.12 * width * np.sin(t / 17.0)],
+                              [0, scale, centerY * (1 - scale) + 0.08 * height * np.sin(t / 11.0)]])
+        frames.append(cv2.warpAffine(image, transform, (width, height), borderMode=cv2.BORDER_REFLECT))
+        transforms.append(transform)
+    return frames, transforms
+
+
+def roi_accuracy(image, count, slowdowns=(1.0, 3.0), minDetectionConfidence=0.3):
+    """Landmark error of HandDetector with and without roiTracking on a moving copy of `image` (needs mediapipe)."""
+    import mediapipe
+    import handTrackingModule
+
+    height, width = image.shape[:2]
+    with mediapipe.solutions.hands.Hands(static_image_mode=True, max_num_hands=1,
+                                         min_detection_confidence=minDetectionConfidence) as hands:
+        results = hands.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    if not results.multi_hand_landmarks:
+        raise ValueError("MediaPipe finds no hand in the --roi-accuracy image")
+    reference = np.array([(landmark.x * width, landmark.y * height)
+                          for landmark in results.multi_hand_landmarks[0].landmark])
+
+    report = {}
+    for slowdown in slowdowns:
+        frames, transforms = moving_hand_frames(image, count, reference.mean(axis=0), slowdown)
+        for mode, options in (("fullFrame", {}), ("roi", {"roiTracking": True})):
+            detector = handTrackingModule.HandDetector(min_detection_confidence=minDetectionConfidence,
+                                                       skipDuplicates=False, **options)
+            errors = []
+            start = time.perf_counter()
+            for frame, transform in zip(frames, transforms):
+                detector.detectHands(frame, draw=False)
+                if not len(detector.landmarks):
+                    continue
+                expected = reference @ transform[:, :2].T + transform[:, 2]
+                found = detector.landmarks[:, :, :2] * np.array([width, height])
+                errors.append(np.linalg.norm(found - expected, axis=2).mean(axis=1).min())
+            elapsed = time.perf_counter() - start
+            errors = np.array(errors)
+            report[f"{mode}@1/{slowdown:g}"] = {
+                "found": len(errors),
+                "frames": count,
+                "mean_error_px": round(float(errors.mean()), 2) if len(errors) else None,
+                "p95_error_px": round(float(np.percentile(errors, 95)), 2) if len(errors) else None,
+                "mean_ms": round(elapsed / count * 1000, 2),
+                "crops": detector.roiFrames,
+                "cropResets": detector.roiResets,
+            }
+    return report
+
+
+def _fake_results(landmarks):
+    # Mimics the structure of mediapipe's results object for the given landmark array
+    hands = [types.SimpleNamespace(landmark=[types.SimpleNamespace(x=float(x), y=float(y), z=float(z)) for x, y, z in hand])
+             for hand in landmarks]
+    return types.SimpleNamespace(multi_hand_landmarks=hands)
+
+
+def measure(step, count, warmup):
+    """Run step(i) for i in range(count) after `warmup` calls and summarize its cost."""
+    for i in range(warmup):
+        step(i % count)
+
+    durations = np.empty(count, dtype=np.float64)
+    start = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter_ns()
+        step(i)
+        durations[i] = time.perf_counter_ns() - t0
+    elapsed = time.perf_counter() - start
+
+    # Allocation pass: peak traced memory above the baseline during each call
+    samples = min(count, ALLOCATION_SAMPLES)
+    allocated = []
+    tracemalloc.start()
+    for i in range(samples):
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        step(i)
+        allocated.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(durations, [50, 95, 99]) / 1e6
+    return {
+        "frames": count,
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "mean_ms": round(float(durations.mean() / 1e6), 4),
+        "throughput_fps": round(count / elapsed, 1) if elapsed else None,
+        "alloc_bytes_per_frame": int(np.median(allocated)) if allocated else 0,
+    }
+
+
+def _bench_frame_ring(frames):
+    import tempfile
+    from frameRing import FrameRingWriter, FrameRingReader
+
+    path = os.path.join(tempfile.gettempdir(), f"benchmark-{os.getpid()}.mmap")
+    writer = FrameRingWriter(path, shape=frames[0].shape)
+    reader = FrameRingReader(path)
+    out = np.empty_like(frames[0])
+
+    def step(i):
+        writer.write(frames[i])
+        reader.readInto(out)
+
+    def cleanup():
+        reader.close()
+        writer.close()
+
+    return step, cleanup
+
+
+def _bench_publish(frames):
+    # The camera server's path: resize each source frame straight into the next ring slot
+    import tempfile
+    import cameraServer
+    from frameRing import FrameRingWriter
+
+    height, width = frames[0].shape[:2]
+    path = os.path.join(tempfile.gettempdir(), f"benchmark-publish-{os.getpid()}.mmap")
+    writer = FrameRingWriter(path, shape=frames[0].shape)
+    return (lambda i: cameraServer.publish_frame(writer, frames[i], width, height)), writer.close
+
+
+def build_stage(name, frames, landmarks):
+    """Return (step, cleanup) for a stage, raising ImportError if its dependencies are missing."""
+    if name == "frameRing":
+        return _bench_frame_ring(frames)
+    if name == "publish":
+        return _bench_publish(frames)
+
+    if name == "overlay":
+        import handTrackingVolumeAdjustV2 as v2
+        canvas = [frame.copy() for frame in frames[:8]]
+        return (lambda i: v2.draw_overlay(canvas[i % len(canvas)], 150 + i % 250, i % 2 == 0, i % 101)), None
+
+    if name == "process_frame":
+        import handTrackingVolumeAdjustV2 as v2
+        # Never touch the real system volume from a benchmark
+        v2.volumeActuator.setVolume = lambda percent: None
+        if v2.handDetector is None:
+            v2.handDetector = v2.create_hand_detector()
+        results = [_fake_results(hand) for hand in landmarks]
+        stub = types.SimpleNamespace(result=None, process=lambda img: stub.result)
+        realHands, v2.handDetector.hands = v2.handDetector.hands, stub
+        canvas = [frame.copy() for frame in frames[:8]]
+
+        def step(i):
+            stub.result = results[i]
+            v2.process_frame(canvas[i % len(canvas)], show=False)
+
+        def cleanup():
+            v2.handDetector.hands = realHands
+
+        return step, cleanup
+
+    import handTrackingModule
+    detector = handTrackingModule.HandDetector(max_num_hands=1)
+    if name == "detectHands":
+        return (lambda i: detector.detectHands(frames[i], draw=False)), None
+
+    img = frames[0]
+    detector.landmarks = landmarks[0]
+    detector.findPositions(img, draw=False)
+    if name == "findPositions":
+        def step(i):
+            detector.landmarks = landmarks[i]
+            detector.findPositions(img, draw=False)
+        return step, None
+    if name == "fingersUp":
+        return (lambda i: detector.fingersUp()), None
+    if name == "findDistance":
+        return (lambda i: detector.findDistance(4, 8, img, draw=False)), None
+    raise ValueError(f"Unknown stage {name!r}")
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)),
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def compare(report, baseline):
+    print(f"\n{'stage':15} {'p50 ms':>18} {'p95 ms':>18} {'alloc B/frame':>22}")
+    for name, result in report["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if "skipped" in result or not old or "skipped" in old:
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "alloc_bytes_per_frame"):
+            change = (result[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f"{old[key]:>8} -> {result[key]:<8} ({change:+.0f}%)")
+        print(f"{name:15} " + " ".join(cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the detection and control hot paths")
+    parser.add_argument("--stages", nargs="*", default=STAGES, choices=STAGES, help="Stages to run")
+    parser.add_argument("--frames", type=int, default=200, help="Measured frames per stage")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured warm-up frames per stage")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--input", help="Replay frames from a video file or .npy stack instead of synthetic frames")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Print the change against a previous JSON report")
+    parser.add_argument("--roi-accuracy", metavar="IMAGE",
+                        help="Also compare roiTracking against full-frame landmarks on a moving copy of this hand photo")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        frames = load_frames(args.input, args.frames, args.width, args.height)
+    else:
+        frames = synthetic_frames(args.frames, args.width, args.height)
+    landmarks = synthetic_landmarks(args.frames)
+
+    report = {"environment": environment(),
+              "config": {"frames": args.frames, "warmup": args.warmup, "width": args.width,
+                         "height": args.height, "input": args.input},
+              "stages": {}}
+    for name in args.stages:
+        try:
+            step, cleanup = build_stage(name, frames, landmarks)
+        except ImportError as e:
+            report["stages"][name] = {"skipped": f"missing dependency: {e.name or e}"}
+            print(f"{name:15} skipped (missing dependency: {e.name or e})")
+            continue
+        try:
+            result = measure(step, args.frames, args.warmup)
+        finally:
+            if cleanup:
+                cleanup()
+        report["stages"][name] = result
+        print(f"{name:15} p50={result['p50_ms']:.3f}ms p95={result['p95_ms']:.3f}ms p99={result['p99_ms']:.3f}ms "
+              f"{result['throughput_fps']:.0f} fps, {result['alloc_bytes_per_frame']} B allocated/frame")
+
+    if args.roi_accuracy:
+        image = cv2.imread(args.roi_accuracy)
+        if image is None:
+            parser.error(f"Cannot read {args.roi_accuracy}")
+        try:
+            report["roiAccuracy"] = roi_accuracy(image, args.frames)
+        except ImportError as e:
+            report["roiAccuracy"] = {"skipped": f"missing dependency: {e.name or e}"}
+        for name, result in report["roiAccuracy"].items():
+            print(f"{name:15} {result}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Reusable scratch buffers for the per-frame hot paths.
+
+Full-resolution frames are ~2.7 MB each, so allocating fresh arrays for every
+resize, colour conversion or copy churns the allocator and the caches. A
+BufferPool hands out named buffers that are reused from frame to frame and
+only reallocated when a larger size is requested; pass them to OpenCV as
+`dst=` or to np.copyto as the output.
+
+A buffer returned by get() stays valid until the next get() with the same
+name, so every stage should use its own names.
+"""
+import numpy as np
+
+
+class BufferPool():
+    def __init__(self):
+        self._buffers = {}
+        self.allocations = 0
+        self.allocatedBytes = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        """Return a C-contiguous array of `shape` and `dtype` backed by the buffer stored under `name`.
+
+        The contents are left over from the previous use.
+        """
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        backing = self._buffers.get(name)
+        if backing is None or backing.nbytes < size:
+            backing = np.empty(size, dtype=np.uint8)
+            self._buffers[name] = backing
+            self.allocations += 1
+            self.allocatedBytes += size
+        return backing[:size].view(dtype).reshape(shape)
+
+    def release(self, name):
+        """Drop the buffer stored under `name` (e.g. after a resolution change)."""
+        self._buffers.pop(name, None)
+
+    def stats(self):
+        return {"buffers": len(self._buffers), "allocations": self.allocations,
+                "allocatedBytes": self.allocatedBytes,
+                "heldBytes": sum(buffer.nbytes for buffer in self._buffers.values())}
@@ -1,72 +1,120 @@
 # camera_server.py
+import argparse
+import signal
 import cv2
-import mmap
 import numpy as np
-import os
+from frameRing import (FrameRingWriter, DEFAULT_SLOT_COUNT, PIXEL_FORMAT_BGR, default_ring_path, frame_fingerprint,
+                       fingerprint_sample_shape)
+from bufferPool import BufferPool
+from frameSources import CameraSource, open_source, RATE_NATIVE, RATE_MAX, DEFAULT_CAMERA_FOURCC
+import instrumentation
+import traceExport
 
 VIDEO_CAPTURE_DEVICE_ID = 0
+VIDEO_CAPTURE_FPS = 30
 FRAME_HEIGHT = 720
 FRAME_WIDTH = 1280
 FRAME_SIZE_MULTIPLIER = 3
-FRAME_LOCK_FILE_NAME = "frame.lock"
-FRAME_MMAP_FILE_NAME = "frame.mmap"
+FRAME_RING_PATH = default_ring_path()
+FRAME_SLOT_COUNT = DEFAULT_SLOT_COUNT
+# Holds the pixel grid sampled for each frame's fingerprint, so publishing allocates nothing
+_pool = BufferPool()
 
-def create_lock():
-    with open(FRAME_LOCK_FILE_NAME, "w") as f:
-        pass
+def publish_frame(ring, frame, width, height, captureNs=None):
+    """Write `frame` straight into the ring's next slot (no intermediate copies), resizing only if needed.
 
-def acquire_lock():
-    while os.path.exists(FRAME_LOCK_FILE_NAME):
-        continue
+    The slot is stamped with the frame's fingerprint so clients can skip repeated frames.
+    """
+    slot = ring.acquire().reshape((height, width, FRAME_SIZE_MULTIPLIER))
+    if frame.shape[:2] == (height, width):
+        np.copyto(slot, frame)
+    else:
+        cv2.resize(frame, (width, height), dst=slot)
+    sample = _pool.get("fingerprint", fingerprint_sample_shape(slot.shape))
+    return ring.publish(captureNs, fingerprint=frame_fingerprint(slot, out=sample))
 
-def cleanup(mm, filename):
-    mm.close()
-    os.unlink(filename)
-    if os.path.exists(FRAME_LOCK_FILE_NAME):
-        os.unlink(FRAME_LOCK_FILE_NAME)
+def main(source=None, width=FRAME_WIDTH, height=FRAME_HEIGHT, path=FRAME_RING_PATH, detect=False, maxHands=2):
+    """Publish frames from `source` (a frameSources.FrameSource, default: the camera) to shared memory.
 
-def release_lock():
-    create_lock()
-
-def main():
-    print("Initializing VideoCapture...")
-    cap = cv2.VideoCapture(VIDEO_CAPTURE_DEVICE_ID)
-    cap.set(3, FRAME_WIDTH)
-    cap.set(4, FRAME_HEIGHT)
+    Frames are published at width x height; clients read the size from the ring header.
+    With detect=True hand landmarks are also detected once here and published to
+    the landmark ring (see landmarkChannel.py) for all consumers.
+    """
+    if source is None:
+        print("Initializing VideoCapture...")
+        source = CameraSource(VIDEO_CAPTURE_DEVICE_ID, width, height, fps=VIDEO_CAPTURE_FPS)
     # Define the frame dimensions and the size for the memory map
-    frame_height, frame_width = FRAME_HEIGHT, FRAME_WIDTH
+    frame_height, frame_width = height, width
     frame_size = frame_height * frame_width * FRAME_SIZE_MULTIPLIER
 
-    print(f"Initialized. VideoCapture(ID={VIDEO_CAPTURE_DEVICE_ID}) is active. Frame size is {frame_size}. ",
+    print(f"Initialized. {source.describe()} is active. Publishing {frame_width}x{frame_height} frames ({frame_size} bytes) to {path}. ",
           f"Press CTRL+C to exit.")
 
-    # Create a memory-mapped file
-    with open(FRAME_MMAP_FILE_NAME, "wb") as f:
-        # Initialize the file size
-        f.write(bytearray(frame_size))
-
-    mm = None
+    ring = None
+    landmarkPublisher = None
+    traceExport.enable_from_env("cameraServer")
     try:
-        with open(FRAME_MMAP_FILE_NAME, "r+b") as f:
-            mm = mmap.mmap(f.fileno(), frame_size)
-            create_lock()
-            while True:
-                ret, frame = cap.read()
-                if ret:
-                    frame = cv2.resize(frame, (frame_width, frame_height))
-                    acquire_lock()
-                    mm.seek(0)
-                    mm.write(frame.tobytes())
-                    release_lock()
+        # Frames are published into a ring of slots, so a slow client never stalls the camera
+        ring = FrameRingWriter(path, slotCount=FRAME_SLOT_COUNT,
+                               shape=(frame_height, frame_width, FRAME_SIZE_MULTIPLIER), pixelFormat=PIXEL_FORMAT_BGR,
+                               notify=True)
+        if detect:
+            # Imported here so the plain server does not need mediapipe
+            import handTrackingModule
+            from landmarkChannel import LandmarkPublisher, MAX_HANDS
+            detector = handTrackingModule.HandDetector(max_num_hands=min(maxHands, MAX_HANDS))
+            # The landmark ring sits next to the frame ring, so servers on different --ring paths do not collide
+            landmarkPublisher = LandmarkPublisher(detector, path).start()
+            print(f"Publishing hand landmarks to {landmarkPublisher.landmarkPath}.")
+        reporter = instrumentation.Reporter(interval=5.0)
+        for frame in source:
+            traceExport.set_frame(ring.sequence + 1)
+            start = instrumentation.start()
+            sequence = publish_frame(ring, frame, frame_width, frame_height, captureNs=source.lastCaptureNs)
+            traceExport.flow("frame", sequence)
+            instrumentation.stop("publish", start)
+            reporter.maybeReport()
+        print(f"Source exhausted after {source.framesRead} frames.")
     except KeyboardInterrupt:
         print("Termination requested by user.")
     finally:
-        if mm:
-            cleanup(mm, FRAME_MMAP_FILE_NAME)
-        if cap:
-            cap.release()
+        if landmarkPublisher:
+            landmarkPublisher.stop()
+            print(f"Landmark publisher: {landmarkPublisher.stats()}")
+        if ring:
+            ring.close()
+        source.close()
         print("Finished.")
 
 
+def _terminate(signum, frame):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)  # A repeated SIGTERM must not interrupt the cleanup
+    raise KeyboardInterrupt  # Unwind main() so the shared-memory ring is removed
+
+def parse_rate(value):
+    if value in (RATE_NATIVE, RATE_MAX):
+        return value
+    return float(value)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Publish camera or file frames to shared memory")
+    parser.add_argument("--source", default=str(VIDEO_CAPTURE_DEVICE_ID),
+                        help="Camera index, video file, directory of images or .npy frame stack")
+    parser.add_argument("--rate", type=parse_rate, default=RATE_NATIVE,
+                        help="Playback rate for file sources: 'native', 'max' or frames per second")
+    parser.add_argument("--loop", action="store_true", help="Replay file sources forever")
+    parser.add_argument("--width", type=int, default=FRAME_WIDTH, help="Width of the published frames")
+    parser.add_argument("--height", type=int, default=FRAME_HEIGHT, help="Height of the published frames")
+    parser.add_argument("--ring", default=FRAME_RING_PATH, help="Shared-memory file the frames are published to")
+    parser.add_argument("--detect", action="store_true",
+                        help="Detect hand landmarks once in the server and publish them for all clients")
+    parser.add_argument("--max-hands", type=int, default=2, help="Hands detected with --detect")
+    parser.add_argument("--fps", type=float, default=VIDEO_CAPTURE_FPS, help="Frame rate requested from cameras")
+    parser.add_argument("--fourcc", default=DEFAULT_CAMERA_FOURCC,
+                        help="Pixel format requested from cameras, e.g. MJPG or YUYV ('' keeps the driver default)")
+    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, _terminate)
+    main(open_source(args.source, rate=args.rate, loop=args.loop, width=args.width, height=args.height,
+                     fps=args.fps, fourcc=args.fourcc), width=args.width, height=args.height, path=args.ring,
+         detect=args.detect, maxHands=args.max_hands)
@@ -10,4 +10,5 @@ def process_frame(frame):
         raise KeyboardInterrupt  # Exit on 'q' press
 
 if __name__ == "__main__":
-    frameClient.main(callbackFunc=process_frame)
\ No newline at end of file
+    # The frame is only read (never drawn on), so skip the per-frame copy
+    frameClient.main(callbackFunc=process_frame, zeroCopy=True)
\ No newline at end of file
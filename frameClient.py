@@ -1,65 +1,350 @@
+import asyncio
 import cv2
-import mmap
 import numpy as np
 import os
-import time
 import sys  # Import sys to use sys.exit()
-import cameraServer
-
-FRAME_WIDTH = cameraServer.FRAME_WIDTH
-FRAME_HEIGHT = cameraServer.FRAME_HEIGHT
-FRAME_SIZE_MULTIPLIER = cameraServer.FRAME_SIZE_MULTIPLIER
-FRAME_LOCK_FILE_NAME = cameraServer.FRAME_LOCK_FILE_NAME
-FRAME_MMAP_FILE_NAME = cameraServer.FRAME_MMAP_FILE_NAME
-
-def acquire_lock():
-    while not os.path.exists(FRAME_LOCK_FILE_NAME):
-        time.sleep(0.01)  # Prevent this loop from becoming a CPU hog.
+import time
+from frameRing import FrameRingReader, PIXEL_FORMAT_BGR, default_ring_path
+from frameNotify import RESUBSCRIBE_INTERVAL
+from frameSources import FrameSource, FrameInfo, RATE_MAX, current_frame, set_current_frame
+from bufferPool import BufferPool
+import instrumentation
+import traceExport
 
-def release_lock():
-    if os.path.exists(FRAME_LOCK_FILE_NAME):
-        os.unlink(FRAME_LOCK_FILE_NAME)
+FRAME_RING_PATH = default_ring_path()
 
 def check_mmap_file_exists(file_path):
     """Check if the memory-mapped file exists and return a boolean."""
     return os.path.exists(file_path)
 
-def main(callbackFunc=None, windowName="Shared Frame (press q to exit)", showOriginalFrame=False):
-    frame_height, frame_width = FRAME_HEIGHT, FRAME_WIDTH
-    frame_size = frame_height * frame_width * FRAME_SIZE_MULTIPLIER
-    mmap_file_path = f"{FRAME_MMAP_FILE_NAME}"
+# Ring and sequence of the frame currently handed to the callback (used by detach_frame)
+_activeRing = None
+_activeSequence = 0
+
+def detach_frame(frame):
+    """Return a private, writable copy of a zero-copy frame so it can be kept after the callback returns.
+
+    Returns None if the server already overwrote the frame's slot.
+    """
+    if _activeRing is None:
+        return frame.copy()
+    return _activeRing.detach(_activeSequence, frame)
+
+def frame_capture_ns():
+    """Return the time.monotonic_ns() at which the server captured the frame currently handed to the callback."""
+    info = current_frame()
+    return info.captureNs if info else None
+
+def frame_reference():
+    """Return (ring path, sequence) of the frame currently handed to the callback, or None outside a callback.
+
+    Other processes can use it to read the same frame from shared memory (see inferenceDaemon.py).
+    """
+    info = current_frame()
+    if info is None or info.ringPath is None:
+        return None
+    return info.ringPath, info.sequence
+
+# How _FrameReader hands out frames
+COPY_VIEW = "view"  # read-only view into the shared slot
+COPY_POOLED = "pooled"  # copy into one buffer reused for every frame
+COPY_NEW = "new"  # copy into a new array
+
+class _FrameReader():
+    """Takes the newest frame from the ring with the bookkeeping shared by main() and FrameStream:
+    frame age, stale and repeated frame dropping, tracing, and the frame info behind
+    frame_capture_ns()/detach_frame()."""
+
+    def __init__(self, ring, path, copyMode=COPY_POOLED, maxFrameAge=None, skipDuplicates=True):
+        self.ring = ring
+        self.path = path
+        self.copyMode = copyMode
+        self.maxAgeNs = int(maxFrameAge * 1e9) if maxFrameAge else None
+        self.skipDuplicates = skipDuplicates
+        self.lastSequence = 0
+        self.lastFingerprint = 0
+        self.info = None  # FrameInfo of the last frame returned
+        self.staleFrames = 0
+        self.duplicateFrames = 0
+        self.pool = BufferPool()
+        self._reopened = ring.reopened
+
+    def sync(self):
+        """Start over when the ring was reopened after a server restart (see FrameRingReader.reopenIfReplaced)."""
+        if self.ring.reopened != self._reopened:
+            # The new ring numbers its frames from 1 again
+            self._reopened = self.ring.reopened
+            self.lastSequence = 0
+            self.lastFingerprint = 0
+
+    def read(self):
+        """Return the newest frame if it is newer than the last one read, else None."""
+        global _activeRing, _activeSequence
+        ring = self.ring
+        self.sync()
+        start = instrumentation.start()
+        sequence, frame_view = ring.view()
+        if frame_view is None or sequence <= self.lastSequence:
+            return None
+        self.lastSequence = sequence
+        traceExport.set_frame(sequence)
+        traceExport.flow("frame", sequence, end=True)
+
+        captureNs = ring.captureTime(sequence)
+        fingerprint = ring.fingerprint(sequence)
+        if captureNs is None or fingerprint is None:
+            return None
+        age = time.monotonic_ns() - captureNs
+        instrumentation.record("frameAge", age)
+        if self.maxAgeNs is not None and age > self.maxAgeNs:
+            self.staleFrames += 1
+            return None
+        if self.skipDuplicates and fingerprint and fingerprint == self.lastFingerprint:
+            # Same image as the frame handled last (e.g. the camera repeated it): nothing new to infer, draw or act on
+            self.duplicateFrames += 1
+            return None
+
+        frame = frame_view
+        if self.copyMode == COPY_VIEW:
+            _activeRing, _activeSequence = ring, sequence
+        else:
+            out = self.pool.get("frame", frame.shape) if self.copyMode == COPY_POOLED else None
+            # None if the slot was overwritten while copying; the next frame is taken instead
+            frame = ring.detach(sequence, frame, out=out)
+            if frame is None:
+                return None
+        instrumentation.stop("capture", start)
+        self.lastFingerprint = fingerprint
+        self.info = FrameInfo(captureNs, sequence, fingerprint or None, self.path)
+        set_current_frame(self.info)
+        return frame
+
+class FrameStream():
+    """Frames published by cameraServer as an asyncio stream:
+
+        async with FrameStream() as frames:
+            async for frame in frames:
+                ...
+
+    The stream waits on the server's publish notifications (see frameNotify.py)
+    registered with the running event loop, so it wakes as soon as a frame is
+    published and costs nothing while idle; other coroutines (audio, metrics,
+    control logic) share the same loop without extra threads. Servers that do
+    not send notifications are polled every pollInterval seconds.
+
+    Frames are copies in a buffer reused for the next frame, or with
+    zeroCopy=True read-only views into the shared slot (see main()). Frames
+    older than maxFrameAge and, with skipDuplicates, repeats of the previous
+    frame are skipped. frame_capture_ns() and detach_frame() refer to the
+    frame last yielded.
+    """
+
+    def __init__(self, path=FRAME_RING_PATH, zeroCopy=False, maxFrameAge=None, skipDuplicates=True,
+                 pollInterval=0.001):
+        self.path = path
+        self.zeroCopy = zeroCopy
+        self.maxFrameAge = maxFrameAge
+        self.skipDuplicates = skipDuplicates
+        self.pollInterval = pollInterval
+        self.ring = None
+        self.frames = None
+        self.subscriber = None
+        self._published = None
+        self._loop = None
+
+    def open(self):
+        """Attach to the ring; called by `async with` or the first iteration."""
+        self.ring = FrameRingReader(self.path)
+        if self.ring.shape is None or self.ring.pixelFormat != PIXEL_FORMAT_BGR or self.ring.dtype != np.uint8:
+            self.close()
+            raise ValueError(f"{self.path} does not hold BGR uint8 frames")
+        self.frames = _FrameReader(self.ring, self.path, COPY_VIEW if self.zeroCopy else COPY_POOLED,
+                                   self.maxFrameAge, self.skipDuplicates)
+        self.subscriber = self.ring.subscribe()
+        if self.subscriber is not None:
+            self._loop = asyncio.get_running_loop()
+            self._published = asyncio.Event()
+            self._loop.add_reader(self.subscriber.fileno(), self._onPublished)
+        return self
+
+    def _onPublished(self):
+        self.subscriber.drain()
+        self._published.set()
 
-    mm = None
+    @property
+    def staleFrames(self):
+        return self.frames.staleFrames if self.frames else 0
+
+    @property
+    def duplicateFrames(self):
+        return self.frames.duplicateFrames if self.frames else 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.ring is None:
+            self.open()
+        while True:
+            if self._published is not None:
+                self._published.clear()  # before checking, so a publish in between still wakes us
+            self.frames.sync()
+            if self.ring.latestSequence() > self.frames.lastSequence:
+                frame = self.frames.read()
+                if frame is not None:
+                    return frame
+                await asyncio.sleep(0)  # slot was being rewritten; let other tasks run before retrying
+                continue
+            start = instrumentation.start()
+            await self._waitForPublish()
+            instrumentation.stop("frameWait", start)
+            if self.ring.latestSequence() <= self.frames.lastSequence:
+                # Woken or timed out without a new frame: the server may have restarted with a new ring
+                self.ring.reopenIfReplaced()
+
+    async def _waitForPublish(self):
+        if self._published is None:
+            await asyncio.sleep(self.pollInterval)
+            return
+        try:
+            await asyncio.wait_for(self._published.wait(), RESUBSCRIBE_INTERVAL)
+        except asyncio.TimeoutError:
+            self.subscriber.checkSubscription()
+
+    async def __aenter__(self):
+        return self.open()
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        global _activeRing
+        if self._loop is not None and self.subscriber is not None:
+            self._loop.remove_reader(self.subscriber.fileno())
+            self._loop = None
+        self.subscriber = None  # closed with the ring
+        if self.ring is not None:
+            if _activeRing is self.ring:
+                _activeRing = None
+            self.ring.close()
+            self.ring = None
+
+class SharedMemorySource(FrameSource):
+    """The frames cameraServer publishes to shared memory, as a FrameSource (see frameSources.py).
+
+    copyMode is COPY_POOLED (a writable copy in a buffer reused for the next
+    frame), COPY_NEW (a new copy per frame, e.g. before a threaded stage) or
+    COPY_VIEW (read-only views into the shared slot, see main()). Stale frames
+    (maxFrameAge seconds) and repeated frames are skipped.
+    """
+
+    def __init__(self, path=FRAME_RING_PATH, copyMode=COPY_POOLED, maxFrameAge=None, skipDuplicates=True):
+        super().__init__(rate=RATE_MAX)
+        self.path = path
+        # The frame size and format come from the ring header, whatever the server chose
+        self.ring = FrameRingReader(path)
+        if self.ring.shape is None or self.ring.pixelFormat != PIXEL_FORMAT_BGR or self.ring.dtype != np.uint8:
+            self.ring.close()
+            raise ValueError(f"The server publishes {self.ring.pixelFormat or 'raw'} {self.ring.dtype} frames, "
+                             "expected BGR uint8.")
+        self.reader = _FrameReader(self.ring, path, copyMode, maxFrameAge, skipDuplicates)
+
+    def describe(self):
+        return f"SharedMemory({self.path}, {self.ring.width}x{self.ring.height})"
+
+    def _frames(self):
+        while not self._stopped:
+            # Wait for the server to publish a frame newer than the last one we handled; the
+            # timeout only bounds how long a stop() request can go unnoticed
+            start = instrumentation.start()
+            self.reader.sync()  # a wait that timed out may have moved to a restarted server's ring
+            published = self.ring.waitForFrame(self.reader.lastSequence, timeout=0.1)
+            instrumentation.stop("frameWait", start)
+            if not published:
+                continue
+            frame = self.reader.read()
+            if frame is not None:
+                yield frame
+
+    def _captureTime(self):
+        return self.reader.info.captureNs
+
+    def _frameInfo(self):
+        return self.reader.info
+
+    def close(self):
+        global _activeRing
+        if self.ring.mm is not None:
+            if _activeRing is self.ring:
+                _activeRing = None
+            self.ring.close()
+
+def main(callbackFunc=None, windowName="Shared Frame (press q to exit)", showOriginalFrame=False, zeroCopy=False,
+         pipelined=False, maxFrameAge=None, headless=False, skipDuplicates=True, path=FRAME_RING_PATH):
+    """Read frames published by cameraServer and pass each new one to callbackFunc.
+
+    With zeroCopy=True the callback receives a read-only array that points
+    straight into the shared memory slot. It must not be modified and is only
+    guaranteed until the callback returns; use detach_frame() to keep it.
+    Otherwise the callback gets a writable copy. Outside pipelined mode that
+    copy lives in a buffer reused for the next frame; call frame.copy() to keep it.
+
+    With pipelined=True reading, the callback and rendering run on separate
+    threads (threaded stages, see frameSources.py). Frames are always copied in this mode.
+    The window shows the image the callback returns, or the frame itself.
+
+    The age of every frame (time since the server captured it) is recorded in
+    the "frameAge" histogram. With maxFrameAge (seconds) set, frames older than
+    that are dropped instead of being passed to the callback.
+
+    With skipDuplicates=True a frame whose content fingerprint (stamped by the
+    server, see frameRing.frame_fingerprint) equals that of the previous frame
+    is not passed to the callback, so repeated camera frames cost no inference,
+    drawing or actuation.
+
+    With headless=True no OpenCV window is used at all: nothing is shown,
+    cv2.waitKey is never called and the client stops on SIGINT or SIGTERM.
+    """
+    mmap_file_path = path
+
+    source = None
+    stages = {}  # threaded stages by the work they feed, for the stats printed with --metrics
     if not check_mmap_file_exists(mmap_file_path):
         print(f"Error: The file {mmap_file_path} does not exist. Please ensure the server is running.")
         sys.exit(1)  # Exit the script since the mmap file is essential
 
     print("Frame client started. Press CTRL+C to exit.")
+    traceExport.enable_from_env()
     try:
-        with open(mmap_file_path, "r+b") as f:
-            mm = mmap.mmap(f.fileno(), frame_size)
-            while True:
-                acquire_lock()
-                mm.seek(0)
-                frame_data = mm.read(frame_size)
-                release_lock()
-
-                frame = np.frombuffer(frame_data, dtype=np.uint8).copy().reshape((FRAME_HEIGHT, FRAME_WIDTH, FRAME_SIZE_MULTIPLIER))
-
-                if callbackFunc:
-                    callbackFunc(frame)
-
-                if showOriginalFrame:
-                    cv2.imshow(windowName, frame)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+        # Pipelined frames outlive the next read, so only the serial loop reuses one buffer
+        copyMode = COPY_NEW if pipelined else COPY_VIEW if zeroCopy else COPY_POOLED
+        try:
+            source = SharedMemorySource(mmap_file_path, copyMode, maxFrameAge, skipDuplicates)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"Reading {source.ring.width}x{source.ring.height} frames from {mmap_file_path}.")
+
+        # Pipelined: reading, the callback and rendering each get their own thread
+        stream = stages["process"] = source.threaded(copy=False) if pipelined else source
+        if callbackFunc:
+            stream = stream.map(callbackFunc)
+        if pipelined:
+            stream = stages["render"] = stream.threaded(copy=False)
+        stream.run(windowName if showOriginalFrame else None, headless=headless)
     except KeyboardInterrupt:
         print("Termination requested by user.")
     finally:
-        if mm:
-            mm.close()  # Close the memory-mapped file
-        cv2.destroyAllWindows()  # Close all OpenCV windows
-        release_lock()  # Ensure the lock file is cleaned up on exit
+        if source:
+            if maxFrameAge:
+                print(f"Dropped {source.reader.staleFrames} frames older than {maxFrameAge * 1000:g} ms.")
+            if source.reader.duplicateFrames:
+                print(f"Skipped {source.reader.duplicateFrames} frames identical to the previous one.")
+            source.close()  # Close the memory-mapped file
+        if stages and instrumentation.enabled:
+            print("Pipeline stats:", {name: stage.stats() for name, stage in stages.items()})
+        if not headless:
+            cv2.destroyAllWindows()  # Close all OpenCV windows
         print("Finished.")
 
 if __name__ == "__main__":
@@ -0,0 +1,154 @@
+"""Wake frame ring readers when a frame is published instead of having them poll.
+
+The writer binds a Unix datagram socket next to the ring (`<ring>.notify`).
+A reader binds its own datagram socket and sends it a subscribe message; from
+then on the writer sends the sequence number of every published frame to all
+subscribers. Sends never block the writer: a subscriber whose queue is full
+only misses wake-ups it does not need (it reads the newest frame anyway), and
+subscribers that went away are dropped on the next send.
+
+The subscriber's socket is readable exactly when something was published, so
+it can be waited on with select() or registered with an asyncio event loop
+(loop.add_reader). Readers subscribe again when they hear nothing for a while,
+so they also reach the notifier of a restarted server; FrameRingReader then
+notices that the ring file was replaced and maps the new one.
+"""
+import itertools
+import os
+import select
+import socket
+import struct
+import sys
+import tempfile
+import time
+
+NOTIFY_SUFFIX = ".notify"
+RESUBSCRIBE_INTERVAL = 1.0
+SUBSCRIBE_MESSAGE = b"SUB"
+
+_SEQUENCE = struct.Struct("<Q")
+_subscriberIds = itertools.count()
+
+
+def notify_path(ringPath):
+    return ringPath + NOTIFY_SUFFIX
+
+
+def notifications_supported():
+    return hasattr(socket, "AF_UNIX")
+
+
+class FrameNotifier():
+    """Writer side: sends the sequence of every published frame to the subscribed readers."""
+
+    def __init__(self, ringPath):
+        self.path = notify_path(ringPath)
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left behind by a previous server
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.sock.setblocking(False)
+        self.subscribers = set()
+        self.sent = 0
+        self.missed = 0  # wake-ups skipped because a subscriber's queue was full
+
+    def _acceptSubscribers(self):
+        while True:
+            try:
+                message, address = self.sock.recvfrom(16)
+            except (BlockingIOError, InterruptedError):
+                return
+            if message == SUBSCRIBE_MESSAGE and address:
+                self.subscribers.add(address)
+
+    def notify(self, sequence):
+        self._acceptSubscribers()
+        if not self.subscribers:
+            return
+        message = _SEQUENCE.pack(sequence)
+        for address in list(self.subscribers):
+            try:
+                self.sock.sendto(message, address)
+                self.sent += 1
+            except (BlockingIOError, InterruptedError):
+                self.missed += 1
+            except OSError:
+                self.subscribers.discard(address)  # the reader is gone
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+class FrameSubscriber():
+    """Reader side: a socket that becomes readable whenever the writer publishes a frame."""
+
+    def __init__(self, ringPath):
+        self.notifierPath = notify_path(ringPath)
+        if sys.platform.startswith("linux"):
+            # Abstract socket name: nothing to clean up on the filesystem
+            self._address = f"\0ftvc-frames-{os.getpid()}-{next(_subscriberIds)}"
+            self._boundPath = None
+        else:
+            self._address = os.path.join(tempfile.gettempdir(), f"ftvc-frames-{os.getpid()}-{next(_subscriberIds)}.sock")
+            self._boundPath = self._address
+            if os.path.exists(self._address):
+                os.unlink(self._address)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self._address)
+        self.sock.setblocking(False)
+        self.lastSequence = 0
+        self.wakeups = 0
+        self._lastHeard = 0.0
+        self.subscribe()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def subscribe(self):
+        """(Re)register with the writer. Returns False if no writer is listening."""
+        self._lastHeard = time.monotonic()
+        try:
+            self.sock.sendto(SUBSCRIBE_MESSAGE, self.notifierPath)
+            return True
+        except OSError:
+            return False
+
+    def drain(self):
+        """Consume the pending notifications and return the newest sequence announced (0 if none)."""
+        newest = 0
+        while True:
+            try:
+                message = self.sock.recv(_SEQUENCE.size)
+            except (BlockingIOError, InterruptedError):
+                break
+            if len(message) == _SEQUENCE.size:
+                newest = max(newest, _SEQUENCE.unpack(message)[0])
+        if newest:
+            self.lastSequence = newest
+            self.wakeups += 1
+            self._lastHeard = time.monotonic()
+        return newest
+
+    def checkSubscription(self):
+        """Subscribe again after RESUBSCRIBE_INTERVAL without notifications (e.g. the server restarted)."""
+        if time.monotonic() - self._lastHeard >= RESUBSCRIBE_INTERVAL:
+            self.subscribe()
+
+    def wait(self, timeout):
+        """Block until a notification arrives or `timeout` seconds pass. Returns the newest sequence or 0."""
+        readable, _, _ = select.select([self.sock], [], [], max(0.0, timeout))
+        if not readable:
+            self.checkSubscription()
+            return 0
+        return self.drain()
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+            if self._boundPath and os.path.exists(self._boundPath):
+                os.unlink(self._boundPath)
@@ -0,0 +1,70 @@
+"""Latest-frame queues linking the threads of a pipelined frame loop.
+
+Threaded stages (FrameSource.threaded(), see frameSources.py) hand frames to
+the next stage through a small bounded queue that only ever holds the newest
+frames. When a downstream stage is slower, the queue drops frames according to
+its drop policy instead of making the upstream stage wait, so the pipeline
+runs at the speed of its slowest stage rather than the sum of all stages.
+"""
+import collections
+import threading
+
+DROP_OLDEST = "oldest"
+DROP_NEWEST = "newest"
+
+
+class LatestQueue():
+    def __init__(self, maxsize=1, dropPolicy=DROP_OLDEST):
+        """
+        Args:
+            maxsize: Maximum number of queued items.
+            dropPolicy: DROP_OLDEST evicts the oldest queued item to make room (latest frame wins),
+                        DROP_NEWEST discards the item being put.
+        """
+        if dropPolicy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown drop policy {dropPolicy!r}")
+        self.maxsize = maxsize
+        self.dropPolicy = dropPolicy
+        self.puts = 0
+        self.drops = 0
+        self.maxDepth = 0
+        self._items = collections.deque()
+        self._closed = False
+        self._condition = threading.Condition()
+
+    @property
+    def depth(self):
+        return len(self._items)
+
+    def put(self, item):
+        """Queue an item without blocking. Returns False if an item had to be dropped."""
+        with self._condition:
+            self.puts += 1
+            dropped = len(self._items) >= self.maxsize
+            if dropped:
+                self.drops += 1
+                if self.dropPolicy == DROP_NEWEST:
+                    return False
+                self._items.popleft()
+            self._items.append(item)
+            self.maxDepth = max(self.maxDepth, len(self._items))
+            self._condition.notify()
+            return not dropped
+
+    def get(self, timeout=None):
+        """Return the next item, or None on timeout or once the queue is closed and empty."""
+        with self._condition:
+            if not self._items and not self._closed:
+                self._condition.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
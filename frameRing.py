@@ -0,0 +1,425 @@
+"""Lock-free multi-slot frame ring stored in a shared memory-mapped file.
+
+The camera server is the single writer and any number of clients can read.
+Every slot carries a seqlock counter: the writer makes it odd before copying
+a frame in and even again afterwards, and a reader only accepts a slot whose
+counter was even and unchanged around its copy. The writer never waits for
+readers, and readers always pick the newest complete frame.
+
+Layout (little endian):
+  header (64 bytes): magic, version, slot count, slot stride, frame size,
+                     sequence number of the latest published frame, then the
+                     frame format: width, height, channels, row stride in
+                     bytes, pixel format (e.g. "BGR") and NumPy dtype string
+  slot i (slot stride bytes): seqlock counter, frame sequence, capture time
+                     (time.monotonic_ns() of the writer), content fingerprint
+                     (see frame_fingerprint(), 0 if the writer computed none),
+                     padding up to 64 bytes, then frame size bytes of pixel data,
+                     padded so that every slot starts on a 64-byte cache line
+
+Writes go through plain memory stores, so ordering relies on the platform
+keeping stores in program order (true on x86); the frame sequence check makes
+a reader retry if anything looks inconsistent.
+
+Writers created with notify=True also wake blocked readers through a Unix
+datagram socket when a frame is published (see frameNotify.py), so
+waitForFrame() sleeps until the next frame instead of polling.
+
+Clients learn the resolution and format from the header, so the server can
+publish any frame size without the clients being changed. The ring lives in
+/dev/shm where available (RAM-backed, no page-cache writeback to disk) and in
+the temporary directory otherwise.
+"""
+import functools
+import mmap
+import os
+import struct
+import tempfile
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+from frameNotify import FrameNotifier, FrameSubscriber, RESUBSCRIBE_INTERVAL, notifications_supported, notify_path
+
+RING_MAGIC = b"FTRG"
+RING_VERSION = 3
+DEFAULT_SLOT_COUNT = 3
+DEFAULT_RING_NAME = "ftvc-frames.ring"
+PIXEL_FORMAT_BGR = "BGR"
+MAX_READ_ATTEMPTS = 8
+FINGERPRINT_STEP = 8
+
+_HEADER = struct.Struct("<4sIIIQQIIII8s8s")
+_HEADER_SIZE = 64
+_LATEST_OFFSET = 24
+_SLOT_HEADER = struct.Struct("<QQQQ")
+_SLOT_HEADER_SIZE = 64
+_SLOT_ALIGNMENT = 64
+_COUNTER = struct.Struct("<Q")
+
+
+def _slot_stride(frame_size):
+    # Odd frame sizes would leave later slots, and their seqlock counters, straddling cache lines
+    return -(-(_SLOT_HEADER_SIZE + frame_size) // _SLOT_ALIGNMENT) * _SLOT_ALIGNMENT
+
+
+def ring_size(frame_size, slot_count=DEFAULT_SLOT_COUNT):
+    """Return the number of bytes needed for a ring with the given geometry."""
+    return _HEADER_SIZE + slot_count * _slot_stride(frame_size)
+
+
+def default_ring_path(name=DEFAULT_RING_NAME):
+    """Path of the shared ring: in RAM-backed /dev/shm when the platform has it, else the temp directory."""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, name)
+
+
+def fingerprint_sample_shape(shape, step=FINGERPRINT_STEP):
+    """Shape of the pixel grid frame_fingerprint() samples from a frame of `shape`."""
+    return (max(1, shape[0] // step), max(1, shape[1] // step)) + tuple(shape[2:])
+
+
+@functools.lru_cache(maxsize=8)
+def _shape_crc(shape):
+    return zlib.crc32(repr(shape).encode("ascii"))
+
+
+def frame_fingerprint(frame, step=FINGERPRINT_STEP, out=None):
+    """Cheap content fingerprint of a frame, never 0: CRC32 of a grid of about every step-th pixel of every step-th row.
+
+    Equal fingerprints mean a repeated frame (e.g. a camera delivering the same
+    image twice); changes that fall entirely between the sampled pixels are missed.
+    `out` is an optional array of fingerprint_sample_shape() and the frame's dtype the
+    grid is gathered into, so fingerprinting every frame allocates nothing.
+    """
+    height, width = fingerprint_sample_shape(frame.shape, step)[:2]
+    # Nearest-neighbour downscaling gathers the grid several times faster than NumPy slicing
+    sample = cv2.resize(frame, (width, height), dst=out, interpolation=cv2.INTER_NEAREST)
+    return (1 << 32) | zlib.crc32(sample, _shape_crc(frame.shape))
+
+
+def _slot_views(mm, slotCount, slotStride, frameSize, shape, dtype, rowStride):
+    # NumPy views straight onto each slot's pixel data, shaped like a frame when the format is known
+    views = []
+    for slot in range(slotCount):
+        offset = _HEADER_SIZE + slot * slotStride + _SLOT_HEADER_SIZE
+        if shape is None:
+            views.append(np.frombuffer(mm, dtype=np.uint8, count=frameSize, offset=offset))
+        else:
+            strides = (rowStride, shape[2] * dtype.itemsize, dtype.itemsize)
+            views.append(np.ndarray(shape, dtype=dtype, buffer=mm, offset=offset, strides=strides))
+    return views
+
+
+class FrameRingWriter():
+    def __init__(self, path, frameSize=None, slotCount=DEFAULT_SLOT_COUNT, shape=None,
+                 pixelFormat=PIXEL_FORMAT_BGR, dtype=np.uint8, notify=False):
+        """
+        Args:
+            path: File backing the ring (see default_ring_path()).
+            frameSize: Bytes per frame; derived from shape and dtype when those are given.
+            shape: (height, width, channels) of the frames, recorded in the header for the clients.
+                   Without it the ring carries opaque frameSize byte frames.
+            pixelFormat: Channel order of the pixels, e.g. "BGR".
+            notify: Wake subscribed readers on every publish (see frameNotify.py).
+        """
+        if slotCount < 2:
+            raise ValueError("A frame ring needs at least 2 slots")
+        dtype = np.dtype(dtype)
+        if shape is not None:
+            shape = tuple(shape) if len(shape) == 3 else (shape[0], shape[1], 1)
+            frameSize = shape[0] * shape[1] * shape[2] * dtype.itemsize
+        elif frameSize is None:
+            raise ValueError("Either frameSize or shape is required")
+        self.path = path
+        self.frameSize = frameSize
+        self.slotCount = slotCount
+        self.slotStride = _slot_stride(frameSize)
+        self.shape = shape
+        self.dtype = dtype
+        self.pixelFormat = pixelFormat
+        self.sequence = 0
+
+        height, width, channels = shape or (0, 0, 0)
+        rowStride = width * channels * dtype.itemsize
+        # The ring is built in a new file that then replaces the old one. Truncating the old file instead
+        # would pull pages from under readers that still map it (SIGBUS when the new ring is smaller);
+        # they keep the old ring until they notice the new one.
+        tmpPath = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmpPath, "w+b") as f:
+                f.truncate(ring_size(frameSize, slotCount))
+                self.mm = mmap.mmap(f.fileno(), 0)
+            _HEADER.pack_into(self.mm, 0, RING_MAGIC, RING_VERSION, slotCount, self.slotStride, frameSize, 0,
+                              width, height, channels, rowStride, pixelFormat.encode("ascii"),
+                              dtype.str.encode("ascii"))
+            os.replace(tmpPath, path)
+        except BaseException:
+            if os.path.exists(tmpPath):
+                os.unlink(tmpPath)
+            raise
+        # Writable views onto each slot, so frames can be produced in place
+        self._slotViews = _slot_views(self.mm, slotCount, self.slotStride, frameSize, shape, dtype, rowStride)
+        self._pending = None
+        self.notifier = FrameNotifier(path) if notify and notifications_supported() else None
+
+    def _slotOffset(self, sequence):
+        return _HEADER_SIZE + (sequence % self.slotCount) * self.slotStride
+
+    def acquire(self):
+        """Start writing the next frame in place and return a writable view of its slot.
+
+        The view has the frame shape and dtype, or is a flat uint8 array for rings without a shape.
+
+        Fill the view (e.g. as the dst= of cv2.resize) and call publish(). Readers
+        skip the slot until then.
+        """
+        sequence = self.sequence + 1
+        base = self._slotOffset(sequence)
+        counter = _COUNTER.unpack_from(self.mm, base)[0]
+        if counter & 1:
+            counter += 1  # An earlier write was abandoned before publish()
+        _COUNTER.pack_into(self.mm, base, counter + 1)  # odd: write in progress
+        self._pending = (sequence, base, counter)
+        return self._slotViews[sequence % self.slotCount]
+
+    def publish(self, captureNs=None, fingerprint=0):
+        """Finish the write started by acquire() and return the frame's sequence number.
+
+        captureNs is the time.monotonic_ns() at which the frame was captured (defaults to now),
+        fingerprint the frame_fingerprint() of the frame, so readers can skip repeated frames.
+        """
+        if captureNs is None:
+            captureNs = time.monotonic_ns()
+        sequence, base, counter = self._pending
+        self._pending = None
+        _SLOT_HEADER.pack_into(self.mm, base, counter + 1, sequence, captureNs, fingerprint)
+        _COUNTER.pack_into(self.mm, base, counter + 2)  # even: slot is stable
+
+        _COUNTER.pack_into(self.mm, _LATEST_OFFSET, sequence)
+        self.sequence = sequence
+        if self.notifier:
+            self.notifier.notify(sequence)
+        return sequence
+
+    def write(self, data, captureNs=None):
+        """Publish one frame (any bytes-like object of frameSize bytes) and return its sequence number."""
+        slot = self.acquire()
+        slot = slot.reshape(-1).view(np.uint8)
+        if isinstance(data, np.ndarray):
+            np.copyto(slot, data.reshape(-1).view(np.uint8))
+        else:
+            slot[:] = np.frombuffer(data, dtype=np.uint8)
+        return self.publish(captureNs)
+
+    def close(self, unlink=True):
+        self._slotViews = []
+        if self.notifier:
+            self.notifier.close()
+            self.notifier = None
+        if self.mm:
+            self.mm.close()
+            self.mm = None
+        if unlink and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class FrameRingReader():
+    def __init__(self, path):
+        self.path = path
+        self.retries = 0
+        self.reopened = 0  # times a restarted writer's new ring was mapped (see reopenIfReplaced)
+        self.subscriber = None
+        self.mm = None
+        self._replacedCheckAt = 0.0
+        self._map()
+
+    def _map(self):
+        path = self.path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            fileStat = os.fstat(f.fileno())
+        self._fileId = (fileStat.st_dev, fileStat.st_ino)
+
+        (magic, version, slotCount, slotStride, frameSize, _,
+         width, height, channels, rowStride, pixelFormat, dtype) = _HEADER.unpack_from(self.mm, 0)
+        if magic != RING_MAGIC:
+            self._unmap()
+            raise ValueError(f"{path} is not a frame ring (bad magic {magic!r})")
+        if version != RING_VERSION:
+            self._unmap()
+            raise ValueError(f"{path} uses frame ring version {version}, expected {RING_VERSION}")
+
+        self.slotCount = slotCount
+        self.slotStride = slotStride
+        self.frameSize = frameSize
+        self.shape = (height, width, channels) if width else None
+        self.width, self.height, self.channels = width, height, channels
+        self.rowStride = rowStride
+        self.pixelFormat = pixelFormat.rstrip(b"\x00").decode("ascii")
+        self.dtype = np.dtype(dtype.rstrip(b"\x00").decode("ascii"))
+        # Read-only views straight onto each slot's pixel data (no copies)
+        self._slotViews = _slot_views(self.mm, slotCount, slotStride, frameSize, self.shape, self.dtype, rowStride)
+
+    def _unmap(self):
+        self._slotViews = []
+        if self.mm:
+            try:
+                self.mm.close()
+            except BufferError:
+                # A caller still holds a zero-copy view; the mapping is released with it
+                pass
+            self.mm = None
+
+    def latestSequence(self):
+        return _COUNTER.unpack_from(self.mm, _LATEST_OFFSET)[0]
+
+    def replaced(self):
+        """True if the file at `path` is no longer the ring this reader maps, i.e. the writer restarted."""
+        try:
+            fileStat = os.stat(self.path)
+        except FileNotFoundError:
+            return False  # The writer stopped; wait for a new ring to appear
+        return (fileStat.st_dev, fileStat.st_ino) != self._fileId
+
+    def reopenIfReplaced(self):
+        """Map the new ring if the writer restarted. Returns True if it did.
+
+        A restarted writer creates a new file (see FrameRingWriter), so this reader
+        would otherwise keep reading the old ring, whose frames never change again.
+        The new ring numbers its frames from 1 and may have another frame format.
+        """
+        if not self.replaced():
+            return False
+        self._unmap()
+        self._map()
+        self.reopened += 1
+        if self.subscriber:
+            self.subscriber.subscribe()  # The new writer does not know about us yet
+        return True
+
+    def _slotOffset(self, sequence):
+        return _HEADER_SIZE + (sequence % self.slotCount) * self.slotStride
+
+    def read(self):
+        """Return (sequence, frame bytes) for the newest complete frame, or (0, None) if there is none yet."""
+        for _ in range(MAX_READ_ATTEMPTS):
+            sequence = self.latestSequence()
+            if sequence == 0:
+                return 0, None
+            base = self._slotOffset(sequence)
+            payload = base + _SLOT_HEADER_SIZE
+
+            before, frameSequence, _, _ = _SLOT_HEADER.unpack_from(self.mm, base)
+            if before & 1 or frameSequence != sequence:
+                self.retries += 1
+                continue
+            data = self.mm[payload:payload + self.frameSize]
+            after = _COUNTER.unpack_from(self.mm, base)[0]
+            if before == after:
+                return sequence, data
+            self.retries += 1
+        return 0, None
+
+    def view(self):
+        """Return (sequence, read-only array) pointing straight at the newest complete slot, or (0, None).
+
+        The array has the frame shape and dtype from the header (flat uint8 for rings without a shape).
+
+        Nothing is copied. The view stays valid until the writer wraps around the
+        ring onto the same slot (slotCount - 1 frames later); call isValid() to
+        check, or detach() to take a private copy that outlives the slot.
+        """
+        for _ in range(MAX_READ_ATTEMPTS):
+            sequence = self.latestSequence()
+            if sequence == 0:
+                return 0, None
+            if self.isValid(sequence):
+                return sequence, self._slotViews[sequence % self.slotCount]
+            self.retries += 1
+        return 0, None
+
+    def frameView(self, sequence):
+        """Like view(), but for frame `sequence` instead of the newest one. Returns None once its slot was reused."""
+        if sequence == 0 or not self.isValid(sequence):
+            return None
+        return self._slotViews[sequence % self.slotCount]
+
+    def isValid(self, sequence):
+        """True while the slot holding frame `sequence` has not been touched by the writer."""
+        counter, frameSequence, _, _ = _SLOT_HEADER.unpack_from(self.mm, self._slotOffset(sequence))
+        return not counter & 1 and frameSequence == sequence
+
+    def captureTime(self, sequence):
+        """Return the time.monotonic_ns() at which frame `sequence` was captured, or None if it was overwritten."""
+        counter, frameSequence, captureNs, _ = _SLOT_HEADER.unpack_from(self.mm, self._slotOffset(sequence))
+        if counter & 1 or frameSequence != sequence:
+            return None
+        return captureNs
+
+    def fingerprint(self, sequence):
+        """Return the writer's frame_fingerprint() of frame `sequence`: 0 if it has none, None if it was overwritten."""
+        counter, frameSequence, _, fingerprint = _SLOT_HEADER.unpack_from(self.mm, self._slotOffset(sequence))
+        if counter & 1 or frameSequence != sequence:
+            return None
+        return fingerprint
+
+    def detach(self, sequence, frame, out=None):
+        """Copy a view returned by view() into `out` (or a new array). Returns None if the slot was overwritten."""
+        if out is None:
+            out = np.empty_like(frame)
+        np.copyto(out, frame)
+        if not self.isValid(sequence):
+            return None
+        return out
+
+    def readInto(self, out):
+        """Copy the newest complete frame into `out` (frameSize bytes, any shape). Returns its sequence or 0."""
+        for _ in range(MAX_READ_ATTEMPTS):
+            sequence, frame = self.view()
+            if frame is None:
+                return 0
+            if self.detach(sequence, frame.reshape(out.shape), out=out) is not None:
+                return sequence
+            self.retries += 1
+        return 0
+
+    def subscribe(self):
+        """Return a FrameSubscriber woken by the writer's publishes, or None if the writer sends no notifications."""
+        if self.subscriber is None and notifications_supported() and os.path.exists(notify_path(self.path)):
+            self.subscriber = FrameSubscriber(self.path)
+        return self.subscriber
+
+    def waitForFrame(self, lastSequence, timeout=None, pollInterval=0.001):
+        """Block until a frame newer than lastSequence is published. Returns False on timeout.
+
+        Sleeps until the writer's notification when it sends them, otherwise polls every pollInterval.
+        When the writer restarted, the new ring is mapped (see reopenIfReplaced) and any frame in it counts.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        subscriber = self.subscribe()
+        woken = 0
+        while self.latestSequence() <= lastSequence:
+            now = time.monotonic()
+            # A wake-up without a new frame here, or a long wait, can mean the writer restarted with a new ring
+            if woken or now >= self._replacedCheckAt:
+                self._replacedCheckAt = now + RESUBSCRIBE_INTERVAL
+                if self.reopenIfReplaced():
+                    lastSequence = 0  # The restarted writer numbers its frames from 1 again
+                    continue
+            if deadline is not None and now >= deadline:
+                return False
+            if subscriber is None:
+                time.sleep(pollInterval)
+            else:
+                woken = subscriber.wait(RESUBSCRIBE_INTERVAL if deadline is None
+                                        else min(deadline - now, RESUBSCRIBE_INTERVAL))
+        return True
+
+    def close(self):
+        if self.subscriber:
+            self.subscriber.close()
+            self.subscriber = None
+        self._unmap()
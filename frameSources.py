@@ -0,0 +1,566 @@
+"""Pluggable frame sources and the stages every frame loop is built from.
+
+Every source is iterable and yields BGR uint8 frames:
+  - CameraSource: a cv2.VideoCapture device
+  - VideoFileSource: a video file
+  - ImageDirectorySource: the images of a directory, in file name order
+  - NpyStackSource: a (frames, height, width[, 3]) .npy array, memory-mapped
+  - frameClient.SharedMemorySource: the frames published by cameraServer
+
+Sources compose into pipelines of generator stages, each returning a new
+source, and run() drives a pipeline, showing the frames in a window:
+
+    CameraSource(0).detect(handDetector).map(draw_volume).drawFps().run("Image")
+
+map, decimate, crop, detect, drawFps and threaded (which moves everything
+upstream onto its own thread) are available on every source. The capture
+time and identity of the frame being handled travel with it, also across
+threads, and are returned by current_frame().
+
+Camera and video sources decode every frame into the same buffer, and .npy
+stacks are copied out of their read-only memory map into one, so a yielded
+frame is writable but only valid until the next one is requested.
+
+File sources can be replayed at their native rate, at a fixed rate or as fast
+as possible, optionally looping forever, which makes the shared-memory
+pipeline reproducible on machines without a webcam.
+"""
+import logging
+import os
+import signal
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import overlay_colors as colors
+from framePipeline import LatestQueue, DROP_OLDEST
+
+RATE_NATIVE = "native"
+RATE_MAX = "max"
+DEFAULT_FILE_FPS = 30.0
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+DEFAULT_CAMERA_FOURCC = "MJPG"
+
+logger = logging.getLogger(__name__)
+
+# Info about the frame most recently yielded on each thread (see current_frame())
+_current = threading.local()
+
+
+class FrameInfo():
+    __slots__ = ("captureNs", "sequence", "fingerprint", "ringPath")
+
+    def __init__(self, captureNs=None, sequence=None, fingerprint=None, ringPath=None):
+        self.captureNs = captureNs  # time.monotonic_ns() at which the frame was captured
+        self.sequence = sequence  # sequence number in the shared-memory ring, if it came from one
+        self.fingerprint = fingerprint  # frameRing.frame_fingerprint() stamped by the server, if any
+        self.ringPath = ringPath
+
+    @property
+    def frameId(self):
+        """Identity of the frame for HandDetector.detectHands(frameId=...), or None if unknown."""
+        return self.fingerprint or self.sequence
+
+
+def current_frame():
+    """Return the FrameInfo of the frame being handled on this thread, or None."""
+    return getattr(_current, "frame", None)
+
+
+def set_current_frame(info):
+    _current.frame = info
+
+
+def install_stop_signals(onStop):
+    """Call onStop() on SIGINT/SIGTERM instead of raising KeyboardInterrupt. Returns a function restoring the old handlers."""
+    previous = {}
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            previous[signum] = signal.signal(signum, lambda signum, frame: onStop())
+        except ValueError:
+            pass  # Signal handlers can only be installed from the main thread
+
+    def restore():
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+    return restore
+
+
+class FrameSource():
+    def __init__(self, rate=RATE_NATIVE, loop=False):
+        """
+        Args:
+            rate: RATE_NATIVE (the source's own frame rate), RATE_MAX (no pacing) or frames per second.
+            loop: Start again from the first frame when the source runs out.
+        """
+        self.rate = rate
+        self.loop = loop
+        self.framesRead = 0
+        self.lastCaptureNs = None  # time.monotonic_ns() at which the last frame was yielded
+        self._stopped = False
+
+    @property
+    def nativeFps(self):
+        return DEFAULT_FILE_FPS
+
+    def describe(self):
+        return type(self).__name__
+
+    def _frames(self):
+        """Yield every frame once."""
+        raise NotImplementedError
+
+    def _captureTime(self):
+        """time.monotonic_ns() at which the frame about to be yielded was captured."""
+        return time.monotonic_ns()
+
+    def _frameInfo(self):
+        """FrameInfo of the frame about to be yielded."""
+        return FrameInfo(self.lastCaptureNs)
+
+    def _interval(self):
+        if self.rate == RATE_MAX or self.rate is None:
+            return 0.0
+        fps = self.nativeFps if self.rate == RATE_NATIVE else float(self.rate)
+        return 1.0 / fps if fps else 0.0
+
+    def __iter__(self):
+        interval = self._interval()
+        nextTime = time.monotonic()
+        while True:
+            produced = False
+            for frame in self._frames():
+                produced = True
+                if interval:
+                    delay = nextTime - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    elif delay < -interval:
+                        nextTime = time.monotonic()  # Fell behind; don't burst to catch up
+                    nextTime += interval
+                if self._stopped:
+                    return
+                self.framesRead += 1
+                self.lastCaptureNs = self._captureTime()
+                set_current_frame(self._frameInfo())
+                yield frame
+            if not (self.loop and produced) or self._stopped:
+                return
+
+    def stop(self):
+        """Make iteration end after the current frame (safe to call from signal handlers and other threads)."""
+        self._stopped = True
+
+    def close(self):
+        pass
+
+    # Stages: each returns a new source yielding this source's frames transformed
+
+    def map(self, func):
+        """Call func(frame) on every frame. If it returns an image, that image is passed on instead of the frame."""
+        def mapFrames(frames):
+            for frame in frames:
+                result = func(frame)
+                yield result if isinstance(result, np.ndarray) else frame
+        return FrameStage(self, mapFrames, "map")
+
+    def decimate(self, every):
+        """Pass on only every `every`-th frame."""
+        if every < 1:
+            raise ValueError(f"decimate() needs every >= 1, got {every}")
+
+        def decimateFrames(frames):
+            for index, frame in enumerate(frames):
+                if index % every == 0:
+                    yield frame
+        return FrameStage(self, decimateFrames, f"decimate({every})")
+
+    def crop(self, x1, y1, x2, y2):
+        """Pass on the x1:x2, y1:y2 region of every frame (a view, nothing is copied)."""
+        def cropFrames(frames):
+            for frame in frames:
+                yield frame[y1:y2, x1:x2]
+        return FrameStage(self, cropFrames, f"crop({x1}, {y1}, {x2}, {y2})")
+
+    def detect(self, detector, draw=True):
+        """Run detector.detectHands() on every frame; repeated frames are recognised by their frame id."""
+        def detectFrames(frames):
+            for frame in frames:
+                info = current_frame()
+                detector.detectHands(frame, draw=draw, frameId=info.frameId if info else None)
+                yield frame
+        return FrameStage(self, detectFrames, "detect")
+
+    def drawFps(self, org=(5, 30)):
+        """Write the current frame rate onto every frame."""
+        def drawFpsFrames(frames):
+            prevTime = time.monotonic()
+            for frame in frames:
+                currentTime = time.monotonic()
+                fps = 1 / (currentTime - prevTime) if currentTime > prevTime else 0.0
+                prevTime = currentTime
+                cv2.putText(frame, str(int(fps)), org, cv2.FONT_HERSHEY_SCRIPT_SIMPLEX, 1, colors.COLOR_GREEN, 2)
+                yield frame
+        return FrameStage(self, drawFpsFrames, "drawFps")
+
+    def threaded(self, queueSize=1, dropPolicy=DROP_OLDEST, copy=True):
+        """Run this source and its stages on a background thread; see ThreadedStage."""
+        return ThreadedStage(self, queueSize, dropPolicy, copy)
+
+    def run(self, windowName=None, headless=False):
+        """Pull every frame through the pipeline until the source ends, 'q' is pressed or CTRL+C, then close it.
+
+        Frames are shown in `windowName` when given. Headless pipelines never touch the
+        OpenCV GUI and stop on SIGINT or SIGTERM. Returns the number of frames.
+        """
+        restoreSignals = install_stop_signals(self.stop) if headless else None
+        frames = iter(self)
+        count = 0
+        try:
+            for frame in frames:
+                count += 1
+                if headless:
+                    continue
+                if windowName:
+                    cv2.imshow(windowName, frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+        finally:
+            if restoreSignals:
+                restoreSignals()
+            frames.close()
+            self.close()
+        return count
+
+
+class FrameStage(FrameSource):
+    """A source whose frames are those of `upstream` passed through `transform` (a generator function)."""
+
+    def __init__(self, upstream, transform, name):
+        super().__init__(rate=RATE_MAX)
+        self.upstream = upstream
+        self.transform = transform
+        self.name = name
+
+    def describe(self):
+        return f"{self.upstream.describe()} | {self.name}"
+
+    def __iter__(self):
+        for frame in self.transform(iter(self.upstream)):
+            if self._stopped:
+                return
+            self.framesRead += 1
+            self.lastCaptureNs = self.upstream.lastCaptureNs
+            yield frame
+
+    def stop(self):
+        super().stop()
+        self.upstream.stop()
+
+    def close(self):
+        self.upstream.close()
+
+
+class ThreadedStage(FrameStage):
+    """Iterates `upstream` on a background thread and hands the frames over through a LatestQueue.
+
+    The upstream stages then run concurrently with everything downstream, and
+    when downstream is slower the queue drops frames (see framePipeline.py)
+    instead of stalling capture. Frames are copied before the handover unless
+    copy=False, for upstreams that yield a new array for every frame.
+    """
+
+    def __init__(self, upstream, queueSize=1, dropPolicy=DROP_OLDEST, copy=True):
+        super().__init__(upstream, None, "threaded")
+        self.queueSize = queueSize
+        self.dropPolicy = dropPolicy
+        self.copy = copy
+        self.queue = None
+        self.error = None
+
+    def _produce(self, queue):
+        try:
+            for frame in self.upstream:
+                if self._stopped:
+                    break
+                queue.put((frame.copy() if self.copy else frame, current_frame()))
+        except BaseException as e:
+            self.error = e
+        finally:
+            queue.close()
+
+    def __iter__(self):
+        queue = self.queue = LatestQueue(self.queueSize, self.dropPolicy)
+        thread = threading.Thread(target=self._produce, args=(queue,), name="FrameStage", daemon=True)
+        thread.start()
+        try:
+            while not self._stopped:
+                item = queue.get(timeout=0.1)
+                if item is None:
+                    if queue.closed:
+                        break
+                    continue
+                frame, info = item
+                set_current_frame(info)
+                self.framesRead += 1
+                self.lastCaptureNs = info.captureNs if info else None
+                yield frame
+        finally:
+            self.stop()
+            queue.close()
+            thread.join(1.0)
+            logger.info("Threaded stage after %s: %s", self.upstream.describe(), self.stats())
+        if self.error is not None:
+            raise self.error
+
+    def stats(self):
+        """Frames handed over so far, and the depth and drop counts of the queue they went through."""
+        queue = self.queue
+        if queue is None:
+            return {"frames": 0, "queueDepth": 0, "maxQueueDepth": 0, "drops": 0}
+        return {"frames": self.framesRead, "queueDepth": queue.depth, "maxQueueDepth": queue.maxDepth,
+                "drops": queue.drops}
+
+    def stop(self):
+        super().stop()
+        if self.queue is not None:
+            self.queue.close()
+
+
+def fourcc_name(value):
+    """Decode a CAP_PROP_FOURCC value into its four characters (e.g. "MJPG")."""
+    return int(value).to_bytes(4, "little").decode("ascii", errors="replace").strip("\x00")
+
+
+class CameraSource(FrameSource):
+    """Live camera; paced by the device itself, so `rate` and `loop` do not apply."""
+
+    def __init__(self, deviceId=0, width=None, height=None, fps=None, fourcc=DEFAULT_CAMERA_FOURCC, threaded=True):
+        """
+        Args:
+            width, height, fps: Requested capture mode.
+            fourcc: Requested pixel format. MJPG lets most USB webcams deliver 720p and above at full
+                    frame rate, where the uncompressed YUYV default is limited by USB bandwidth.
+            threaded: Read the camera on a dedicated thread, so cap.read() never waits for the
+                      consumer; the consumer always gets the newest frame.
+        """
+        super().__init__(rate=RATE_MAX)
+        self.deviceId = deviceId
+        self.capture = cv2.VideoCapture(deviceId)
+        if not self.capture.isOpened():
+            raise ValueError(f"Cannot open camera {deviceId}")
+        self._frame = None
+        # The pixel format has to be chosen before the size for V4L2 to pick a matching mode
+        if fourcc:
+            self.capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        if width:
+            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            self.capture.set(cv2.CAP_PROP_FPS, fps)
+        self.mode = self._negotiatedMode()
+        requested = {"width": width, "height": height, "fps": fps, "fourcc": fourcc}
+        mismatched = {key: (value, self.mode[key]) for key, value in requested.items()
+                      if value and self.mode[key] != value}
+        if mismatched:
+            logger.warning("Camera %s did not accept the requested mode (requested, actual): %s",
+                           deviceId, mismatched)
+        self._reader = _CaptureThread(self.capture) if threaded else None
+
+    def _negotiatedMode(self):
+        return {
+            "width": int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": self.capture.get(cv2.CAP_PROP_FPS),
+            "fourcc": fourcc_name(self.capture.get(cv2.CAP_PROP_FOURCC)),
+        }
+
+    def describe(self):
+        mode = self.mode
+        return f"VideoCapture(ID={self.deviceId}, {mode['width']}x{mode['height']} {mode['fourcc']} @ {mode['fps']:g} fps)"
+
+    def _frames(self):
+        if self._reader is not None:
+            while True:
+                frame = self._reader.next()
+                if frame is None:
+                    return
+                yield frame
+        while True:
+            success, frame = self.capture.read(self._frame)
+            if success:
+                self._frame = frame
+                yield frame
+
+    def _captureTime(self):
+        if self._reader is not None:
+            return self._reader.captureNs
+        return super()._captureTime()
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.stop()
+        self.capture.release()
+
+
+class _CaptureThread():
+    """Reads a VideoCapture on its own thread into three rotating buffers.
+
+    One buffer is being decoded into, one holds the newest complete frame and
+    one is lent to the consumer, so neither side ever waits for the other.
+    Frames the consumer did not pick up in time are counted in `dropped`.
+    """
+
+    def __init__(self, capture):
+        self.capture = capture
+        self.captureNs = 0
+        self.dropped = 0
+        self._latestCaptureNs = 0
+        self._buffers = [None, None, None]
+        self._latest = None  # index of the newest complete frame not yet handed out
+        self._held = None  # index of the frame lent to the consumer
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="CameraCapture", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        failures = 0
+        while not self._stopped:
+            with self._condition:
+                index = next(i for i in range(3) if i != self._latest and i != self._held)
+            success, frame = self.capture.read(self._buffers[index])
+            captureNs = time.monotonic_ns()
+            if not success:
+                failures += 1
+                if failures % 100 == 0:
+                    logger.warning("Camera read failed %d times in a row", failures)
+                time.sleep(0.005)
+                continue
+            failures = 0
+            with self._condition:
+                self._buffers[index] = frame
+                if self._latest is not None:
+                    self.dropped += 1
+                self._latest = index
+                self._latestCaptureNs = captureNs
+                self._condition.notify()
+
+    def next(self):
+        """Wait for and return the newest frame; it stays valid until the next call. None once stopped."""
+        with self._condition:
+            while self._latest is None and not self._stopped:
+                self._condition.wait()
+            if self._stopped:
+                return None
+            self._held, self._latest = self._latest, None
+            self.captureNs = self._latestCaptureNs
+            return self._buffers[self._held]
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join(1.0)
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, rate=RATE_NATIVE, loop=False):
+        super().__init__(rate, loop)
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError(f"Cannot open video file {path}")
+        self._frame = None
+
+    @property
+    def nativeFps(self):
+        return self.capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FILE_FPS
+
+    def describe(self):
+        return f"VideoFile({self.path})"
+
+    def _frames(self):
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        while True:
+            success, frame = self.capture.read(self._frame)
+            if not success:
+                return
+            self._frame = frame
+            yield frame
+
+    def close(self):
+        self.capture.release()
+
+
+class ImageDirectorySource(FrameSource):
+    def __init__(self, path, rate=RATE_NATIVE, loop=False, fps=DEFAULT_FILE_FPS):
+        super().__init__(rate, loop)
+        self.path = path
+        self.fps = fps
+        self.files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.files:
+            raise ValueError(f"No images found in {path}")
+
+    @property
+    def nativeFps(self):
+        return self.fps
+
+    def describe(self):
+        return f"ImageDirectory({self.path}, {len(self.files)} images)"
+
+    def _frames(self):
+        for file in self.files:
+            frame = cv2.imread(file, cv2.IMREAD_COLOR)
+            if frame is not None:
+                yield frame
+
+
+class NpyStackSource(FrameSource):
+    def __init__(self, path, rate=RATE_NATIVE, loop=False, fps=DEFAULT_FILE_FPS):
+        super().__init__(rate, loop)
+        self.path = path
+        self.fps = fps
+        self.stack = np.load(path, mmap_mode="r")
+        valid = self.stack.ndim == 3 or (self.stack.ndim == 4 and self.stack.shape[3] == 3)
+        if not valid or self.stack.dtype != np.uint8:
+            raise ValueError(f"{path} must hold uint8 frames shaped (frames, height, width[, 3])")
+
+    @property
+    def nativeFps(self):
+        return self.fps
+
+    def describe(self):
+        return f"NpyStack({self.path}, {len(self.stack)} frames)"
+
+    def _frames(self):
+        # One writable buffer for every frame, so stages can draw on the frames without touching the file
+        buffer = np.empty(self.stack.shape[1:3] + (3,), dtype=np.uint8)
+        for frame in self.stack:
+            if frame.ndim == 2:
+                cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR, dst=buffer)
+            else:
+                np.copyto(buffer, frame)
+            yield buffer
+
+
+def open_source(spec, rate=RATE_NATIVE, loop=False, width=None, height=None, fps=None,
+                fourcc=DEFAULT_CAMERA_FOURCC):
+    """Create a source from a command line style spec.
+
+    A camera index ("0", "camera:1"), a directory of images, a .npy file or a video file.
+    width, height, fps and fourcc configure cameras only.
+    """
+    if spec.startswith("camera:"):
+        spec = spec[len("camera:"):]
+    if spec.isdigit():
+        return CameraSource(int(spec), width, height, fps=fps, fourcc=fourcc)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, rate, loop)
+    if spec.endswith(".npy"):
+        return NpyStackSource(spec, rate, loop)
+    return VideoFileSource(spec, rate, loop)
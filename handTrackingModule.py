@@ -1,6 +1,7 @@
 import math
 
 import cv2
+import numpy as np
 import overlay_colors as colors
 import warnings
 # Suppress noisy protobuf deprecation warnings emitted by some mediapipe/tflite
@@ -8,57 +9,370 @@ import warnings
 warnings.filterwarnings("ignore", message=".*SymbolDatabase.GetPrototype.*")
 import mediapipe
 import time
+from landmarkFilter import ConstantVelocityPredictor
+from bufferPool import BufferPool
+from frameRing import frame_fingerprint, fingerprint_sample_shape
+from frameSources import CameraSource
+import instrumentation
+
+NUM_LANDMARKS = 21
+PALM_INDEXES = [0, 5, 9, 13, 17]
+# Finger tips and the joints they are compared against in fingersUp (thumb uses the x axis)
+_FINGER_TIPS = np.array([8, 12, 16, 20])
+_FINGER_PIPS = _FINGER_TIPS - 2
+_EMPTY_BOXES = np.zeros((0, 4), dtype=np.int32)
+# Values of HandDetector.handedness
+HANDEDNESS_UNKNOWN = -1
+HANDEDNESS_LEFT = 0
+HANDEDNESS_RIGHT = 1
 
 class HandDetector():
-    def __init__(self, static_image_mode=False, max_num_hands=2, min_detection_confidence=0.5, min_tracking_confidence=0.5):
+    def __init__(self, static_image_mode=False, max_num_hands=2, min_detection_confidence=0.5, min_tracking_confidence=0.5,
+                 roiTracking=False, roiPadding=0.5, roiMinSize=192, roiFullFrameInterval=30,
+                 detectEvery=1, detectInterval=None, predictor=None, adaptiveDecimation=True, motionThreshold=0.5,
+                 bufferPool=None, skipDuplicates=True):
+        """
+        Args:
+            roiTracking: Run MediaPipe only on a crop around the hands found in the previous frame,
+                         falling back to the full frame when the hands are lost. The crop stays in
+                         place while the hands are inside it and has its own MediaPipe graph, which
+                         is reset whenever the crop moves.
+            roiPadding: Padding added on every side of the previous hand box, as a fraction of its larger side.
+            roiMinSize: Minimum crop width/height in pixels.
+            roiFullFrameInterval: Process the full frame at least every this many frames so new hands are found.
+            detectEvery: Run MediaPipe only every this many frames; landmarks in between are predicted.
+            detectInterval: Alternatively run MediaPipe at most every this many seconds (overrides detectEvery).
+            predictor: Landmark filter used for the in-between frames (see landmarkFilter.py).
+                       Defaults to a ConstantVelocityPredictor when decimation is enabled.
+            adaptiveDecimation: Shorten the interval in proportion when predicted motion exceeds motionThreshold.
+            motionThreshold: Landmark speed (normalized image units per second) above which inference runs more often.
+            bufferPool: BufferPool for the RGB copy handed to MediaPipe (a private pool by default).
+            skipDuplicates: Keep the previous landmarks instead of running inference again when a frame
+                            repeats the previous one (same frameId, or same frame_fingerprint()).
+        """
         self.static_image_mode = static_image_mode
         self.max_num_hands = max_num_hands
         self.min_detection_confidence = min_detection_confidence
         self.min_tracking_confidence = min_tracking_confidence
 
+        self.roiTracking = roiTracking
+        self.roiPadding = roiPadding
+        self.roiMinSize = roiMinSize
+        self.roiFullFrameInterval = roiFullFrameInterval
+        self.roi = None  # x1, y1, x2, y2 of the crop used for the last detection (None = full frame)
+        self.roiFrames = 0
+        self.roiResets = 0
+        self.roiHands = None  # graph that only ever sees the crop in self._roiCrop
+        self._roiCrop = None
+        self.fullFrames = 0
+        self._trackedBox = None
+        self._framesSinceFullFrame = 0
+
+        self.detectEvery = detectEvery
+        self.detectInterval = detectInterval
+        if predictor is None and (detectEvery > 1 or detectInterval is not None):
+            predictor = ConstantVelocityPredictor()
+        self.predictor = predictor
+        self.adaptiveDecimation = adaptiveDecimation
+        self.motionThreshold = motionThreshold
+        self.predicted = False  # True when the current landmarks were predicted instead of detected
+        self.inferenceFrames = 0
+        self.predictedFrames = 0
+        self._lastInferenceTime = 0.0
+        self._framesSinceInference = 0
+        self.bufferPool = bufferPool if bufferPool is not None else BufferPool()
+        self.skipDuplicates = skipDuplicates
+        self.duplicateFrames = 0
+        self._lastFrameId = None
+
         self.landmarkList = []
+        # Normalized (x, y, z) of every detected hand, float32 (hands, 21, 3)
+        self.landmarks = np.zeros((0, NUM_LANDMARKS, 3), dtype=np.float32)
+        # Pixel [index, x, y] rows of every detected hand, int32 (hands, 21, 3)
+        self.positions = np.zeros((0, NUM_LANDMARKS, 3), dtype=np.int32)
+        # Pixel rows of the hand selected in findPositions, used by fingersUp/findDistance
+        self.handPositions = np.zeros((0, 3), dtype=np.int32)
+        # HANDEDNESS_* value and classification score of every detected hand
+        self.handedness = np.zeros(0, dtype=np.int8)
+        self.scores = np.zeros(0, dtype=np.float32)
 
         self.mpHands = mediapipe.solutions.hands
-        self.hands = self.mpHands.Hands(static_image_mode=self.static_image_mode,
-                              max_num_hands=self.max_num_hands,
-                              min_detection_confidence=self.min_detection_confidence,
-                              min_tracking_confidence=self.min_tracking_confidence)
+        self.hands = self._createModel()
         self.mpDraw = mediapipe.solutions.drawing_utils
         self.tipIndexes = [4, 8, 12, 16, 20]
 
-    def detectHands(self, img, draw=True):
-        imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        self.results = self.hands.process(imgRGB)
+    def _createModel(self):
+        # Loads the MediaPipe graph; subclasses running inference elsewhere (inferenceDaemon.py) skip it
+        return self._createHands()
+
+    def _createHands(self):
+        return self.mpHands.Hands(static_image_mode=self.static_image_mode,
+                                  max_num_hands=self.max_num_hands,
+                                  min_detection_confidence=self.min_detection_confidence,
+                                  min_tracking_confidence=self.min_tracking_confidence)
+
+    def reset(self):
+        """Forget the hands tracked so far, e.g. before the detector is handed to another video stream."""
+        if hasattr(self.hands, "reset"):
+            self.hands.reset()
+        self.roi = None
+        self._roiCrop = None  # the next crop starts its graph afresh (see _resetRoiModel)
+        self._trackedBox = None
+        self._framesSinceFullFrame = 0
+        if self.predictor is not None:
+            self.predictor.reset()
+        self.predicted = False
+        self._lastInferenceTime = 0.0
+        self._framesSinceInference = 0
+        self._lastFrameId = None
+        self.landmarks = np.zeros((0, NUM_LANDMARKS, 3), dtype=np.float32)
+        self.handedness = np.zeros(0, dtype=np.int8)
+        self.scores = np.zeros(0, dtype=np.float32)
+
+    def close(self):
+        """Release the MediaPipe graphs."""
+        for hands in (self.hands, self.roiHands):
+            if hasattr(hands, "close"):
+                hands.close()
+        self.hands = self.roiHands = None
+
+    def detectHands(self, img, draw=True, frameId=None):
+        """Find the hands in img (BGR). frameId identifies the frame, e.g. its ring sequence number;
+        without it a content fingerprint is used to recognise repeated frames."""
+        if self.skipDuplicates:
+            if frameId is None:
+                sample = self.bufferPool.get("fingerprint", fingerprint_sample_shape(img.shape), img.dtype)
+                frameId = frame_fingerprint(img, out=sample)
+            if frameId == self._lastFrameId:
+                # Nothing new to see: keep the landmarks (and predictor state) of the previous frame
+                self.duplicateFrames += 1
+                if draw:
+                    self._drawLandmarks(img)
+                return
+            self._lastFrameId = frameId
+
+        now = time.monotonic()
+        if not self._shouldInfer(now):
+            # Skip MediaPipe on this frame and extrapolate the last landmarks instead
+            landmarks = self.landmarks.copy()
+            landmarks[:, :, :2] = self.predictor.predict(now)
+            self.landmarks = landmarks
+            self.predicted = True
+            self.predictedFrames += 1
+            self._framesSinceInference += 1
+            if self.roiTracking:
+                self._trackedBox = self._landmarkBox(img.shape)
+            if draw:
+                self._drawLandmarks(img)
+            return
+
+        self._infer(img)
+        self.predicted = False
+        self.inferenceFrames += 1
+        self._lastInferenceTime = now
+        self._framesSinceInference = 0
+        if self.predictor is not None:
+            if len(self.landmarks):
+                self.predictor.update(self.landmarks[:, :, :2], now)
+            else:
+                self.predictor.reset()
 
         if self.results.multi_hand_landmarks:
             for handLandmarks in self.results.multi_hand_landmarks:
                 if draw:
                     self.mpDraw.draw_landmarks(img, handLandmarks, self.mpHands.HAND_CONNECTIONS)
 
+    def _shouldInfer(self, now):
+        if self.predictor is None or self.predictor.value is None:
+            return True
+        scale = 1.0
+        if self.adaptiveDecimation and self.predictor.speed > self.motionThreshold:
+            scale = self.motionThreshold / self.predictor.speed
+        if self.detectInterval is not None:
+            return now - self._lastInferenceTime >= self.detectInterval * scale
+        return self._framesSinceInference + 1 >= max(1, int(self.detectEvery * scale))
+
+    def _infer(self, img):
+        self.roi = self._nextRoi(img) if self.roiTracking else None
+        if self.roi is not None:
+            if self.roi != self._roiCrop:
+                self._resetRoiModel(self.roi)
+            x1, y1, x2, y2 = self.roi
+            start = instrumentation.start()
+            imgRGB = self._toRGB(img[y1:y2, x1:x2])
+            instrumentation.stop("colorConversion", start)
+            start = instrumentation.start()
+            self.results = self.roiHands.process(imgRGB)
+            instrumentation.stop("inference", start)
+            if self.results.multi_hand_landmarks:
+                self._cropToFrame(self.results, self.roi, img.shape)
+                self.roiFrames += 1
+            else:
+                self.roi = self._roiCrop = None  # Hand left the crop, look at the whole frame again
+
+        if self.roi is None:
+            start = instrumentation.start()
+            imgRGB = self._toRGB(img)
+            instrumentation.stop("colorConversion", start)
+            start = instrumentation.start()
+            self.results = self.hands.process(imgRGB)
+            instrumentation.stop("inference", start)
+            self.fullFrames += 1
+            self._framesSinceFullFrame = 0
+        else:
+            self._framesSinceFullFrame += 1
+        self.landmarks = self._landmarkArray(self.results)
+        self.handedness, self.scores = self._handednessArrays(self.results, len(self.landmarks))
+        if self.roiTracking:
+            self._trackedBox = self._landmarkBox(img.shape)
+
+    def _toRGB(self, img):
+        # Converted into a reused buffer; MediaPipe is done with it once process() returns
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self.bufferPool.get("rgb", img.shape))
+
+    def _drawLandmarks(self, img):
+        # Same look as mediapipe's draw_landmarks, but from the landmark array (used for predicted frames)
+        imgHeight, imgWidth = img.shape[:2]
+        points = (self.landmarks[:, :, :2] * np.array([imgWidth, imgHeight])).astype(np.int32).tolist()
+        for hand in points:
+            for start, end in self.mpHands.HAND_CONNECTIONS:
+                cv2.line(img, tuple(hand[start]), tuple(hand[end]), colors.COLOR_LANDMARK_CONNECTION, 2)
+            for point in hand:
+                cv2.circle(img, tuple(point), 2, colors.COLOR_LANDMARK_POINT, 2)
+
+    def _resetRoiModel(self, roi):
+        # MediaPipe tracks landmarks in the coordinates of the image it was given, so tracking state
+        # from a crop of another position or size would be wrong: start the crop graph afresh
+        if self.roiHands is None or not hasattr(self.roiHands, "reset"):
+            self.roiHands = self._createHands()
+        else:
+            self.roiHands.reset()
+        self._roiCrop = roi
+        self.roiResets += 1
+
+    def _nextRoi(self, img):
+        if self._trackedBox is None or self._framesSinceFullFrame >= self.roiFullFrameInterval:
+            self._roiCrop = None
+            return None
+        imgHeight, imgWidth = img.shape[:2]
+        x1, y1, x2, y2 = self._trackedBox
+        if self._roiCrop is not None:
+            # Landmarks may lie beyond the image edge; a crop reaching that edge cannot grow past it
+            cropX1, cropY1, cropX2, cropY2 = self._roiCrop
+            if ((cropX1 <= x1 or cropX1 == 0) and (cropY1 <= y1 or cropY1 == 0) and
+                    (x2 <= cropX2 or cropX2 == imgWidth) and (y2 <= cropY2 or cropY2 == imgHeight)):
+                return self._roiCrop  # Hands still inside: keep the crop and the graph's tracking state
+        pad = self.roiPadding * max(x2 - x1, y2 - y1)
+        halfWidth = max((x2 - x1) / 2 + pad, self.roiMinSize / 2)
+        halfHeight = max((y2 - y1) / 2 + pad, self.roiMinSize / 2)
+        centerX, centerY = (x1 + x2) / 2, (y1 + y2) / 2
+        roi = (max(0, int(centerX - halfWidth)), max(0, int(centerY - halfHeight)),
+               min(imgWidth, int(centerX + halfWidth)), min(imgHeight, int(centerY + halfHeight)))
+        if (roi[2] - roi[0]) * (roi[3] - roi[1]) >= 0.8 * imgWidth * imgHeight:
+            return None  # Crop would be almost the whole frame anyway
+        return roi
+
+    def _landmarkBox(self, shape):
+        if not len(self.landmarks):
+            return None
+        imgHeight, imgWidth = shape[:2]
+        points = self.landmarks[:, :, :2].reshape(-1, 2) * np.array([imgWidth, imgHeight], dtype=np.float64)
+        return (*points.min(axis=0), *points.max(axis=0))
+
+    @staticmethod
+    def _cropToFrame(results, roi, shape):
+        # Landmarks are normalized to the crop; rewrite them in place relative to the full frame
+        imgHeight, imgWidth = shape[:2]
+        x1, y1, x2, y2 = roi
+        scaleX, scaleY = (x2 - x1) / imgWidth, (y2 - y1) / imgHeight
+        offsetX, offsetY = x1 / imgWidth, y1 / imgHeight
+        for hand in results.multi_hand_landmarks:
+            for landmark in hand.landmark:
+                landmark.x = landmark.x * scaleX + offsetX
+                landmark.y = landmark.y * scaleY + offsetY
+                landmark.z = landmark.z * scaleX
+
+    @staticmethod
+    def _landmarkArray(results):
+        if not results.multi_hand_landmarks:
+            return np.zeros((0, NUM_LANDMARKS, 3), dtype=np.float32)
+        return np.array([[(landmark.x, landmark.y, landmark.z) for landmark in hand.landmark]
+                         for hand in results.multi_hand_landmarks], dtype=np.float32)
+
+    @staticmethod
+    def _handednessArrays(results, hands):
+        handedness = np.full(hands, HANDEDNESS_UNKNOWN, dtype=np.int8)
+        scores = np.zeros(hands, dtype=np.float32)
+        for index, classifications in enumerate((getattr(results, "multi_handedness", None) or [])[:hands]):
+            best = classifications.classification[0]
+            handedness[index] = HANDEDNESS_LEFT if best.label == "Left" else HANDEDNESS_RIGHT
+            scores[index] = best.score
+        return handedness, scores
+
+    def loadLandmarks(self, landmarks, handedness=None, scores=None, img=None, draw=False):
+        """Use landmarks detected elsewhere (e.g. read from landmarkChannel) instead of running MediaPipe.
+
+        landmarks is a normalized (hands, 21, 3) array like self.landmarks; findPositions,
+        fingersUp and findDistance then work on it as usual.
+        """
+        hands = len(landmarks)
+        self.landmarks = np.asarray(landmarks, dtype=np.float32)
+        self.handedness = (np.asarray(handedness, dtype=np.int8) if handedness is not None
+                           else np.full(hands, HANDEDNESS_UNKNOWN, dtype=np.int8))
+        self.scores = np.asarray(scores, dtype=np.float32) if scores is not None else np.zeros(hands, dtype=np.float32)
+        self.predicted = False
+        if draw and img is not None:
+            self._drawLandmarks(img)
+
+    def findPositionsArray(self, img, draw=True):
+        """Project every detected hand to pixel coordinates in one vectorized pass.
+
+        Returns (positions, handBoundingBoxes, palmBoundingBoxes): positions is an
+        int32 (hands, 21, 3) array of [index, x, y] rows (the layout of
+        findPositions' list), the boxes are int32 (hands, 4) arrays of
+        x1, y1, x2, y2.
+        """
+        start = instrumentation.start()
+        imgHeight, imgWidth = img.shape[:2]
+        hands = len(self.landmarks)
+        positions = np.empty((hands, NUM_LANDMARKS, 3), dtype=np.int32)
+        positions[:, :, 0] = np.arange(NUM_LANDMARKS)
+        positions[:, :, 1:] = self.landmarks[:, :, :2] * np.array([imgWidth, imgHeight], dtype=np.float64)
+        self.positions = positions
+
+        if not hands:
+            instrumentation.stop("landmarkProjection", start)
+            return positions, _EMPTY_BOXES, _EMPTY_BOXES
+        points = positions[:, :, 1:]
+        palmPoints = points[:, PALM_INDEXES]
+        handBoundingBoxes = np.concatenate((points.min(axis=1), points.max(axis=1)), axis=1)
+        palmBoundingBoxes = np.concatenate((palmPoints.min(axis=1), palmPoints.max(axis=1)), axis=1)
+        instrumentation.stop("landmarkProjection", start)
+
+        if draw:
+            for imgX, imgY in points.reshape(-1, 2).tolist():
+                cv2.circle(img, (imgX, imgY), 5, colors.COLOR_LANDMARK_SMALL_BLUE, cv2.FILLED)
+
+        return positions, handBoundingBoxes, palmBoundingBoxes
+
     def findPositions(self, img, handNumber=0, draw=True):
+        """List-based view of findPositionsArray for a single hand (kept for existing scripts)."""
         self.landmarkList = []
-        xHandList, yHandList = [], []
-        xPalmList, yPalmList = [], []
         handBoundingBox = ()
         palmBoundingBox = ()
 
-        if self.results.multi_hand_landmarks:
-            hand = self.results.multi_hand_landmarks[handNumber]
-            for index, landmark in enumerate(hand.landmark):
-                imgHeight, imgWidth, imgChannels = img.shape
-                imgX, imgY = int(landmark.x * imgWidth), int(landmark.y * imgHeight)
-                xHandList.append(imgX)
-                yHandList.append(imgY)
-                self.landmarkList.append([index, imgX, imgY])
-                if index in [0, 5, 9, 13, 17]:
-                    xPalmList.append(imgX)
-                    yPalmList.append(imgY)
+        positions, handBoundingBoxes, palmBoundingBoxes = self.findPositionsArray(img, draw=False)
+        if len(positions):
+            self.handPositions = positions[handNumber]
+            self.landmarkList = self.handPositions.tolist()
+            handBoundingBox = tuple(handBoundingBoxes[handNumber].tolist())
+            palmBoundingBox = tuple(palmBoundingBoxes[handNumber].tolist())
 
-                if draw:
+            if draw:
+                for index, imgX, imgY in self.landmarkList:
                     cv2.circle(img, (imgX, imgY), 5, colors.COLOR_LANDMARK_SMALL_BLUE, cv2.FILLED)
-
-            handBoundingBox = min(xHandList), min(yHandList), max(xHandList), max(yHandList)
-            palmBoundingBox = min(xPalmList), min(yPalmList), max(xPalmList), max(yPalmList)
+        else:
+            self.handPositions = np.zeros((0, 3), dtype=np.int32)
 
         ### Draw bounding boxes
         # if draw:
@@ -71,27 +385,35 @@ class HandDetector():
 
         return self.landmarkList, handBoundingBox, palmBoundingBox
 
+    def fingersUpArray(self, positions=None):
+        """Return a (hands, 5) uint8 array with 1 for every extended finger (thumb first)."""
+        if positions is None:
+            positions = self.positions
+        fingers = np.empty((len(positions), 5), dtype=np.uint8)
+        fingers[:, 0] = positions[:, 4, 1] > positions[:, 3, 1]
+        fingers[:, 1:] = positions[:, _FINGER_TIPS, 2] < positions[:, _FINGER_PIPS, 2]
+        return fingers
+
     def fingersUp(self):
-        fingers = []
+        return self.fingersUpArray(self.handPositions[np.newaxis])[0].tolist()
 
-        # Thumb
-        if self.landmarkList[self.tipIndexes[0]][1] > self.landmarkList[self.tipIndexes[0] - 1][1]:
-            fingers.append(1)
-        else:
-            fingers.append(0)
-        # Other fingers
-        for index in range(1, 5):
-            if self.landmarkList[self.tipIndexes[index]][2] < self.landmarkList[self.tipIndexes[index] - 2][2]:
-                fingers.append(1)
-            else:
-                fingers.append(0)
+    def findDistanceArray(self, landmark1Id, landmark2Id, positions=None):
+        """Distance between two landmarks for every hand.
 
-        return fingers
+        Returns (lengths, points): float (hands,) lengths and int32 (hands, 6)
+        rows of x1, y1, x2, y2, midX, midY.
+        """
+        if positions is None:
+            positions = self.positions
+        p1 = positions[:, landmark1Id, 1:]
+        p2 = positions[:, landmark2Id, 1:]
+        lengths = np.hypot(*(p2 - p1).T.astype(np.float64))
+        points = np.concatenate((p1, p2, (p1 + p2) // 2), axis=1)
+        return lengths, points
 
     def findDistance(self, landmark1Id, landmark2Id, img, draw=True):
-        x1, y1 = self.landmarkList[landmark1Id][1::]
-        x2, y2 = self.landmarkList[landmark2Id][1::]
-        midX, midY = (x1 + x2) // 2, (y1 + y2) // 2
+        _, points = self.findDistanceArray(landmark1Id, landmark2Id, self.handPositions[np.newaxis])
+        x1, y1, x2, y2, midX, midY = points[0].tolist()
         length = math.hypot(x2 - x1, y2 - y1)
 
         if draw:
@@ -103,28 +425,12 @@ class HandDetector():
             cv2.circle(img, (midX, midY), 10, colors.COLOR_LINE, cv2.FILLED)
 
         return length, [x1, y1, x2, y2, midX, midY]
-def main():
-    capture = cv2.VideoCapture(0)
-
-    currentTime = 0
-    prevTime = 0
-
+def main(deviceId=0, width=None, height=None, fps=None, fourcc=None):
+    """Show the detected hands of a camera; the capture mode is the driver's unless chosen (see CameraSource)."""
     handDetector = HandDetector()
-
-    while True:
-        success, img = capture.read()
-
-        handDetector.detectHands(img)
-        landmarkList = handDetector.findPositions(img)
-
-        currentTime = time.time()
-        fps = 1 / (currentTime - prevTime)
-        prevTime = currentTime
-
-        cv2.putText(img, str(int(fps)), (5, 30), cv2.FONT_HERSHEY_SCRIPT_SIMPLEX, 1, colors.COLOR_GREEN, 2)
-
-        cv2.imshow("Image", img)
-        cv2.waitKey(1)
+    # Camera -> detect -> draw positions -> frame rate -> window (see frameSources.py)
+    source = CameraSource(deviceId, width, height, fps=fps, fourcc=fourcc)
+    source.detect(handDetector).map(handDetector.findPositions).drawFps().run("Image")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
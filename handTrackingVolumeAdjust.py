@@ -1,6 +1,6 @@
 import cv2
-import time
 import handTrackingModule
+from frameSources import CameraSource
 import numpy as np
 import math
 import overlay_colors as colors
@@ -17,20 +17,13 @@ def main():
     minVolume, maxVolume = volumeRange[0:2]
 
     camWidth, camHeight = 1280, 720
-    capture = cv2.VideoCapture(0)
-    capture.set(3, camWidth)
-    capture.set(4, camHeight)
-
-    prevTime = 0
     volumeBar = 400
 
     handDetector = handTrackingModule.HandDetector(min_detection_confidence=0.7)
 
-    while True:
-        success, img = capture.read()
-
-        handDetector.detectHands(img)
-        landmarkList = handDetector.findPositions(img, handNumber=0)
+    def adjust_volume(img):
+        nonlocal volumeBar
+        landmarkList = handDetector.findPositions(img, handNumber=0)[0]
 
         if landmarkList:
             x1, y1 = landmarkList[4][1::]
@@ -58,14 +51,7 @@ def main():
         cv2.rectangle(img, (50, 150), (85, 400), colors.COLOR_BLUE, 3)
         cv2.rectangle(img, (50, int(volumeBar)), (85, 400), colors.COLOR_BLUE, cv2.FILLED)
 
-        currentTime = time.time()
-        fps = 1 / (currentTime - prevTime)
-        prevTime = currentTime
-
-        cv2.putText(img, str(int(fps)), (5, 30), cv2.FONT_HERSHEY_SCRIPT_SIMPLEX, 1, colors.COLOR_GREEN, 2)
-
-        cv2.imshow("Image", img)
-        cv2.waitKey(1)
+    CameraSource(0, camWidth, camHeight, fourcc=None).detect(handDetector).map(adjust_volume).drawFps().run("Image")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,16 +1,22 @@
+import argparse
 import logging
 import frameClient
+import frameSources
 # Use a module logger instead of importing from venv (that module doesn't export a logger)
 logger = logging.getLogger(__name__)
 # Configure basic logging so errors are visible when running as a script.
 logging.basicConfig(level=logging.INFO)
 import cv2
 import overlay_colors as colors
+import hudOverlay
 import time
 import handTrackingModule
 import numpy as np
 import math
-import audio
+from volumeActuator import VolumeActuator
+from volumeState import VolumeState, start_volume_watcher
+from landmarkChannel import LandmarkReader, landmark_ring_path, NUM_LANDMARKS
+import instrumentation
 
 ### Uncomment to initialize video capture here
 # camWidth, camHeight = 1280, 720
@@ -20,32 +26,77 @@ import audio
 
 prevTime = 0
 volumeBar = 400
-cached_volume = 0
-last_volume_check = 0
 
-lastFingerEventTime = time.time()
-
-handDetector = handTrackingModule.HandDetector(min_detection_confidence=0.7, max_num_hands=1)
+# Created by main() (or the first process_frame): runs MediaPipe here unless landmarks are shared
+handDetector = None
+# Last known system volume, kept up to date by the actuator and a change watcher (see main)
+volumeState = VolumeState()
+# Applies volume changes on a background thread (at most 5 per second, ignoring +-1% jitter)
+volumeActuator = VolumeActuator(deadband=1, maxRate=5.0, state=volumeState)
+# Cached HUD layer drawn over every processed frame
+hud = hudOverlay.VolumeHud()
+# Reads landmarks published by `cameraServer.py --detect` instead of running MediaPipe here (see main)
+landmarkReader = None
+# How long a frame waits for the server's landmarks of that frame before it is treated as handless
+SHARED_LANDMARK_TIMEOUT = 0.1
+NO_HANDS = np.empty((0, NUM_LANDMARKS, 3), dtype=np.float32)
+# Prints per-stage latency histograms every few seconds when instrumentation is enabled
+metricsReporter = instrumentation.Reporter(interval=5.0)
 
 def boundingBoxArea(boundingBox) :
     return (boundingBox[2] - boundingBox[0]) * (boundingBox[3] - boundingBox[1])
 
-def process_frame(img, draw=True):
-    global prevTime, volumeBar, handDetector
-    global lastFingerEventTime
-    global cached_volume, last_volume_check
-    isAdjustingVolume = False
+def draw_overlay(img, volumeBar, isAdjustingVolume, currentVolume):
+    # Static parts and text are cached sprites; only changed values are rendered again (see hudOverlay.py)
+    hud.draw(img, volumeBar, isAdjustingVolume, currentVolume)
+
+class SharedLandmarkDetector(handTrackingModule.HandDetector):
+    """HandDetector without a MediaPipe graph, fed with the camera server's landmarks via loadLandmarks()."""
+
+    def _createModel(self):
+        return None
 
+def create_hand_detector(sharedLandmarks=False):
+    detectorClass = SharedLandmarkDetector if sharedLandmarks else handTrackingModule.HandDetector
+    return detectorClass(min_detection_confidence=0.7, max_num_hands=1)
 
-    handDetector.detectHands(img)
-    landmarkList, handBoundingBox, palmBoundingBox = handDetector.findPositions(img, handNumber=0)
+def shared_landmarks():
+    """Return the LandmarkRecord of the frame being processed, or None if the server has none for it."""
+    reference = frameClient.frame_reference()
+    if reference is None:
+        return None
+    return landmarkReader.readFrame(reference[1], timeout=SHARED_LANDMARK_TIMEOUT)
 
+def process_frame(img, draw=True, show=True):
+    global prevTime, volumeBar, handDetector
+    isAdjustingVolume = False
+    frameStart = instrumentation.start()
+    if handDetector is None:
+        handDetector = create_hand_detector(sharedLandmarks=landmarkReader is not None)
+
+    if landmarkReader is not None:
+        record = shared_landmarks()
+        if record is not None:
+            handDetector.loadLandmarks(record.landmarks, record.handedness, record.scores, img, draw=draw)
+        else:
+            # Another frame's hands must not move the volume, so this frame counts as one without hands
+            handDetector.loadLandmarks(NO_HANDS)
+    else:
+        # The server's fingerprint (or sequence) of the frame spares the detector hashing it again
+        info = frameSources.current_frame()
+        handDetector.detectHands(img, draw=draw, frameId=info.frameId if info else None)
+    captureNs = frameClient.frame_capture_ns()
+    if captureNs is not None:
+        instrumentation.record("captureToInference", time.monotonic_ns() - captureNs)
+    landmarkList, handBoundingBox, palmBoundingBox = handDetector.findPositions(img, handNumber=0, draw=draw)
+
+    gestureStart = instrumentation.start()
     if landmarkList:
         palmArea = boundingBoxArea(palmBoundingBox) // 100
 
         if 20 < palmArea < 1000:
             # Find distance
-            length, info = handDetector.findDistance(4, 8, img, draw=True)
+            length, info = handDetector.findDistance(4, 8, img, draw=draw)
             midX, midY = info[4:6]
 
             # Convert volume
@@ -62,48 +113,21 @@ def process_frame(img, draw=True):
             fingersUpState = handDetector.fingersUp()
             fingerStateCorrect = (fingersUpState[2] == 0 and fingersUpState[3] == 0 and fingersUpState[4] == 1)
             if fingerStateCorrect:
-                currentTime = time.time()
                 isAdjustingVolume = True
-                if (currentTime - lastFingerEventTime) > 0.2:
-                    # set system volume (percent 0-100)
-                    try:
-                        if abs(volumePercentage - cached_volume) > 1:
-                            audio.set_volume(volumePercentage)
-                            cached_volume = volumePercentage
-                    except Exception:
-                        # on failure, ignore so UI still runs
-                        logger.debug("Failed to set volume", exc_info=True)
-                        pass
-                    lastFingerEventTime = currentTime
+                # set system volume (percent 0-100) without waiting for the audio backend
+                volumeActuator.post(volumePercentage, captureNs=captureNs)
             else:
                 isAdjustingVolume = False
             if draw:
                 circleColor = colors.COLOR_GREEN if isAdjustingVolume else colors.COLOR_LINE
                 cv2.circle(img, (midX, midY), 10, circleColor, cv2.FILLED)
+    instrumentation.stop("gesture", gestureStart)
 
     # Drawings
     if draw:
-        # Finger distance bar
-        dx, dy = -140, 75
-        x_fill = 150 + (400 - int(volumeBar)) + dx
-        x_fill = max(150 + dx, min(400 + dx, x_fill))
-        barFillColor = colors.COLOR_GREEN if isAdjustingVolume else colors.COLOR_LINE
-        cv2.rectangle(img, (150 + dx, 5 + dy), (x_fill, 20 + dy), barFillColor, cv2.FILLED)
-        cv2.rectangle(img, (150 + dx, 5 + dy), (400 + dx, 20 + dy), colors.COLOR_LINE, 3)
-
-        currentTime = time.time()
-        if currentTime - last_volume_check > 0.5:
-            try:
-                cached_volume = int(audio.get_volume())
-            except Exception:
-                pass
-            last_volume_check = currentTime
-        currentVolume = cached_volume
-
-        adjustingAudioTextColor = colors.COLOR_GREEN if isAdjustingVolume else colors.COLOR_WHITE
-        adjustingAudioText = f'Changing audio' if isAdjustingVolume else 'Not changing audio'
-        cv2.putText(img, adjustingAudioText, (5, 70), cv2.FONT_HERSHEY_PLAIN, 1, adjustingAudioTextColor, 2)
-        cv2.putText(img, f'AUDIO={currentVolume}%', (0, 45), cv2.FONT_HERSHEY_PLAIN, 2, colors.COLOR_GREEN, 2)
+        drawStart = instrumentation.start()
+        draw_overlay(img, volumeBar, isAdjustingVolume, volumeState.get())
+        instrumentation.stop("drawing", drawStart)
 
     # Frame rate
     currentTime = time.time()
@@ -111,27 +135,91 @@ def process_frame(img, draw=True):
     prevTime = currentTime
     # cv2.putText(img, f'{str(int(fps))}FPS', (5, 20), cv2.FONT_HERSHEY_PLAIN, 1, colors.COLOR_GREEN, 2)
 
-    # Render
-    cv2.imshow("Detector (press q to exit)", img)
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        raise KeyboardInterrupt # Exits
-
-if __name__ == "__main__":
-    # Keep the behavior when executed as a script, but expose a callable main()
-    def main(showOriginalFrame=False):
-        """Run the V2 volume adjuster.
-
-        Args:
-            showOriginalFrame (bool): If True, the original shared frame window will be shown
-                                     alongside the processed view. Defaults to False.
-        """
+    # Render (the pipelined runner renders the returned image on its own thread instead)
+    if show:
+        with instrumentation.span("display"):
+            cv2.imshow("Detector (press q to exit)", img)
+            key = cv2.waitKey(1)
+        if key & 0xFF == ord('q'):
+            raise KeyboardInterrupt # Exits
+    instrumentation.stop("frame", frameStart)
+    metricsReporter.maybeReport()
+    return img
+
+def main(showOriginalFrame=False, pipelined=False, metrics=False, maxFrameAge=None, headless=False,
+         sharedLandmarks=False):
+    """Run the V2 volume adjuster.
+
+    Args:
+        showOriginalFrame (bool): If True, the original shared frame window will be shown
+                                 alongside the processed view. Defaults to False.
+        pipelined (bool): If True, frame reading, detection and rendering run on separate
+                          threads so throughput is bound by the slowest stage. The processed
+                          view is shown in the pipeline window. Defaults to False.
+        metrics (bool): If True, record per-stage latency histograms and print a summary
+                        every few seconds (same as FTVC_METRICS=1). Defaults to False.
+        maxFrameAge (float): Drop frames captured more than this many seconds ago instead of
+                             acting on them. Defaults to None (keep every frame).
+        headless (bool): If True, nothing is drawn or shown and no OpenCV window is opened,
+                         for hosts without a display. Stop with CTRL+C or SIGTERM. Defaults to False.
+        sharedLandmarks (bool): If True, use the landmarks the camera server publishes when started
+                                with --detect instead of running hand detection in this process.
+                                Defaults to False.
+    """
+    global landmarkReader, handDetector
+    if metrics:
+        instrumentation.enable()
+    if sharedLandmarks:
+        landmarkPath = landmark_ring_path(frameClient.FRAME_RING_PATH)
         try:
-            frameClient.main(callbackFunc=process_frame, showOriginalFrame=showOriginalFrame)
-        except KeyboardInterrupt:
-            print("Exited by user")
+            landmarkReader = LandmarkReader(landmarkPath)
+        except FileNotFoundError:
+            print(f"Error: The landmark ring {landmarkPath} does not exist. "
+                  "Please start the server with 'python cameraServer.py --detect'.")
+            return
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+    handDetector = create_hand_detector(sharedLandmarks)
+    volumeWatcher = start_volume_watcher(volumeState)
+    try:
+        if headless:
+            # Nothing writes to the frame, so the callback can read it straight from shared memory
+            frameClient.main(callbackFunc=lambda img: process_frame(img, draw=False, show=False),
+                             zeroCopy=not pipelined, pipelined=pipelined, maxFrameAge=maxFrameAge, headless=True)
+        elif pipelined:
+            frameClient.main(callbackFunc=lambda img: process_frame(img, show=False),
+                             windowName="Detector (press q to exit)", showOriginalFrame=True, pipelined=True,
+                             maxFrameAge=maxFrameAge)
+        else:
+            frameClient.main(callbackFunc=process_frame, showOriginalFrame=showOriginalFrame,
+                             maxFrameAge=maxFrameAge)
+    except KeyboardInterrupt:
+        print("Exited by user")
+    finally:
+        if landmarkReader is not None:
+            landmarkReader.close()
+            landmarkReader = None
+        volumeWatcher.stop()
+        volumeActuator.stop()
+        logger.info("Volume actuator stats: %s", volumeActuator.stats())
+        if handDetector.duplicateFrames:
+            logger.info("Hand detector skipped %d repeated frames", handDetector.duplicateFrames)
+        if instrumentation.enabled:
+            print(instrumentation.format_summary())
 
-    # Execute when run as a script
-    main(showOriginalFrame=False)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Control the system volume with hand gestures")
+    parser.add_argument("--headless", action="store_true", help="Run without drawing or any window")
+    parser.add_argument("--pipelined", action="store_true", help="Run reading, detection and rendering on separate threads")
+    parser.add_argument("--metrics", action="store_true", help="Print per-stage latency histograms")
+    parser.add_argument("--show-original", action="store_true", help="Also show the unprocessed shared frame")
+    parser.add_argument("--max-frame-age", type=float, help="Drop frames older than this many seconds")
+    parser.add_argument("--shared-landmarks", action="store_true",
+                        help="Use the landmarks published by 'cameraServer.py --detect' instead of detecting here")
+    args = parser.parse_args()
+    main(showOriginalFrame=args.show_original, pipelined=args.pipelined, metrics=args.metrics,
+         maxFrameAge=args.max_frame_age, headless=args.headless, sharedLandmarks=args.shared_landmarks)
 
     ### Uncomment this to use local video capture (comment out the frameClient line)
     # while True:
@@ -0,0 +1,125 @@
+"""Cached HUD compositing for the V2 volume overlay.
+
+Drawing the HUD with cv2.rectangle / cv2.putText on every frame repeats the
+same rasterization work even when nothing changed. Here every HUD element is
+rendered once into a small sprite (a BGR tile plus a mask, cropped to the
+pixels it covers) and cached by the state it shows. A frame then only costs a
+masked copy (or a blend, for anti-aliased text) per element, and text is
+re-rendered only when its value changes.
+"""
+import collections
+
+import cv2
+import numpy as np
+
+import overlay_colors as colors
+
+DEFAULT_CACHE_SIZE = 256
+
+
+class Sprite():
+    """A pre-rendered element placed at (x, y).
+
+    `tile` holds the element drawn on black, i.e. colour premultiplied by its
+    coverage, and `coverage` how much of each pixel it covers (0-255). Solid
+    sprites are copied through a mask; anti-aliased ones (e.g. text on OpenCV
+    builds that smooth putText) are blended as roi * (255 - coverage) / 255 + tile.
+    """
+
+    def __init__(self, x, y, tile, coverage):
+        self.x = x
+        self.y = y
+        self.tile = tile
+        self.solid = bool(np.isin(coverage, (0, 255)).all())
+        if self.solid:
+            self.mask = coverage
+        else:
+            self.inverseCoverage = cv2.merge([255 - coverage] * 3)
+            self._scratch = np.empty_like(tile)
+
+    def blit(self, img):
+        height = min(self.tile.shape[0], img.shape[0] - self.y)
+        width = min(self.tile.shape[1], img.shape[1] - self.x)
+        if height <= 0 or width <= 0:
+            return
+        roi = img[self.y:self.y + height, self.x:self.x + width]
+        tile = self.tile[:height, :width]
+        if self.solid:
+            cv2.copyTo(tile, self.mask[:height, :width], roi)
+            return
+        scratch = self._scratch[:height, :width]
+        cv2.multiply(roi, self.inverseCoverage[:height, :width], dst=scratch, scale=1 / 255.0)
+        cv2.add(scratch, tile, dst=roi)
+
+
+class HudCompositor():
+    def __init__(self, width, height, cacheSize=DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            width, height: Size of the HUD area (from the top left corner of the frame) sprites may cover.
+            cacheSize: Number of sprites kept before the least recently used ones are rendered again.
+        """
+        self.width = width
+        self.height = height
+        self.cacheSize = cacheSize
+        self.rendered = 0
+        self._sprites = collections.OrderedDict()
+
+    def sprite(self, key, render):
+        """Return the cached sprite for `key`, creating it with render(canvas, mask) on a miss.
+
+        render draws the element in absolute frame coordinates onto a black BGR
+        canvas and the same shapes in 255 onto a single channel coverage mask.
+        """
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            return sprite
+
+        canvas = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        mask = np.zeros((self.height, self.width), dtype=np.uint8)
+        render(canvas, mask)
+        x, y, w, h = cv2.boundingRect(mask)
+        sprite = Sprite(x, y, canvas[y:y + h, x:x + w].copy(), mask[y:y + h, x:x + w].copy())
+        self.rendered += 1
+
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.cacheSize:
+            self._sprites.popitem(last=False)
+        return sprite
+
+
+def _text(text, org, scale, color):
+    def render(canvas, mask):
+        cv2.putText(canvas, text, org, cv2.FONT_HERSHEY_PLAIN, scale, color, 2)
+        cv2.putText(mask, text, org, cv2.FONT_HERSHEY_PLAIN, scale, 255, 2)
+    return render
+
+
+class VolumeHud():
+    """Draws the same HUD as the original V2 draw_overlay() from cached sprites."""
+
+    def __init__(self):
+        self.dx, self.dy = -140, 75
+        self.compositor = HudCompositor(width=320, height=110)
+
+    def _barOutline(self, canvas, mask):
+        pt1, pt2 = (150 + self.dx, 5 + self.dy), (400 + self.dx, 20 + self.dy)
+        cv2.rectangle(canvas, pt1, pt2, colors.COLOR_LINE, 3)
+        cv2.rectangle(mask, pt1, pt2, 255, 3)
+
+    def draw(self, img, volumeBar, isAdjustingVolume, currentVolume):
+        dx, dy = self.dx, self.dy
+        # Finger distance bar: the fill changes with every value and is a single cheap rectangle
+        x_fill = 150 + (400 - int(volumeBar)) + dx
+        x_fill = max(150 + dx, min(400 + dx, x_fill))
+        barFillColor = colors.COLOR_GREEN if isAdjustingVolume else colors.COLOR_LINE
+        cv2.rectangle(img, (150 + dx, 5 + dy), (x_fill, 20 + dy), barFillColor, cv2.FILLED)
+        self.compositor.sprite("barOutline", self._barOutline).blit(img)
+
+        adjustingAudioTextColor = colors.COLOR_GREEN if isAdjustingVolume else colors.COLOR_WHITE
+        adjustingAudioText = 'Changing audio' if isAdjustingVolume else 'Not changing audio'
+        self.compositor.sprite(("status", isAdjustingVolume),
+                               _text(adjustingAudioText, (5, 70), 1, adjustingAudioTextColor)).blit(img)
+        self.compositor.sprite(("audio", currentVolume),
+                               _text(f'AUDIO={currentVolume}%', (0, 45), 2, colors.COLOR_GREEN)).blit(img)
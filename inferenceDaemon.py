@@ -0,0 +1,535 @@
+"""Long-lived hand inference service shared by several local clients.
+
+Every script that creates a HandDetector loads the MediaPipe model and starts
+its graph. `python inferenceDaemon.py` does that once and keeps the detectors
+warm; scripts use RemoteHandDetector instead, which has the same
+detectHands/findPositions/fingersUp/findDistance API but sends the frames to
+the daemon over a Unix socket:
+
+    from inferenceDaemon import RemoteHandDetector as HandDetector
+
+Frames travel inline (the BGR pixels follow the request header) or, for
+clients of the camera server, as a reference (ring path, frame sequence) that
+the daemon reads straight from shared memory. Replies carry the landmarks,
+handedness and scores of every hand, in the arrays HandDetector uses.
+
+Scheduling: each connection is a session with its own detector (MediaPipe
+tracks hands from frame to frame, so streams cannot share a graph) taken from
+a pool of warm detectors. A session holds at most one queued request. A newer
+frame replaces the queued one, which is answered as dropped, and sessions
+are served round-robin. A fast producer therefore never delays the others by
+more than one inference. MediaPipe Hands processes one image per call, so
+requests are run one after another rather than batched.
+
+Wire format (little endian): a request header (magic, kind, height, width,
+channels, request id, frame sequence, payload size) followed by the payload
+(JSON options for HELLO, pixels for FRAME, the ring path for RING). A reply
+header (magic, status, hands, request id, inference time in ns) is followed by
+float32 landmarks (hands, 21, 3), float32 scores (hands,) and int8
+handedness (hands,).
+"""
+import argparse
+import collections
+import inspect
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import tempfile
+import threading
+import time
+import types
+
+import numpy as np
+
+import frameClient
+import instrumentation
+from bufferPool import BufferPool
+from frameRing import FrameRingReader, PIXEL_FORMAT_BGR
+from handTrackingModule import HandDetector, NUM_LANDMARKS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(), "ftvc-inference.sock")
+DEFAULT_WARM_DETECTORS = 1
+# Idle detectors kept for each set of session options, and in total; the least recently used go first
+DEFAULT_IDLE_PER_OPTIONS = 2
+DEFAULT_MAX_IDLE = 4
+
+MAGIC = b"FTVI"
+KIND_HELLO = 1
+KIND_FRAME = 2
+KIND_RING = 3
+
+STATUS_OK = 0
+STATUS_DROPPED = 1  # replaced by a newer frame of the same session before it was processed
+STATUS_FRAME_GONE = 2  # the referenced ring slot was overwritten; send the pixels instead
+STATUS_ERROR = 3
+
+_REQUEST = struct.Struct("<4sB3xIIIQQI")
+_REPLY = struct.Struct("<4sB3xIQQ")
+# HandDetector options a client may choose; everything else (e.g. decimation) runs in the client
+SESSION_OPTIONS = ("static_image_mode", "max_num_hands", "min_detection_confidence", "min_tracking_confidence",
+                   "roiTracking", "roiPadding", "roiMinSize", "roiFullFrameInterval")
+_DETECTOR_DEFAULTS = {name: parameter.default for name, parameter
+                      in inspect.signature(HandDetector.__init__).parameters.items() if name in SESSION_OPTIONS}
+_RING_BUFFERS = 3
+# Stands in for MediaPipe results in processes that only receive landmark arrays
+_NO_RESULTS = types.SimpleNamespace(multi_hand_landmarks=None, multi_handedness=None)
+
+
+def _recv_into(sock, view):
+    while len(view):
+        received = sock.recv_into(view)
+        if not received:
+            raise ConnectionError("Connection closed")
+        view = view[received:]
+
+
+def _reply_payload(landmarks, scores, handedness):
+    return b"".join((np.ascontiguousarray(landmarks, dtype=np.float32).tobytes(),
+                     np.ascontiguousarray(scores, dtype=np.float32).tobytes(),
+                     np.ascontiguousarray(handedness, dtype=np.int8).tobytes()))
+
+
+class _Request():
+    __slots__ = ("requestId", "kind", "frame", "path", "sequence", "buffer")
+
+    def __init__(self, requestId, kind, frame=None, path=None, sequence=0, buffer=None):
+        self.requestId = requestId
+        self.kind = kind
+        self.frame = frame
+        self.path = path
+        self.sequence = sequence
+        self.buffer = buffer  # index of the session frame buffer holding an inline frame
+
+
+class _Session():
+    def __init__(self, sessionId, conn, options):
+        self.id = sessionId
+        self.conn = conn
+        self.options = options
+        self.detector = None
+        self.pending = None
+        self.inFlight = None
+        self.served = 0
+        self.dropped = 0
+        self.closed = False
+        self.pool = BufferPool()
+        self._sendLock = threading.Lock()
+
+    def freeBuffer(self):
+        used = {request.buffer for request in (self.pending, self.inFlight) if request is not None}
+        return next(index for index in range(_RING_BUFFERS) if index not in used)
+
+    def reply(self, requestId, status, landmarks=None, scores=None, handedness=None, inferenceNs=0):
+        hands = 0 if landmarks is None else len(landmarks)
+        header = _REPLY.pack(MAGIC, status, hands, requestId, inferenceNs)
+        payload = _reply_payload(landmarks, scores, handedness) if hands else b""
+        with self._sendLock:
+            self.conn.sendall(header + payload)
+
+
+class InferenceDaemon():
+    def __init__(self, socketPath=DEFAULT_SOCKET_PATH, warmDetectors=DEFAULT_WARM_DETECTORS, detectorFactory=None,
+                 idlePerOptions=DEFAULT_IDLE_PER_OPTIONS, maxIdle=DEFAULT_MAX_IDLE, **defaultOptions):
+        """
+        Args:
+            socketPath: Unix socket the daemon listens on.
+            warmDetectors: Detectors with the default options created at start-up, so the first clients wait for nothing.
+            detectorFactory: Called with the session options to create a detector (defaults to HandDetector).
+            idlePerOptions: Idle detectors kept for each set of session options (at least warmDetectors).
+            maxIdle: Idle detectors kept in total (at least warmDetectors); the least recently used are closed.
+            defaultOptions: HandDetector options used when a client does not choose them.
+        """
+        self.socketPath = socketPath
+        self.detectorFactory = detectorFactory or HandDetector
+        self.defaultOptions = defaultOptions
+        self.requests = 0
+        self.served = 0
+        self.dropped = 0
+        self.idlePerOptions = max(idlePerOptions, warmDetectors)
+        self.maxIdle = max(maxIdle, warmDetectors)
+        self.evictedDetectors = 0
+        # Options key -> idle detectors, least recently used key first
+        self._idleDetectors = collections.OrderedDict()
+        self._rings = {}
+        self._ready = collections.deque()
+        self._sessions = {}
+        self._nextSessionId = 1
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._listener = None
+        # Prints latency histograms every few seconds when instrumentation is enabled (FTVC_METRICS=1)
+        self.reporter = instrumentation.Reporter(interval=5.0)
+
+        for _ in range(warmDetectors):
+            options = self._sessionOptions({})
+            self._idleDetectors.setdefault(self._optionsKey(options), []).append(self.detectorFactory(**options))
+
+    def _sessionOptions(self, requested):
+        options = dict(_DETECTOR_DEFAULTS)
+        options.update(self.defaultOptions)
+        options.update((name, value) for name, value in requested.items() if name in SESSION_OPTIONS)
+        return options
+
+    @staticmethod
+    def _optionsKey(options):
+        return tuple(sorted(options.items()))
+
+    def _takeDetector(self, options):
+        key = self._optionsKey(options)
+        with self._condition:
+            idle = self._idleDetectors.get(key)
+            detector = idle.pop() if idle else None
+            if idle is not None and not idle:
+                del self._idleDetectors[key]
+        if detector is None:
+            return self.detectorFactory(**options)
+        # Tracking state left by the previous session belongs to another video stream
+        detector.reset()
+        return detector
+
+    def serveForever(self):
+        """Accept clients until stop() is called. Inference runs on a scheduler thread."""
+        if os.path.exists(self.socketPath):
+            self._removeStaleSocket()
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.socketPath)
+        os.chmod(self.socketPath, 0o600)
+        self._listener.listen()
+        scheduler = threading.Thread(target=self._schedule, name="InferenceScheduler", daemon=True)
+        scheduler.start()
+        try:
+            while not self._stopped:
+                try:
+                    conn, _ = self._listener.accept()
+                except OSError:
+                    break  # listener closed by stop()
+                threading.Thread(target=self._receive, args=(conn,), name="InferenceSession", daemon=True).start()
+        finally:
+            self.stop()
+            scheduler.join(1.0)
+            for ring in self._rings.values():
+                ring.close()
+            if os.path.exists(self.socketPath):
+                os.unlink(self.socketPath)
+
+    def _removeStaleSocket(self):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socketPath)
+        except OSError:
+            os.unlink(self.socketPath)  # left behind by a daemon that did not shut down cleanly
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"Another inference daemon is already listening on {self.socketPath}")
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._listener:
+            self._listener.close()
+
+    def _receive(self, conn):
+        # One thread per connection reads requests and queues the newest one of its session
+        header = bytearray(_REQUEST.size)
+        session = None
+        try:
+            while True:
+                _recv_into(conn, memoryview(header))
+                magic, kind, height, width, channels, requestId, sequence, payloadSize = _REQUEST.unpack(header)
+                if magic != MAGIC:
+                    raise ConnectionError(f"Bad request magic {magic!r}")
+                if kind == KIND_HELLO:
+                    payload = bytearray(payloadSize)
+                    _recv_into(conn, memoryview(payload))
+                    session = self._openSession(conn, json.loads(payload) if payload else {})
+                    session.reply(requestId, STATUS_OK)
+                    continue
+                if session is None:
+                    raise ConnectionError("Frame sent before HELLO")
+
+                with self._condition:
+                    buffer = session.freeBuffer()
+                if kind == KIND_FRAME:
+                    if payloadSize != height * width * channels:
+                        raise ConnectionError("Frame payload does not match its size")
+                    frame = session.pool.get(f"frame{buffer}", (height, width, channels))
+                    _recv_into(conn, memoryview(frame).cast("B"))
+                    request = _Request(requestId, kind, frame=frame, buffer=buffer)
+                elif kind == KIND_RING:
+                    path = bytearray(payloadSize)
+                    _recv_into(conn, memoryview(path))
+                    request = _Request(requestId, kind, path=path.decode("utf-8"), sequence=sequence)
+                else:
+                    raise ConnectionError(f"Unknown request kind {kind}")
+                self._queue(session, request)
+        except (ConnectionError, OSError, ValueError) as e:
+            if not isinstance(e, ConnectionError) or str(e) != "Connection closed":
+                logger.warning("Closing inference session: %s", e)
+        finally:
+            if session is not None:
+                self._closeSession(session)
+            conn.close()
+
+    def _openSession(self, conn, requested):
+        options = self._sessionOptions(requested)
+        with self._condition:
+            session = _Session(self._nextSessionId, conn, options)
+            self._nextSessionId += 1
+            self._sessions[session.id] = session
+        # Created outside the lock: a cold detector takes a while and must not stall the scheduler
+        session.detector = self._takeDetector(options)
+        return session
+
+    def _closeSession(self, session):
+        with self._condition:
+            session.closed = True
+            session.pending = None
+            self._sessions.pop(session.id, None)
+            if session.inFlight is None and session.detector is not None:
+                self._releaseDetector(session)
+
+    def _releaseDetector(self, session):
+        # Back to the warm pool for the next client with the same options (called with the lock held)
+        key = self._optionsKey(session.options)
+        idle = self._idleDetectors.setdefault(key, [])
+        self._idleDetectors.move_to_end(key)
+        idle.append(session.detector)
+        session.detector = None
+        if len(idle) > self.idlePerOptions:
+            self._evictDetector(key)
+        while sum(len(detectors) for detectors in self._idleDetectors.values()) > self.maxIdle:
+            self._evictDetector(next(iter(self._idleDetectors)))
+
+    def _evictDetector(self, key):
+        idle = self._idleDetectors[key]
+        detector = idle.pop(0)  # the one idle the longest
+        if not idle:
+            del self._idleDetectors[key]
+        self.evictedDetectors += 1
+        if hasattr(detector, "close"):
+            detector.close()
+
+    def _queue(self, session, request):
+        with self._condition:
+            self.requests += 1
+            replaced = session.pending
+            session.pending = request
+            if replaced is None:
+                self._ready.append(session)
+                self._condition.notify()
+            else:
+                session.dropped += 1
+                self.dropped += 1
+        if replaced is not None:
+            session.reply(replaced.requestId, STATUS_DROPPED)
+
+    def _schedule(self):
+        while True:
+            with self._condition:
+                while not self._ready and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                # Round-robin: the session served now queues up behind everyone else for its next frame
+                session = self._ready.popleft()
+                request, session.pending = session.pending, None
+                if request is None:
+                    continue  # session closed while it was waiting
+                session.inFlight = request
+            try:
+                self._serve(session, request)
+            except OSError as e:
+                logger.warning("Could not reply to inference session %d: %s", session.id, e)
+            finally:
+                with self._condition:
+                    session.inFlight = None
+                    if session.closed and session.detector is not None:
+                        self._releaseDetector(session)
+            self.reporter.maybeReport()
+
+    def _ring(self, path):
+        ring = self._rings.get(path)
+        if ring is None or ring.mm is None:
+            ring = FrameRingReader(path)
+            self._rings[path] = ring
+        elif not ring.reopenIfReplaced():
+            return ring
+        # New, or a restarted camera server replaced the file: the frame format may have changed
+        if ring.shape is None or ring.pixelFormat != PIXEL_FORMAT_BGR or ring.dtype != np.uint8:
+            ring.close()
+            del self._rings[path]
+            raise ValueError(f"{path} does not hold BGR uint8 frames")
+        return ring
+
+    def _serve(self, session, request):
+        frame = request.frame
+        ring = None
+        try:
+            if request.kind == KIND_RING:
+                ring = self._ring(request.path)
+                frame = ring.frameView(request.sequence)
+                if frame is None:
+                    session.reply(request.requestId, STATUS_FRAME_GONE)
+                    return
+            start = time.monotonic_ns()
+            detector = session.detector
+            detector.detectHands(frame, draw=False)
+            inferenceNs = time.monotonic_ns() - start
+        except Exception:
+            logger.exception("Inference failed for session %d", session.id)
+            session.reply(request.requestId, STATUS_ERROR)
+            return
+        if ring is not None and not ring.isValid(request.sequence):
+            # The server reused the slot while MediaPipe was reading it
+            session.reply(request.requestId, STATUS_FRAME_GONE)
+            return
+        session.served += 1
+        self.served += 1
+        session.reply(request.requestId, STATUS_OK, detector.landmarks, detector.scores, detector.handedness,
+                      inferenceNs)
+
+    def stats(self):
+        with self._condition:
+            sessions = {session.id: {"served": session.served, "dropped": session.dropped}
+                        for session in self._sessions.values()}
+            idle = sum(len(detectors) for detectors in self._idleDetectors.values())
+        return {"requests": self.requests, "served": self.served, "dropped": self.dropped,
+                "idleDetectors": idle, "evictedDetectors": self.evictedDetectors, "sessions": sessions}
+
+
+class RemoteHandDetector(HandDetector):
+    """HandDetector whose inference runs in the inference daemon.
+
+    The MediaPipe options (and roiTracking) are applied by the daemon's detector
+    for this client; detectEvery/detectInterval prediction still runs locally.
+    With useFrameRing=True frames handed to a frameClient callback are sent as a
+    reference into the shared-memory ring instead of as pixels, which is only
+    correct while the callback has not changed the frame before detectHands().
+    """
+
+    def __init__(self, static_image_mode=False, max_num_hands=2, min_detection_confidence=0.5,
+                 min_tracking_confidence=0.5, roiTracking=False, socketPath=DEFAULT_SOCKET_PATH,
+                 useFrameRing=False, timeout=5.0, **options):
+        self.socketPath = socketPath
+        self.useFrameRing = useFrameRing
+        self.timeout = timeout
+        chosen = {"static_image_mode": static_image_mode, "max_num_hands": max_num_hands,
+                  "min_detection_confidence": min_detection_confidence,
+                  "min_tracking_confidence": min_tracking_confidence, "roiTracking": roiTracking}
+        chosen.update((name, options.pop(name)) for name in SESSION_OPTIONS if name in options)
+        # Only options changed from the HandDetector defaults are sent; the daemon's defaults apply to the rest
+        self.sessionOptions = {name: value for name, value in chosen.items() if value != _DETECTOR_DEFAULTS[name]}
+        self.sock = None
+        self.inlineFrames = 0
+        self.ringFrames = 0
+        self.ringMisses = 0  # ring references the daemon could no longer read, sent again inline
+        self._requestId = 0
+        self._replyHeader = bytearray(_REPLY.size)
+        self.results = _NO_RESULTS
+        super().__init__(static_image_mode, max_num_hands, min_detection_confidence, min_tracking_confidence,
+                         **options)
+
+    def _createModel(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        try:
+            self.sock.connect(self.socketPath)
+        except OSError as e:
+            self.sock.close()
+            raise ConnectionError(f"Inference daemon is not running on {self.socketPath} "
+                                  "(start it with 'python inferenceDaemon.py')") from e
+        self._request(KIND_HELLO, payload=json.dumps(self.sessionOptions).encode("utf-8"))
+        return None
+
+    def detectHands(self, img, draw=True, frameId=None):
+        # Landmarks are drawn from the arrays, as there are no MediaPipe results in this process
+        super().detectHands(img, draw=False, frameId=frameId)
+        if draw:
+            self._drawLandmarks(img)
+
+    def _infer(self, img):
+        start = instrumentation.start()
+        reply = None
+        reference = frameClient.frame_reference() if self.useFrameRing else None
+        if reference is not None:
+            path, sequence = reference
+            reply = self._request(KIND_RING, sequence=sequence, payload=path.encode("utf-8"))
+            if reply is None:
+                self.ringMisses += 1
+            else:
+                self.ringFrames += 1
+        if reply is None:
+            height, width = img.shape[:2]
+            channels = img.shape[2] if img.ndim == 3 else 1
+            reply = self._request(KIND_FRAME, height, width, channels, payload=np.ascontiguousarray(img))
+            self.inlineFrames += 1
+        instrumentation.stop("inference", start)
+        self.landmarks, self.scores, self.handedness = reply
+        self.results = _NO_RESULTS
+
+    def _request(self, kind, height=0, width=0, channels=0, sequence=0, payload=b""):
+        """Send one request and wait for its reply. Returns (landmarks, scores, handedness) or None if the
+        referenced frame was gone."""
+        self._requestId += 1
+        size = payload.nbytes if isinstance(payload, np.ndarray) else len(payload)
+        self.sock.sendall(_REQUEST.pack(MAGIC, kind, height, width, channels, self._requestId, sequence, size))
+        self.sock.sendall(payload)
+        while True:
+            _recv_into(self.sock, memoryview(self._replyHeader))
+            magic, status, hands, requestId, _ = _REPLY.unpack(self._replyHeader)
+            if magic != MAGIC:
+                raise ConnectionError(f"Bad reply magic {magic!r}")
+            body = bytearray(hands * (NUM_LANDMARKS * 3 * 4 + 4 + 1))
+            _recv_into(self.sock, memoryview(body))
+            if requestId == self._requestId:
+                break
+        if status == STATUS_FRAME_GONE:
+            return None
+        if status != STATUS_OK:
+            raise RuntimeError(f"Inference daemon could not process the frame (status {status})")
+        scoresOffset = hands * NUM_LANDMARKS * 3 * 4
+        landmarks = np.frombuffer(body, dtype=np.float32, count=hands * NUM_LANDMARKS * 3)
+        scores = np.frombuffer(body, dtype=np.float32, count=hands, offset=scoresOffset)
+        handedness = np.frombuffer(body, dtype=np.int8, count=hands, offset=scoresOffset + hands * 4)
+        return landmarks.reshape(hands, NUM_LANDMARKS, 3), scores, handedness
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+
+def _terminate(signum, frame):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)  # A repeated SIGTERM must not interrupt the cleanup
+    raise KeyboardInterrupt  # Unwind serveForever() so the socket is removed
+
+
+def main(socketPath=DEFAULT_SOCKET_PATH, warmDetectors=DEFAULT_WARM_DETECTORS, maxHands=2):
+    daemon = InferenceDaemon(socketPath, warmDetectors=warmDetectors, max_num_hands=maxHands)
+    print(f"Inference daemon listening on {socketPath} with {warmDetectors} warm detector(s). Press CTRL+C to exit.")
+    try:
+        daemon.serveForever()
+    except KeyboardInterrupt:
+        print("Termination requested by user.")
+    finally:
+        daemon.stop()
+        print(f"Inference daemon stats: {daemon.stats()}")
+        print("Finished.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve hand landmark inference to local clients over a Unix socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unix socket to listen on")
+    parser.add_argument("--warm", type=int, default=DEFAULT_WARM_DETECTORS,
+                        help="Detectors created at start-up (one per concurrently connected client)")
+    parser.add_argument("--max-hands", type=int, default=2, help="Default hands per frame")
+    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, _terminate)
+    main(socketPath=args.socket, warmDetectors=args.warm, maxHands=args.max_hands)
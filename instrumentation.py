@@ -0,0 +1,233 @@
+"""Lightweight per-stage latency instrumentation.
+
+Code marks the stages of the frame pipeline with named spans:
+
+    with instrumentation.span("inference"):
+        results = hands.process(imgRGB)
+
+or, on the hottest paths, with an explicit start/stop pair:
+
+    start = instrumentation.start()
+    ...
+    instrumentation.stop("inference", start)
+
+Each span name feeds a fixed-bucket histogram (four buckets per power of two,
+from 1 us to ~17 s, so percentiles are within 25%) that keeps a few rolling time windows, so summaries describe recent
+behaviour rather than the whole run. Recording is a couple of integer
+operations; when instrumentation is disabled span() returns a shared no-op
+context manager and start()/stop() return immediately.
+
+Enable with the environment variable FTVC_METRICS=1 or instrumentation.enable().
+Sinks added with add_sink() additionally receive every span (see traceExport.py).
+"""
+import os
+import threading
+import time
+
+_MIN_BUCKET_BITS = 10  # bucket 0 holds everything below 2**10 ns (~1 us)
+_OCTAVES = 24
+BUCKET_COUNT = 1 + 4 * _OCTAVES
+DEFAULT_WINDOW_SECONDS = 5.0
+DEFAULT_WINDOW_COUNT = 6
+
+enabled = os.environ.get("FTVC_METRICS", "") not in ("", "0")
+_clock = time.perf_counter_ns
+_sinks = []
+
+
+def bucket_index(durationNs):
+    bits = durationNs.bit_length()
+    if bits <= _MIN_BUCKET_BITS:
+        return 0
+    # Octave of the leading bit plus the next two bits select one of four sub-buckets
+    index = 1 + 4 * (bits - _MIN_BUCKET_BITS - 1) + ((durationNs >> (bits - 3)) & 3)
+    return index if index < BUCKET_COUNT else BUCKET_COUNT - 1
+
+
+def bucket_upper_bound_ns(index):
+    if index == 0:
+        return 1 << _MIN_BUCKET_BITS
+    octave, sub = divmod(index - 1, 4)
+    return (5 + sub) << (octave + _MIN_BUCKET_BITS - 2)
+
+
+class Histogram():
+    """Latency histogram over the last `windowCount` windows of `windowSeconds` each."""
+
+    def __init__(self, name, windowSeconds=DEFAULT_WINDOW_SECONDS, windowCount=DEFAULT_WINDOW_COUNT):
+        self.name = name
+        self.windowNs = int(windowSeconds * 1e9)
+        self.windowCount = windowCount
+        self.total = 0  # spans recorded since start, not only in the rolling windows
+        self._windows = [[0] * BUCKET_COUNT for _ in range(windowCount)]
+        self._windowSums = [0] * windowCount
+        self._current = 0
+        self._windowStart = _clock()
+
+    def record(self, durationNs, nowNs):
+        if nowNs - self._windowStart >= self.windowNs:
+            self._rotate(nowNs)
+        self._windows[self._current][bucket_index(durationNs)] += 1
+        self._windowSums[self._current] += durationNs
+        self.total += 1
+
+    def _rotate(self, nowNs):
+        elapsed = (nowNs - self._windowStart) // self.windowNs
+        for _ in range(min(elapsed, self.windowCount)):
+            self._current = (self._current + 1) % self.windowCount
+            self._windows[self._current] = [0] * BUCKET_COUNT
+            self._windowSums[self._current] = 0
+        self._windowStart += elapsed * self.windowNs
+
+    def counts(self):
+        """Bucket counts summed over the rolling windows."""
+        return [sum(bucket) for bucket in zip(*self._windows)]
+
+    def summary(self):
+        counts = self.counts()
+        count = sum(counts)
+        result = {"count": count, "total": self.total}
+        if not count:
+            return result
+        result["mean_us"] = sum(self._windowSums) / count / 1e3
+        for label, q in (("p50_us", 0.50), ("p95_us", 0.95), ("p99_us", 0.99)):
+            threshold = q * count
+            seen = 0
+            for index, bucketCount in enumerate(counts):
+                seen += bucketCount
+                if seen >= threshold:
+                    # Buckets only bound the value; report the bucket's upper edge
+                    result[label] = bucket_upper_bound_ns(index) / 1e3
+                    break
+        return result
+
+
+_histograms = {}
+_histogramsLock = threading.Lock()
+
+
+def histogram(name):
+    hist = _histograms.get(name)
+    if hist is None:
+        with _histogramsLock:
+            hist = _histograms.setdefault(name, Histogram(name))
+    return hist
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def use_clock(clock):
+    """Replace the nanosecond clock used for spans (e.g. time.monotonic_ns to compare across processes)."""
+    global _clock
+    _clock = clock
+
+
+def add_sink(sink):
+    """Call sink(name, startNs, endNs) for every recorded span."""
+    _sinks.append(sink)
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def reset():
+    with _histogramsLock:
+        _histograms.clear()
+
+
+def start():
+    """Return a start timestamp for stop(), or 0 when disabled."""
+    return _clock() if enabled else 0
+
+
+def stop(name, startNs):
+    if not startNs:
+        return
+    now = _clock()
+    histogram(name).record(now - startNs, now)
+    for sink in _sinks:
+        sink(name, startNs, now)
+
+
+def record(name, durationNs):
+    """Record a duration measured elsewhere (e.g. across threads)."""
+    if enabled:
+        histogram(name).record(durationNs, _clock())
+
+
+class _Span():
+    __slots__ = ("name", "startNs")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.startNs = _clock()
+        return self
+
+    def __exit__(self, *exc):
+        now = _clock()
+        histogram(self.name).record(now - self.startNs, now)
+        for sink in _sinks:
+            sink(self.name, self.startNs, now)
+        return False
+
+
+class _NullSpan():
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """Context manager timing its body into histogram `name` (a no-op when disabled)."""
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def summary():
+    return {name: hist.summary() for name, hist in sorted(_histograms.items())}
+
+
+def format_summary():
+    lines = [f"{'span':22} {'count':>7} {'mean us':>9} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9}"]
+    for name, stats in summary().items():
+        if not stats["count"]:
+            continue
+        lines.append(f"{name:22} {stats['count']:>7} {stats['mean_us']:>9.1f} {stats['p50_us']:>9.0f} "
+                     f"{stats['p95_us']:>9.0f} {stats['p99_us']:>9.0f}")
+    return "\n".join(lines)
+
+
+class Reporter():
+    """Prints format_summary() to stdout at most every `interval` seconds when maybeReport() is called."""
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._last = time.monotonic()
+
+    def maybeReport(self):
+        if not enabled:
+            return
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            print(format_summary(), flush=True)
@@ -0,0 +1,217 @@
+"""Shared-memory channel for hand landmarks detected once and read by many consumers.
+
+With `python cameraServer.py --detect` the server runs a HandDetector on every
+published frame (LandmarkPublisher) and writes a small fixed-size record per
+frame to a second ring (see frameRing.py, same seqlock protocol):
+
+    frame sequence, capture time, frame width/height, number of hands,
+    landmarks: float32 (MAX_HANDS, 21, 3), normalized like HandDetector.landmarks
+    scores: float32 (MAX_HANDS,), handedness: int8 (MAX_HANDS,) HANDEDNESS_* values
+
+A record is a few hundred bytes, so gesture consumers such as V2 read it
+instead of running MediaPipe on the same frame again.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+import instrumentation
+from bufferPool import BufferPool
+from frameRing import FrameRingReader, FrameRingWriter, DEFAULT_RING_NAME, DEFAULT_SLOT_COUNT, default_ring_path
+
+logger = logging.getLogger(__name__)
+
+MAX_HANDS = 2
+NUM_LANDMARKS = 21
+PIXEL_FORMAT_LANDMARKS = "LMK"
+LANDMARK_RING_NAME = "ftvc-landmarks.ring"
+LANDMARK_RING_PATH = default_ring_path(LANDMARK_RING_NAME)
+
+RECORD_DTYPE = np.dtype([
+    ("frameSequence", "<u8"),
+    ("captureNs", "<u8"),
+    ("width", "<u4"),
+    ("height", "<u4"),
+    ("hands", "<u4"),
+    ("reserved", "<u4"),
+    ("landmarks", "<f4", (MAX_HANDS, NUM_LANDMARKS, 3)),
+    ("scores", "<f4", (MAX_HANDS,)),
+    ("handedness", "i1", (MAX_HANDS,)),
+])
+
+
+def landmark_ring_path(framePath):
+    """Path of the landmark ring published for the frame ring at framePath, in the same directory."""
+    directory, name = os.path.split(framePath)
+    if name == DEFAULT_RING_NAME:
+        return os.path.join(directory, LANDMARK_RING_NAME)
+    root, extension = os.path.splitext(name)
+    return os.path.join(directory, f"{root}-landmarks{extension}")
+
+
+class LandmarkRecord():
+    __slots__ = ("sequence", "frameSequence", "captureNs", "width", "height", "landmarks", "handedness", "scores")
+
+    def __init__(self, sequence, frameSequence, captureNs, width, height, landmarks, handedness, scores):
+        self.sequence = sequence  # sequence of the record in the landmark ring
+        self.frameSequence = frameSequence  # sequence of the frame in the frame ring
+        self.captureNs = captureNs
+        self.width = width
+        self.height = height
+        self.landmarks = landmarks
+        self.handedness = handedness
+        self.scores = scores
+
+
+class LandmarkWriter():
+    def __init__(self, path=LANDMARK_RING_PATH, slotCount=DEFAULT_SLOT_COUNT):
+        self.ring = FrameRingWriter(path, RECORD_DTYPE.itemsize, slotCount=slotCount,
+                                    pixelFormat=PIXEL_FORMAT_LANDMARKS, notify=True)
+
+    def publish(self, frameSequence, captureNs, width, height, landmarks, handedness=None, scores=None):
+        """Write the landmarks of one frame; hands beyond MAX_HANDS are dropped. Returns the record sequence."""
+        hands = min(len(landmarks), MAX_HANDS)
+        record = self.ring.acquire().view(RECORD_DTYPE)[0]
+        record["frameSequence"] = frameSequence
+        record["captureNs"] = captureNs or 0
+        record["width"], record["height"] = width, height
+        record["hands"] = hands
+        record["landmarks"][:hands] = landmarks[:hands]
+        record["scores"][:hands] = scores[:hands] if scores is not None else 0.0
+        record["handedness"][:hands] = handedness[:hands] if handedness is not None else -1
+        return self.ring.publish(captureNs)
+
+    def close(self, unlink=True):
+        self.ring.close(unlink)
+
+
+class LandmarkReader():
+    def __init__(self, path=LANDMARK_RING_PATH):
+        self.ring = FrameRingReader(path)
+        if self.ring.pixelFormat != PIXEL_FORMAT_LANDMARKS or self.ring.frameSize != RECORD_DTYPE.itemsize:
+            self.ring.close()
+            raise ValueError(f"{path} is not a landmark ring of this version")
+        self._buffer = np.empty(RECORD_DTYPE.itemsize, dtype=np.uint8)
+
+    def read(self):
+        """Return the newest LandmarkRecord, or None if nothing was published yet."""
+        sequence = self.ring.readInto(self._buffer)
+        if not sequence:
+            return None
+        return self._record(sequence)
+
+    def readFrame(self, frameSequence, timeout=0.0):
+        """Return the LandmarkRecord of frame `frameSequence`, waiting up to `timeout` seconds for it.
+
+        Returns None if the publisher skipped that frame, its record was already
+        overwritten, or it did not arrive in time.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            latest = self.ring.latestSequence()
+            newest = self._readRecord(latest)
+            if newest is not None and newest.frameSequence >= frameSequence:
+                # Records are published in frame order, so walk back from the newest one
+                for sequence in range(latest, max(latest - self.ring.slotCount, 0), -1):
+                    record = newest if sequence == latest else self._readRecord(sequence)
+                    if record is None or record.frameSequence < frameSequence:
+                        return None
+                    if record.frameSequence == frameSequence:
+                        return record
+                return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.waitForRecord(latest, timeout=remaining):
+                return None
+
+    def _readRecord(self, sequence):
+        view = self.ring.frameView(sequence)
+        if view is None or self.ring.detach(sequence, view, out=self._buffer) is None:
+            return None
+        return self._record(sequence)
+
+    def _record(self, sequence):
+        record = self._buffer.view(RECORD_DTYPE)[0]
+        hands = int(record["hands"])
+        return LandmarkRecord(sequence, int(record["frameSequence"]), int(record["captureNs"]) or None,
+                              int(record["width"]), int(record["height"]), record["landmarks"][:hands].copy(),
+                              record["handedness"][:hands].copy(), record["scores"][:hands].copy())
+
+    def waitForRecord(self, lastSequence, timeout=None):
+        """Block until a record newer than lastSequence is published. Returns False on timeout."""
+        return self.ring.waitForFrame(lastSequence, timeout=timeout)
+
+    def close(self):
+        self.ring.close()
+
+
+class LandmarkPublisher():
+    """Runs `detector` on every new frame of the frame ring on a background thread and publishes the landmarks."""
+
+    def __init__(self, detector, framePath, landmarkPath=None):
+        self.detector = detector
+        self.framePath = framePath
+        self.landmarkPath = landmarkPath or landmark_ring_path(framePath)
+        self.writer = LandmarkWriter(self.landmarkPath)
+        self.published = 0
+        self.skipped = 0  # frames overwritten by the server while the detector was still reading them
+        self.error = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="LandmarkPublisher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        frames = FrameRingReader(self.framePath)
+        pool = BufferPool()
+        try:
+            lastSequence = 0
+            reopened = frames.reopened
+            while not self._stopped.is_set():
+                if frames.reopened != reopened:
+                    reopened, lastSequence = frames.reopened, 0  # the server restarted with a new ring
+                if not frames.waitForFrame(lastSequence, timeout=0.1):
+                    continue
+                sequence, view = frames.view()
+                if view is None:
+                    continue
+                lastSequence = sequence
+                captureNs = frames.captureTime(sequence)
+                # The server's fingerprint lets the detector skip repeated frames without hashing them again
+                fingerprint = frames.fingerprint(sequence)
+                # MediaPipe keeps reading its input while it runs, so it gets a private copy of the slot
+                frame = frames.detach(sequence, view, out=pool.get("frame", view.shape))
+                if frame is None:
+                    self.skipped += 1
+                    continue
+                self.detector.detectHands(frame, draw=False, frameId=fingerprint or None)
+                start = instrumentation.start()
+                self.writer.publish(sequence, captureNs, frames.width, frames.height, self.detector.landmarks,
+                                    self.detector.handedness, self.detector.scores)
+                instrumentation.stop("landmarkPublish", start)
+                self.published += 1
+        except Exception as e:
+            self.error = e
+            logger.exception("Landmark publisher stopped")
+        finally:
+            frames.close()
+            # The thread owns the writer once started, so a stop() that gave up waiting does not pull
+            # the ring out from under a detection still running
+            self.writer.close()
+
+    def stats(self):
+        return {"published": self.published, "skipped": self.skipped,
+                "repeatedFrames": self.detector.duplicateFrames}
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.ident is None:
+            self.writer.close()
+        elif self._thread.is_alive():
+            self._thread.join(1.0)
+            if self._thread.is_alive():
+                logger.warning("Landmark publisher still detecting; it closes %s when done", self.landmarkPath)
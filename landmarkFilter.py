@@ -0,0 +1,97 @@
+"""Landmark filters used to predict hand positions between inference frames.
+
+Both filters work on whole NumPy arrays at once (e.g. the (hands, 21, 2)
+normalized x/y landmarks of HandDetector) and share the same interface:
+  - update(values, timestamp): feed a measurement, returns the filtered values
+  - predict(timestamp): extrapolate the landmarks to a later time
+  - speed: largest per-coordinate velocity (normalized units per second)
+  - reset(): forget the state (e.g. when the number of hands changes)
+"""
+import math
+
+import numpy as np
+
+
+def _alpha(cutoff, dt):
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class OneEuroFilter():
+    """One-Euro filter (Casiez et al.): smooths jitter at low speed and reacts quickly at high speed."""
+
+    def __init__(self, minCutoff=1.0, beta=5.0, derivativeCutoff=1.0):
+        self.minCutoff = minCutoff
+        self.beta = beta
+        self.derivativeCutoff = derivativeCutoff
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.velocity = None
+        self.timestamp = None
+
+    @property
+    def speed(self):
+        if self.velocity is None or not self.velocity.size:
+            return 0.0
+        return float(np.abs(self.velocity).max())
+
+    def update(self, values, timestamp):
+        values = np.asarray(values, dtype=np.float64)
+        if self.value is None or self.value.shape != values.shape:
+            self.value = values.copy()
+            self.velocity = np.zeros_like(values)
+            self.timestamp = timestamp
+            return self.value
+        dt = max(timestamp - self.timestamp, 1e-6)
+
+        rawVelocity = (values - self.value) / dt
+        self.velocity += _alpha(self.derivativeCutoff, dt) * (rawVelocity - self.velocity)
+        cutoff = self.minCutoff + self.beta * np.abs(self.velocity)
+        tau = 1.0 / (2 * math.pi * cutoff)
+        alpha = 1.0 / (1.0 + tau / dt)
+        self.value += alpha * (values - self.value)
+        self.timestamp = timestamp
+        return self.value
+
+    def predict(self, timestamp):
+        if self.value is None:
+            return None
+        return self.value + self.velocity * (timestamp - self.timestamp)
+
+
+class ConstantVelocityPredictor():
+    """Constant-velocity model: keeps the last measurement and a smoothed velocity estimate."""
+
+    def __init__(self, velocitySmoothing=0.5):
+        self.velocitySmoothing = velocitySmoothing
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.velocity = None
+        self.timestamp = None
+
+    @property
+    def speed(self):
+        if self.velocity is None or not self.velocity.size:
+            return 0.0
+        return float(np.abs(self.velocity).max())
+
+    def update(self, values, timestamp):
+        values = np.asarray(values, dtype=np.float64)
+        if self.value is None or self.value.shape != values.shape:
+            self.velocity = np.zeros_like(values)
+        else:
+            dt = max(timestamp - self.timestamp, 1e-6)
+            rawVelocity = (values - self.value) / dt
+            self.velocity += (1.0 - self.velocitySmoothing) * (rawVelocity - self.velocity)
+        self.value = values.copy()
+        self.timestamp = timestamp
+        return self.value
+
+    def predict(self, timestamp):
+        if self.value is None:
+            return None
+        return self.value + self.velocity * (timestamp - self.timestamp)
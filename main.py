@@ -17,6 +17,7 @@ SCRIPTS = {
     "server": ("cameraServer", "cameraServer.py"),
     "example-client": ("exampleFrameClientUse", "exampleFrameClientUse.py"),
     "frame-client": ("frameClient", "frameClient.py"),
+    "inference": ("inferenceDaemon", "inferenceDaemon.py"),
 }
 
 
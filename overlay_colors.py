@@ -7,6 +7,9 @@ to change from one place.
 COLOR_LANDMARK_SMALL_BLUE = (200, 0, 0)
 COLOR_BBOX_HAND = (255, 50, 0)
 COLOR_BBOX_PALM = (150, 50, 0)
+# Match mediapipe's default landmark drawing style
+COLOR_LANDMARK_POINT = (0, 0, 255)
+COLOR_LANDMARK_CONNECTION = (224, 224, 224)
 
 COLOR_POINT_A = (55, 66, 200)
 COLOR_POINT_B = (177, 235, 220)
@@ -21,6 +24,8 @@ __all__ = [
     "COLOR_LANDMARK_SMALL_BLUE",
     "COLOR_BBOX_HAND",
     "COLOR_BBOX_PALM",
+    "COLOR_LANDMARK_POINT",
+    "COLOR_LANDMARK_CONNECTION",
     "COLOR_POINT_A",
     "COLOR_POINT_B",
     "COLOR_LINE",
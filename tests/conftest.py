@@ -0,0 +1,8 @@
+import sys
+
+try:
+    import mediapipe  # noqa: F401
+except ImportError:
+    # HandDetector only needs the module to import; tests install FakeHands graphs themselves
+    from fakes import stub_mediapipe
+    sys.modules["mediapipe"] = stub_mediapipe()
@@ -0,0 +1,66 @@
+"""Stand-ins shared by the tests."""
+import types
+
+NUM_LANDMARKS = 21
+HAND_CONNECTIONS = frozenset([(0, 1), (0, 5), (0, 17), (1, 2), (2, 3), (3, 4), (5, 6), (5, 9), (6, 7), (7, 8),
+                              (9, 10), (9, 13), (10, 11), (11, 12), (13, 14), (13, 17), (14, 15), (15, 16),
+                              (17, 18), (18, 19), (19, 20)])
+NO_RESULTS = types.SimpleNamespace(multi_hand_landmarks=None, multi_handedness=None)
+
+
+def hand_results(landmarks, labels=None, score=0.9):
+    """MediaPipe-style results for a (hands, 21, 3) array of normalized landmarks."""
+    if not len(landmarks):
+        return NO_RESULTS
+    labels = labels or ["Right"] * len(landmarks)
+    hands = [types.SimpleNamespace(landmark=[types.SimpleNamespace(x=float(x), y=float(y), z=float(z))
+                                             for x, y, z in hand]) for hand in landmarks]
+    handedness = [types.SimpleNamespace(classification=[types.SimpleNamespace(label=label, score=score)])
+                  for label in labels]
+    return types.SimpleNamespace(multi_hand_landmarks=hands, multi_handedness=handedness)
+
+
+class FakeHands():
+    """mediapipe Hands graph returning the queued results in turn, then no hands."""
+
+    def __init__(self, *results, **options):
+        self.results = list(results)
+        self.options = options
+        self.processed = []
+        self.resets = 0
+
+    def process(self, img):
+        self.processed.append(img.shape)
+        return self.results.pop(0) if self.results else NO_RESULTS
+
+    def reset(self):
+        self.resets += 1
+
+    def close(self):
+        pass
+
+
+class FakeMixer():
+    """Linux mixer backend for audio.set_linux_mixer() that only remembers the volume and the calls setting it."""
+
+    def __init__(self, volume=50):
+        self.volume = volume
+        self.calls = []
+        self.closed = False
+
+    def get_volume(self):
+        return self.volume
+
+    def set_volume(self, percent):
+        self.calls.append(percent)
+        self.volume = percent
+
+    def close(self):
+        self.closed = True
+
+
+def stub_mediapipe():
+    """Module standing in for mediapipe where it is not installed; every Hands graph is a FakeHands."""
+    drawing = types.SimpleNamespace(draw_landmarks=lambda img, landmarks, connections: None)
+    hands = types.SimpleNamespace(Hands=FakeHands, HAND_CONNECTIONS=HAND_CONNECTIONS)
+    return types.SimpleNamespace(solutions=types.SimpleNamespace(hands=hands, drawing_utils=drawing))
@@ -0,0 +1,107 @@
+import sys
+
+import pytest
+
+import audio
+from fakes import FakeMixer
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux mixer backend")
+
+
+@pytest.fixture
+def fake_mixer():
+    mixer = FakeMixer()
+    audio.set_linux_mixer(mixer)
+    yield mixer
+    audio.set_linux_mixer(None)
+
+
+@linux_only
+def test_fake_mixer_set_and_get(fake_mixer):
+    assert audio.get_volume() == 50
+    audio.set_volume(30)
+    assert fake_mixer.calls == [30]
+    assert audio.get_volume() == 30
+    audio.set_volume(None)
+    assert fake_mixer.calls == [30]
+
+
+@linux_only
+def test_volume_is_clamped_and_rounded(fake_mixer):
+    audio.set_volume(150)
+    audio.set_volume(-20)
+    audio.set_volume(42.6)
+    assert fake_mixer.calls == [100, 0, 43]
+
+
+@linux_only
+def test_failing_mixer_is_logged_not_raised(fake_mixer):
+    def fail(*args):
+        raise OSError("device gone")
+    fake_mixer.get_volume = fake_mixer.set_volume = fail
+    assert audio.get_volume() == 0
+    audio.set_volume(10)
+
+
+def test_replacing_the_mixer_closes_the_previous_one():
+    first, second = FakeMixer(), FakeMixer()
+    audio.set_linux_mixer(first)
+    audio.set_linux_mixer(second)
+    assert first.closed and not second.closed
+    audio.set_linux_mixer(None)
+    assert second.closed
+
+
+def test_falls_back_to_amixer_without_libasound(monkeypatch):
+    audio.set_linux_mixer(None)
+    monkeypatch.setattr(audio.ctypes.util, "find_library", lambda name: None)
+    try:
+        mixer = audio._get_linux_mixer()
+        assert isinstance(mixer, audio._AmixerMixer)
+        assert audio._get_linux_mixer() is mixer  # detected once
+    finally:
+        audio.set_linux_mixer(None)
+
+
+def test_amixer_mixer_clamps(monkeypatch):
+    commands = []
+    monkeypatch.setattr(audio.subprocess, "check_call", commands.append)
+    mixer = audio._AmixerMixer()
+    mixer.amixer = "amixer"
+    mixer.set_volume(130)
+    mixer.set_volume(-5)
+    assert [command[-1] for command in commands] == ["100%", "0%"]
+
+
+class FakeAsound():
+    """The libasound calls _AlsaMixer makes after it is opened, on a raw range of 0-65536."""
+
+    def __init__(self, raw=0):
+        self.raw = raw
+        self.events = 0
+
+    def snd_mixer_handle_events(self, handle):
+        self.events += 1
+
+    def snd_mixer_selem_get_playback_volume(self, elem, channel, value):
+        value._obj.value = self.raw
+
+    def snd_mixer_selem_set_playback_volume_all(self, elem, raw):
+        self.raw = raw
+
+
+def test_alsa_mixer_maps_percent_to_the_raw_range():
+    mixer = audio._AlsaMixer.__new__(audio._AlsaMixer)
+    mixer._lib = lib = FakeAsound()
+    mixer._handle, mixer._elem = None, 1
+    mixer._min, mixer._max = 0, 65536
+    mixer._value = audio.ctypes.c_long()
+
+    mixer.set_volume(50)
+    assert lib.raw == 32768
+    assert mixer.get_volume() == 50
+    assert lib.events == 1  # picks up outside changes before reading
+    mixer.set_volume(250)
+    assert lib.raw == 65536
+    mixer.set_volume(-1)
+    assert lib.raw == 0
@@ -0,0 +1,47 @@
+import numpy as np
+
+from bufferPool import BufferPool
+
+
+def test_same_name_and_shape_reuses_the_buffer():
+    pool = BufferPool()
+    first = pool.get("frame", (48, 64, 3))
+    first[:] = 7
+    second = pool.get("frame", (48, 64, 3))
+    assert np.shares_memory(first, second) and (second == 7).all()
+    assert second.shape == (48, 64, 3) and second.dtype == np.uint8 and second.flags.c_contiguous
+    assert pool.allocations == 1
+
+    other = pool.get("scratch", (48, 64, 3))
+    assert not np.shares_memory(first, other) and pool.allocations == 2
+
+
+def test_larger_shapes_and_wider_dtypes_reallocate():
+    pool = BufferPool()
+    small = pool.get("frame", (48, 64, 3))
+    large = pool.get("frame", (96, 128, 3))
+    assert large.shape == (96, 128, 3) and not np.shares_memory(small, large)
+    assert pool.allocations == 2
+
+    wide = pool.get("frame", (96, 128, 3), np.float32)
+    assert wide.dtype == np.float32 and wide.shape == (96, 128, 3) and not np.shares_memory(large, wide)
+    assert pool.allocations == 3 and pool.allocatedBytes == 48 * 64 * 3 + 96 * 128 * 3 + 96 * 128 * 3 * 4
+
+
+def test_smaller_requests_reuse_the_larger_buffer():
+    pool = BufferPool()
+    wide = pool.get("frame", (96, 128, 3), np.float32)
+    narrow = pool.get("frame", (48, 64, 3), np.uint8)
+    assert narrow.dtype == np.uint8 and narrow.shape == (48, 64, 3) and np.shares_memory(wide, narrow)
+    assert pool.allocations == 1
+    assert pool.stats() == {"buffers": 1, "allocations": 1, "allocatedBytes": 96 * 128 * 3 * 4,
+                            "heldBytes": 96 * 128 * 3 * 4}
+
+
+def test_release_drops_the_buffer():
+    pool = BufferPool()
+    first = pool.get("frame", (4, 4))
+    pool.release("frame")
+    pool.release("missing")
+    assert pool.stats()["buffers"] == 0
+    assert not np.shares_memory(first, pool.get("frame", (4, 4))) and pool.allocations == 2
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import numpy as np
+
+import frameClient
+from frameRing import FrameRingWriter
+
+
+def publish_later(delay, writer, frame):
+    publisher = threading.Timer(delay, lambda: writer.write(frame))
+    publisher.start()
+    return publisher
+
+
+def test_shared_memory_source_survives_a_server_restart(tmp_path):
+    path = str(tmp_path / "frames.ring")
+    writer = FrameRingWriter(path, shape=(4, 4, 3), notify=True)
+    source = frameClient.SharedMemorySource(path)
+    frames = iter(source)
+    try:
+        for value in (1, 2):
+            publish_later(0.05, writer, np.full((4, 4, 3), value, dtype=np.uint8)).join()
+            assert next(frames)[0, 0, 0] == value
+        writer.close()
+
+        writer = FrameRingWriter(path, shape=(2, 6, 3), notify=True)
+        publisher = publish_later(0.2, writer, np.full((2, 6, 3), 7, dtype=np.uint8))
+        frame = next(frames)
+        publisher.join()
+        assert frame.shape == (2, 6, 3) and frame[0, 0, 0] == 7
+        assert frameClient.frame_reference() == (path, 1)
+    finally:
+        frames.close()
+        source.close()
+        writer.close()
+
+
+def test_frame_stream_survives_a_server_restart(tmp_path):
+    path = str(tmp_path / "frames.ring")
+
+    async def scenario():
+        writer = FrameRingWriter(path, shape=(4, 4, 3), notify=True)
+        try:
+            writer.write(np.full((4, 4, 3), 1, dtype=np.uint8))
+            async with frameClient.FrameStream(path) as stream:
+                frame = await asyncio.wait_for(stream.__anext__(), 2.0)
+                assert frame[0, 0, 0] == 1
+                writer.close()
+                writer = FrameRingWriter(path, shape=(4, 4, 3), notify=True)
+                asyncio.get_running_loop().call_later(0.2, writer.write, np.full((4, 4, 3), 3, dtype=np.uint8))
+                frame = await asyncio.wait_for(stream.__anext__(), 3.0)
+                assert frame[0, 0, 0] == 3
+                assert stream.ring.reopened == 1
+        finally:
+            writer.close()
+
+    asyncio.run(scenario())
+
+
+def test_a_repeated_frame_reaches_the_callback_once(tmp_path):
+    from cameraServer import publish_frame
+
+    path = str(tmp_path / "frames.ring")
+    writer = FrameRingWriter(path, shape=(4, 4, 3), notify=True)
+    source = frameClient.SharedMemorySource(path)
+    seen = []
+    frames = iter(source.map(lambda frame: seen.append(int(frame[0, 0, 0]))))
+    try:
+        publish_frame(writer, np.full((4, 4, 3), 1, dtype=np.uint8), 4, 4)
+        next(frames)
+        # The camera delivers the same image again, then a new one
+        publish_frame(writer, np.full((4, 4, 3), 1, dtype=np.uint8), 4, 4)
+        threading.Timer(0.1, lambda: publish_frame(writer, np.full((4, 4, 3), 2, dtype=np.uint8), 4, 4)).start()
+        next(frames)
+    finally:
+        source.stop()
+        source.close()
+        writer.close()
+
+    assert seen == [1, 2]
+    assert source.reader.duplicateFrames == 1
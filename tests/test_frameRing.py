@@ -0,0 +1,209 @@
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from frameRing import (FrameRingReader, FrameRingWriter, RING_VERSION, fingerprint_sample_shape, frame_fingerprint,
+                       ring_size)
+from landmarkChannel import LandmarkWriter, RECORD_DTYPE
+
+SHAPE = (4, 6, 3)
+SLOTS = 3
+
+
+def frame(value):
+    return np.full(SHAPE, value, dtype=np.uint8)
+
+
+@pytest.fixture
+def ring(tmp_path):
+    path = str(tmp_path / "frames.ring")
+    writer = FrameRingWriter(path, shape=SHAPE, slotCount=SLOTS)
+    reader = FrameRingReader(path)
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+
+def test_publish_then_read_round_trip(ring):
+    writer, reader = ring
+    assert reader.read() == (0, None)
+    assert reader.shape == SHAPE and reader.pixelFormat == "BGR" and reader.dtype == np.uint8
+
+    sequence = writer.write(frame(7), captureNs=1234)
+    assert sequence == 1
+    assert reader.latestSequence() == 1
+    readSequence, data = reader.read()
+    assert readSequence == 1 and data == frame(7).tobytes()
+    viewSequence, view = reader.view()
+    assert viewSequence == 1 and np.array_equal(view, frame(7))
+    assert reader.captureTime(1) == 1234
+
+    out = np.empty(SHAPE, dtype=np.uint8)
+    assert reader.readInto(out) == 1
+    assert np.array_equal(out, frame(7))
+
+
+def test_acquire_publish_in_place(ring):
+    writer, reader = ring
+    writer.acquire()[:] = 9
+    assert reader.latestSequence() == 0  # not visible before publish()
+    assert writer.publish(fingerprint=42) == 1
+    assert np.array_equal(reader.frameView(1), frame(9))
+    assert reader.fingerprint(1) == 42
+
+
+def test_slot_becomes_invalid_once_overwritten(ring):
+    writer, reader = ring
+    writer.write(frame(1))
+    sequence, view = reader.view()
+    assert reader.isValid(sequence)
+    for value in range(2, SLOTS + 2):  # slotCount more frames wrap around onto the first slot
+        writer.write(frame(value))
+    assert not reader.isValid(sequence)
+    assert reader.frameView(sequence) is None
+    assert reader.captureTime(sequence) is None
+    assert reader.detach(sequence, view) is None
+    assert reader.isValid(SLOTS + 1)
+
+
+def test_torn_slot_is_rejected(ring):
+    writer, reader = ring
+    writer.write(frame(1))
+    sequence = writer.write(frame(2))
+    # The writer starts rewriting the slot of the newest frame (as after wrapping around): counter goes odd
+    base = writer._slotOffset(sequence)
+    counter = struct.unpack_from("<Q", writer.mm, base)[0]
+    struct.pack_into("<Q", writer.mm, base, counter + 1)
+
+    out = np.zeros(SHAPE, dtype=np.uint8)
+    assert reader.readInto(out) == 0
+    assert reader.read() == (0, None)
+    assert reader.view() == (0, None)
+    assert not out.any()
+    assert reader.retries > 0
+
+    struct.pack_into("<Q", writer.mm, base, counter + 2)  # write finished
+    assert reader.readInto(out) == sequence
+    assert np.array_equal(out, frame(2))
+
+
+def test_header_mismatch_raises(tmp_path):
+    path = str(tmp_path / "frames.ring")
+    writer = FrameRingWriter(path, shape=SHAPE)
+    try:
+        struct.pack_into("<I", writer.mm, 4, RING_VERSION + 1)
+        with pytest.raises(ValueError, match="version"):
+            FrameRingReader(path)
+        struct.pack_into("<4s", writer.mm, 0, b"XXXX")
+        with pytest.raises(ValueError, match="magic"):
+            FrameRingReader(path)
+    finally:
+        writer.close()
+
+
+def test_restarted_writer_leaves_old_mappings_intact(tmp_path):
+    path = str(tmp_path / "frames.ring")
+    writer = FrameRingWriter(path, shape=(64, 64, 3))
+    writer.write(np.full((64, 64, 3), 5, dtype=np.uint8))
+    reader = FrameRingReader(path)
+    sequence, view = reader.view()
+    writer.close(unlink=False)
+
+    # A server restarted with a smaller frame size must not shrink the file the reader still maps
+    restarted = FrameRingWriter(path, shape=(8, 8, 3))
+    try:
+        assert view.sum() == 5 * view.size  # would fault if the old pages were gone
+        assert reader.isValid(sequence)
+        fresh = FrameRingReader(path)
+        assert fresh.shape == (8, 8, 3)
+        fresh.close()
+        assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    finally:
+        reader.close()
+        restarted.close()
+
+
+@pytest.mark.parametrize("notify", [False, True])
+def test_reader_follows_a_restarted_writer(tmp_path, notify):
+    path = str(tmp_path / "frames.ring")
+    writer = FrameRingWriter(path, shape=SHAPE, notify=notify)
+    for value in range(5):
+        writer.write(frame(value))
+    reader = FrameRingReader(path)
+    try:
+        assert reader.waitForFrame(0, timeout=1.0)
+        lastSequence, _ = reader.view()
+        assert lastSequence == 5
+        writer.close()
+
+        # The server comes back with another frame size; its sequence numbers start at 1 again
+        writer = FrameRingWriter(path, shape=(2, 2, 3), notify=notify)
+        publisher = threading.Timer(0.2, lambda: writer.write(np.full((2, 2, 3), 9, dtype=np.uint8)))
+        publisher.start()
+        started = time.monotonic()
+        assert reader.waitForFrame(lastSequence, timeout=3.0)
+        assert time.monotonic() - started < 2.5
+        publisher.join()
+        assert reader.reopened == 1
+        assert reader.shape == (2, 2, 3)
+        sequence, view = reader.view()
+        assert sequence == 1 and (view == 9).all()
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_keeps_the_old_ring_while_the_writer_is_gone(tmp_path):
+    path = str(tmp_path / "frames.ring")
+    writer = FrameRingWriter(path, shape=SHAPE)
+    writer.write(frame(1))
+    reader = FrameRingReader(path)
+    writer.close()
+    try:
+        assert not reader.reopenIfReplaced()
+        assert not reader.waitForFrame(1, timeout=0.05)
+        assert reader.read()[0] == 1
+    finally:
+        reader.close()
+
+
+def test_fingerprint_into_a_preallocated_sample():
+    image = np.random.default_rng(1).integers(0, 255, (72, 128, 3), dtype=np.uint8)
+    sample = np.empty(fingerprint_sample_shape(image.shape), dtype=np.uint8)
+    assert sample.shape == (9, 16, 3)
+    fingerprint = frame_fingerprint(image, out=sample)
+    assert fingerprint == frame_fingerprint(image) and fingerprint >> 32 == 1
+    assert np.array_equal(sample, image[::8, ::8])
+
+    image[8, 8] += 1
+    assert frame_fingerprint(image, out=sample) != fingerprint
+
+
+@pytest.mark.parametrize("shape", [(3, 5, 3), (1, 1, 1), (4, 6, 3), (7, 11, 3)])
+def test_slots_start_on_cache_lines(tmp_path, shape):
+    path = str(tmp_path / "frames.ring")
+    writer = FrameRingWriter(path, shape=shape, slotCount=SLOTS)
+    reader = FrameRingReader(path)
+    try:
+        frameSize = int(np.prod(shape))
+        assert writer.slotStride % 64 == 0 and frameSize + 64 <= writer.slotStride < frameSize + 128
+        assert reader.slotStride == writer.slotStride
+        assert os.path.getsize(path) == ring_size(frameSize, SLOTS)
+        for value in range(SLOTS + 1):
+            writer.write(np.full(shape, value, dtype=np.uint8))
+            assert (reader.frameView(value + 1) == value).all()
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_landmark_records_start_on_cache_lines(tmp_path):
+    writer = LandmarkWriter(str(tmp_path / "landmarks.ring"))
+    try:
+        assert RECORD_DTYPE.itemsize % 64 and writer.ring.slotStride % 64 == 0
+    finally:
+        writer.close()
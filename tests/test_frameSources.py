@@ -0,0 +1,248 @@
+import itertools
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import frameSources
+from frameSources import CameraSource, FrameSource, ImageDirectorySource, NpyStackSource, RATE_MAX, VideoFileSource
+
+
+class ListSource(FrameSource):
+    def __init__(self, frames):
+        super().__init__(rate=RATE_MAX)
+        self.frames = frames
+
+    def _frames(self):
+        yield from self.frames
+
+
+def test_threaded_stage_reports_frames_and_drops():
+    frames = [np.full((2, 2, 3), value, dtype=np.uint8) for value in range(20)]
+    stage = ListSource(frames).threaded(copy=False)
+    assert stage.stats() == {"frames": 0, "queueDepth": 0, "maxQueueDepth": 0, "drops": 0}
+
+    received = []
+    for frame in stage:
+        received.append(int(frame[0, 0, 0]))
+        time.sleep(0.01)  # slower than the producer, so the one-frame queue drops
+
+    stats = stage.stats()
+    assert stats["frames"] == len(received) and stats["maxQueueDepth"] == 1
+    assert stats["drops"] == len(frames) - len(received) > 0
+    assert received[-1] == 19 and received == sorted(received)
+
+
+def write_video(path, values, fps=25):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (32, 24))
+    for value in values:
+        writer.write(np.full((24, 32, 3), value, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def values(source, count=None):
+    """Pixel value of each frame (frames share one buffer, so they are read as they arrive) and the seconds taken."""
+    started = time.monotonic()
+    seen = [int(frame[0, 0, 0]) for frame in itertools.islice(source, count)]
+    return seen, time.monotonic() - started
+
+
+@pytest.fixture
+def video(tmp_path):
+    return write_video(tmp_path / "clip.avi", [0, 40, 80, 120, 160])
+
+
+@pytest.fixture
+def images(tmp_path):
+    for index, value in enumerate([10, 20, 30]):
+        cv2.imwrite(str(tmp_path / f"{index:03}.png"), np.full((24, 32, 3), value, dtype=np.uint8))
+    (tmp_path / "notes.txt").write_text("not an image")
+    return str(tmp_path)
+
+
+@pytest.fixture
+def stack(tmp_path):
+    path = str(tmp_path / "frames.npy")
+    np.save(path, np.arange(4, dtype=np.uint8).reshape(4, 1, 1, 1).repeat(3, axis=3) * 50)
+    return path
+
+
+def test_video_file_plays_at_its_native_rate(video):
+    source = VideoFileSource(video)
+    seen, elapsed = values(source)
+    source.close()
+    assert seen == pytest.approx([0, 40, 80, 120, 160], abs=3)
+    assert elapsed >= 4 / 25 - 0.01
+
+
+def test_video_file_loops(video):
+    source = VideoFileSource(video, rate=RATE_MAX, loop=True)
+    seen, _ = values(source, 12)
+    source.close()
+    assert seen == pytest.approx([0, 40, 80, 120, 160] * 2 + [0, 40], abs=3)
+
+
+def test_missing_video_file_is_an_error(tmp_path):
+    with pytest.raises(ValueError, match="Cannot open video file"):
+        VideoFileSource(str(tmp_path / "missing.avi"))
+
+
+def test_image_directory_at_a_fixed_rate(images):
+    seen, elapsed = values(ImageDirectorySource(images, rate=50))
+    assert seen == [10, 20, 30] and elapsed >= 2 / 50 - 0.005
+    seen, _ = values(ImageDirectorySource(images, rate=RATE_MAX, loop=True), 7)
+    assert seen == [10, 20, 30, 10, 20, 30, 10]
+
+
+def test_image_directory_without_images_is_an_error(tmp_path):
+    with pytest.raises(ValueError, match="No images found"):
+        ImageDirectorySource(str(tmp_path))
+
+
+def test_npy_stack_native_rate_and_loop(stack):
+    source = NpyStackSource(stack, fps=40)
+    seen, elapsed = values(source)
+    assert seen == [0, 50, 100, 150] and elapsed >= 3 / 40 - 0.005
+    seen, elapsed = values(NpyStackSource(stack, rate=RATE_MAX, loop=True), 6)
+    assert seen == [0, 50, 100, 150, 0, 50] and elapsed < 3 / 40
+
+
+def test_npy_stack_frames_are_writable_copies(tmp_path):
+    gray = str(tmp_path / "gray.npy")
+    np.save(gray, np.full((2, 4, 4), 7, dtype=np.uint8))
+    frame = next(iter(NpyStackSource(gray, rate=RATE_MAX)))
+    assert frame.shape == (4, 4, 3) and (frame == 7).all()
+    frame[:] = 0
+    assert (np.load(gray) == 7).all()
+
+
+@pytest.mark.parametrize("shape, dtype", [((2, 4, 4, 4), np.uint8), ((2, 4, 4, 1), np.uint8), ((4, 4), np.uint8),
+                                          ((2, 4, 4, 3), np.float32)])
+def test_npy_stack_rejects_other_layouts(tmp_path, shape, dtype):
+    path = str(tmp_path / "bad.npy")
+    np.save(path, np.zeros(shape, dtype=dtype))
+    with pytest.raises(ValueError, match="uint8 frames shaped"):
+        NpyStackSource(path)
+
+
+@pytest.mark.parametrize("every", [0, -1])
+def test_decimate_rejects_intervals_below_one(every):
+    with pytest.raises(ValueError, match="every >= 1"):
+        ListSource([]).decimate(every)
+
+
+def test_decimate_passes_every_nth_frame():
+    frames = [np.full((1, 1, 3), value, dtype=np.uint8) for value in range(7)]
+    assert values(ListSource(frames).decimate(3))[0] == [0, 3, 6]
+
+
+class FakeCapture():
+    """cv2.VideoCapture stand-in: a camera of `modes` (the settings it accepts) counting up one value per frame."""
+
+    def __init__(self, deviceId, opened=True, modes=None):
+        self.opened = opened
+        self.modes = modes or {}
+        self.properties = {cv2.CAP_PROP_FRAME_WIDTH: 640, cv2.CAP_PROP_FRAME_HEIGHT: 480, cv2.CAP_PROP_FPS: 30.0,
+                           cv2.CAP_PROP_FOURCC: cv2.VideoWriter_fourcc(*"YUYV")}
+        self.reads = 0
+        self.released = False
+
+    def isOpened(self):
+        return self.opened
+
+    def set(self, prop, value):
+        if value in self.modes.get(prop, ()):
+            self.properties[prop] = value
+            return True
+        return False
+
+    def get(self, prop):
+        return self.properties[prop]
+
+    def read(self, image=None):
+        time.sleep(0.001)
+        self.reads += 1
+        if image is None:
+            image = np.empty((4, 4, 3), dtype=np.uint8)
+        image[:] = self.reads % 256
+        return True, image
+
+    def release(self):
+        self.released = True
+
+
+@pytest.fixture
+def capture(monkeypatch):
+    """Make cv2.VideoCapture return FakeCaptures; call it with FakeCapture's options before creating the source."""
+    options = {}
+    captures = []
+
+    def open_capture(deviceId):
+        captures.append(FakeCapture(deviceId, **options))
+        return captures[-1]
+    monkeypatch.setattr(frameSources.cv2, "VideoCapture", open_capture)
+
+    def configure(**values):
+        options.update(values)
+        return captures
+    return configure
+
+
+def test_unopened_camera_is_an_error(capture):
+    capture(opened=False)
+    with pytest.raises(ValueError, match="Cannot open camera 2"):
+        CameraSource(2)
+
+
+def test_camera_reports_the_negotiated_mode(capture, caplog):
+    mjpg = cv2.VideoWriter_fourcc(*"MJPG")
+    captures = capture(modes={cv2.CAP_PROP_FOURCC: [mjpg], cv2.CAP_PROP_FRAME_WIDTH: [1280],
+                              cv2.CAP_PROP_FRAME_HEIGHT: [720], cv2.CAP_PROP_FPS: [30.0]})
+    source = CameraSource(0, 1280, 720, fps=60, threaded=False)
+
+    assert source.mode == {"width": 1280, "height": 720, "fps": 30.0, "fourcc": "MJPG"}
+    assert source.describe() == "VideoCapture(ID=0, 1280x720 MJPG @ 30 fps)"
+    assert "{'fps': (60, 30.0)}" in caplog.text  # only the refused setting is reported
+    source.close()
+    assert captures[0].released
+
+
+def test_camera_accepting_the_mode_logs_nothing(capture, caplog):
+    capture(modes={cv2.CAP_PROP_FRAME_WIDTH: [320]})
+    source = CameraSource(0, width=320, fourcc=None, threaded=False)
+    assert source.mode["width"] == 320 and source.mode["fourcc"] == "YUYV"
+    assert "did not accept" not in caplog.text
+    source.close()
+
+
+def test_unthreaded_camera_reads_into_one_buffer(capture):
+    source = CameraSource(0, fourcc=None, threaded=False)
+    frames = [(frame, int(frame[0, 0, 0])) for frame in itertools.islice(source, 3)]
+    source.close()
+    assert [value for _, value in frames] == [1, 2, 3]
+    assert frames[0][0] is frames[2][0]
+
+
+def test_capture_thread_never_overwrites_the_lent_frame(capture):
+    captures = capture()
+    source = CameraSource(0, fourcc=None)
+    reader = source._reader
+    try:
+        frames = iter(source)
+        held = next(frames)
+        value = int(held[0, 0, 0])
+        readsBefore = captures[0].reads
+        time.sleep(0.05)  # the thread keeps capturing into the other two buffers meanwhile
+        assert captures[0].reads > readsBefore + 5
+        assert (held == value).all()
+
+        newer = next(frames)
+        assert newer is not held and int(newer[0, 0, 0]) > value
+        assert source.lastCaptureNs == reader.captureNs > 0
+        assert reader.dropped > 0  # frames nobody asked for in time
+        assert len({id(buffer) for buffer in reader._buffers}) == 3
+    finally:
+        source.close()
+    assert reader.next() is None and not reader._thread.is_alive()
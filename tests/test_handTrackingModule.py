@@ -0,0 +1,208 @@
+import math
+
+import numpy as np
+import pytest
+
+from fakes import FakeHands, hand_results
+import handTrackingModule
+from handTrackingModule import HandDetector
+
+
+def hand(x):
+    """One hand whose landmarks sit on a vertical line at x."""
+    landmarks = np.zeros((1, 21, 3), dtype=np.float32)
+    landmarks[0, :, 0] = x
+    landmarks[0, :, 1] = np.linspace(0.1, 0.9, 21)
+    return landmarks
+
+
+@pytest.fixture
+def detector():
+    detector = HandDetector(max_num_hands=1)
+    detector.hands = FakeHands(hand_results(hand(0.25)), hand_results(hand(0.75)))
+    return detector
+
+
+def frame(value):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+
+def test_repeated_frame_id_keeps_the_previous_landmarks(detector):
+    detector.detectHands(frame(0), draw=False, frameId=7)
+    detector.detectHands(frame(1), draw=False, frameId=7)
+    assert len(detector.hands.processed) == 1 and detector.duplicateFrames == 1
+    assert np.allclose(detector.landmarks, hand(0.25))
+
+    detector.detectHands(frame(1), draw=False, frameId=8)
+    assert len(detector.hands.processed) == 2 and detector.duplicateFrames == 1
+    assert np.allclose(detector.landmarks, hand(0.75))
+
+
+def test_repeated_image_is_recognised_by_its_fingerprint(detector):
+    detector.detectHands(frame(3), draw=False)
+    detector.detectHands(frame(3), draw=False)
+    assert len(detector.hands.processed) == 1 and detector.duplicateFrames == 1
+    detector.detectHands(frame(4), draw=False)
+    assert len(detector.hands.processed) == 2
+    assert np.allclose(detector.landmarks, hand(0.75))
+
+
+def test_duplicate_skipping_can_be_turned_off(detector):
+    detector.skipDuplicates = False
+    detector.detectHands(frame(0), draw=False, frameId=7)
+    detector.detectHands(frame(0), draw=False, frameId=7)
+    assert len(detector.hands.processed) == 2 and detector.duplicateFrames == 0
+
+
+# The list-based API as it was before the vectorized arrays, computed from MediaPipe-style results
+def baseline_positions(results, handNumber, img):
+    imgHeight, imgWidth = img.shape[:2]
+    landmarkList, xs, ys, palmXs, palmYs = [], [], [], [], []
+    for index, landmark in enumerate(results.multi_hand_landmarks[handNumber].landmark):
+        imgX, imgY = int(landmark.x * imgWidth), int(landmark.y * imgHeight)
+        xs.append(imgX)
+        ys.append(imgY)
+        landmarkList.append([index, imgX, imgY])
+        if index in [0, 5, 9, 13, 17]:
+            palmXs.append(imgX)
+            palmYs.append(imgY)
+    return (landmarkList, (min(xs), min(ys), max(xs), max(ys)),
+            (min(palmXs), min(palmYs), max(palmXs), max(palmYs)))
+
+
+def baseline_fingers_up(landmarkList):
+    fingers = [1 if landmarkList[4][1] > landmarkList[3][1] else 0]
+    for tip in (8, 12, 16, 20):
+        fingers.append(1 if landmarkList[tip][2] < landmarkList[tip - 2][2] else 0)
+    return fingers
+
+
+def baseline_distance(landmarkList, landmark1Id, landmark2Id):
+    x1, y1 = landmarkList[landmark1Id][1:]
+    x2, y2 = landmarkList[landmark2Id][1:]
+    return math.hypot(x2 - x1, y2 - y1), [x1, y1, x2, y2, (x1 + x2) // 2, (y1 + y2) // 2]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_list_api_matches_the_baseline_for_every_hand(seed):
+    rng = np.random.default_rng(seed)
+    landmarks = rng.uniform(0.0, 1.0, (2, 21, 3)).astype(np.float32)
+    results = hand_results(landmarks)
+    img = np.zeros((rng.integers(120, 720), rng.integers(160, 1280), 3), dtype=np.uint8)
+    detector = HandDetector(max_num_hands=2)
+    detector.hands = FakeHands(results)
+    detector.detectHands(img, draw=False)
+
+    positions, handBoxes, palmBoxes = detector.findPositionsArray(img, draw=False)
+    fingers = detector.fingersUpArray(positions)
+    lengths, points = detector.findDistanceArray(4, 8, positions)
+    for handNumber in range(2):
+        expected = baseline_positions(results, handNumber, img)
+        assert detector.findPositions(img, handNumber=handNumber, draw=False) == expected
+        assert detector.fingersUp() == baseline_fingers_up(expected[0])
+        length, info = detector.findDistance(4, 8, img, draw=False)
+        assert (length, info) == baseline_distance(expected[0], 4, 8)
+
+        assert positions[handNumber].tolist() == expected[0]
+        assert tuple(handBoxes[handNumber].tolist()) == expected[1]
+        assert tuple(palmBoxes[handNumber].tolist()) == expected[2]
+        assert fingers[handNumber].tolist() == baseline_fingers_up(expected[0])
+        assert lengths[handNumber] == pytest.approx(length) and points[handNumber].tolist() == info
+
+
+def test_no_hands_found():
+    img = np.zeros((48, 64, 3), dtype=np.uint8)
+    detector = HandDetector()
+    detector.hands = FakeHands()
+    detector.detectHands(img, draw=False)
+
+    assert detector.findPositions(img, draw=False) == ([], (), ())
+    positions, handBoxes, palmBoxes = detector.findPositionsArray(img, draw=False)
+    assert positions.shape == (0, 21, 3) and handBoxes.shape == palmBoxes.shape == (0, 4)
+    assert detector.fingersUpArray(positions).shape == (0, 5)
+    assert detector.findDistanceArray(4, 8, positions)[0].shape == (0,)
+
+
+class Clock():
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Scene(FakeHands):
+    """Hands graph that finds whatever hands[frame] holds, so skipped frames go unseen."""
+
+    def __init__(self, hands):
+        super().__init__()
+        self.hands = hands
+        self.frame = 0
+
+    def process(self, img):
+        self.processed.append(img.shape)
+        return hand_results(self.hands[self.frame])
+
+
+def run_frames(detector, clock, hands, frameInterval=1 / 30):
+    """Feed one frame per entry of hands; returns detector.predicted and the first landmark's x per frame."""
+    detector.hands = Scene(hands)
+    predicted, xs = [], []
+    for frameId in range(len(hands)):
+        detector.hands.frame = frameId
+        detector.detectHands(frame(0), draw=False, frameId=frameId)
+        predicted.append(detector.predicted)
+        xs.append(float(detector.landmarks[0, 0, 0]) if len(detector.landmarks) else None)
+        clock.now += frameInterval
+    return predicted, xs
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(handTrackingModule, "time", clock)
+    return clock
+
+
+def test_detect_every_runs_the_model_on_every_nth_frame(clock):
+    detector = HandDetector(detectEvery=3)
+    predicted, _ = run_frames(detector, clock, [hand(0.5)] * 9)
+    assert predicted == [False, True, True] * 3
+    assert len(detector.hands.processed) == detector.inferenceFrames == 3 and detector.predictedFrames == 6
+
+
+def test_detect_interval_runs_the_model_by_elapsed_time(clock):
+    detector = HandDetector(detectInterval=0.1)
+    predicted, _ = run_frames(detector, clock, [hand(0.5)] * 8, frameInterval=0.03)
+    # Inference at 0, 0.12 and 0.24 s
+    assert predicted == [False, True, True, True, False, True, True, True]
+
+
+def test_predicted_landmarks_follow_the_motion(clock):
+    detector = HandDetector(detectEvery=4, adaptiveDecimation=False)
+    # Moving right by 0.003 per frame while the model only sees every 4th frame
+    predicted, xs = run_frames(detector, clock, [hand(0.3 + 0.003 * step) for step in range(8)])
+    assert predicted == [False, True, True, True] * 2
+    assert xs[:4] == [pytest.approx(0.3)] * 4  # no velocity from a single detection
+    assert xs[4] == pytest.approx(0.312)
+    assert xs[4] < xs[5] < xs[6] < xs[7] <= 0.321 + 1e-6  # extrapolated right, never past the true position
+
+
+def test_fast_motion_shortens_the_interval(clock):
+    fastHands = [hand(0.1 + 0.05 * step) for step in range(12)]  # 1.5 units per second
+    slow = HandDetector(detectEvery=4, adaptiveDecimation=False)
+    fast = HandDetector(detectEvery=4, motionThreshold=0.5)
+
+    assert run_frames(slow, clock, fastHands)[0].count(False) == 3
+    predicted, _ = run_frames(fast, clock, fastHands)
+    # The smoothed speed estimate tightens the interval within two detections, then the model sees every frame
+    assert predicted[:6] == [False, True, True, True, False, True]
+    assert predicted[6:] == [False] * 6
+
+
+def test_losing_the_hand_drops_the_prediction(clock):
+    detector = HandDetector(detectEvery=3)
+    noHands = np.zeros((0, 21, 3), dtype=np.float32)
+    predicted, xs = run_frames(detector, clock, [hand(0.5)] * 3 + [noHands, hand(0.5)])
+    assert predicted == [False, True, True, False, False]
+    assert xs[3] is None and xs[4] == pytest.approx(0.5)
@@ -0,0 +1,21 @@
+import numpy as np
+
+import frameClient
+import handTrackingVolumeAdjustV2 as v2
+
+
+def test_shared_landmarks_without_a_detecting_server(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(frameClient, "FRAME_RING_PATH", str(tmp_path / "frames.ring"))
+    monkeypatch.setattr(v2, "handDetector", None)
+
+    v2.main(sharedLandmarks=True, headless=True)
+
+    assert "cameraServer.py --detect" in capsys.readouterr().out
+    assert v2.landmarkReader is None and v2.handDetector is None
+
+
+def test_shared_landmark_detector_loads_no_model():
+    detector = v2.create_hand_detector(sharedLandmarks=True)
+    assert detector.hands is None
+    detector.loadLandmarks(v2.NO_HANDS)
+    assert detector.findPositions(np.zeros((48, 64, 3), dtype=np.uint8), draw=False)[0] == []
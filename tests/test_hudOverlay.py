@@ -0,0 +1,61 @@
+import random
+
+import cv2
+import numpy as np
+
+import overlay_colors as colors
+from hudOverlay import VolumeHud
+
+
+def draw_overlay_directly(img, volumeBar, isAdjustingVolume, currentVolume):
+    """The V2 HUD as it was drawn before the sprites: rasterized onto every frame."""
+    dx, dy = -140, 75
+    x_fill = 150 + (400 - int(volumeBar)) + dx
+    x_fill = max(150 + dx, min(400 + dx, x_fill))
+    barFillColor = colors.COLOR_GREEN if isAdjustingVolume else colors.COLOR_LINE
+    cv2.rectangle(img, (150 + dx, 5 + dy), (x_fill, 20 + dy), barFillColor, cv2.FILLED)
+    cv2.rectangle(img, (150 + dx, 5 + dy), (400 + dx, 20 + dy), colors.COLOR_LINE, 3)
+
+    adjustingAudioTextColor = colors.COLOR_GREEN if isAdjustingVolume else colors.COLOR_WHITE
+    adjustingAudioText = 'Changing audio' if isAdjustingVolume else 'Not changing audio'
+    cv2.putText(img, adjustingAudioText, (5, 70), cv2.FONT_HERSHEY_PLAIN, 1, adjustingAudioTextColor, 2)
+    cv2.putText(img, f'AUDIO={currentVolume}%', (0, 45), cv2.FONT_HERSHEY_PLAIN, 2, colors.COLOR_GREEN, 2)
+
+
+def test_sprites_match_direct_drawing():
+    rng = random.Random(17)
+    hud = VolumeHud()
+    for case in range(200):
+        height, width = rng.choice([(480, 640), (720, 1280)])
+        background = np.random.default_rng(case).integers(0, 256, (height, width, 3), dtype=np.uint8)
+        state = (rng.uniform(-50, 450), rng.random() < 0.5, rng.randint(0, 100))
+
+        expected = background.copy()
+        draw_overlay_directly(expected, *state)
+        actual = background.copy()
+        hud.draw(actual, *state)
+
+        difference = np.abs(actual.astype(np.int16) - expected).max()
+        assert difference <= 1, f"case {case} {state}: off by {difference}"
+
+
+def test_small_frames_show_the_corner_of_the_hud():
+    # Direct drawing rasterizes thick strokes differently where the frame edge clips them; sprites are just cut off
+    hud = VolumeHud()
+    full = np.zeros((480, 640, 3), dtype=np.uint8)
+    hud.draw(full, 127.3, False, 47)
+    small = np.zeros((60, 150, 3), dtype=np.uint8)
+    hud.draw(small, 127.3, False, 47)
+    assert (small == full[:60, :150]).all()
+
+
+def test_each_value_is_rendered_once():
+    hud = VolumeHud()
+    img = np.zeros((480, 640, 3), dtype=np.uint8)
+    for volumeBar in range(0, 400, 10):
+        hud.draw(img, volumeBar, True, 40)
+    assert hud.compositor.rendered == 3  # bar outline, status and AUDIO=40%
+
+    hud.draw(img, 0, False, 41)
+    hud.draw(img, 0, True, 40)
+    assert hud.compositor.rendered == 5
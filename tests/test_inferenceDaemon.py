@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from frameRing import FrameRingWriter
+from inferenceDaemon import InferenceDaemon
+
+
+class FakeDetector():
+    def __init__(self, **options):
+        self.options = options
+        self.resets = 0
+        self.closed = False
+
+    def reset(self):
+        self.resets += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession():
+    def __init__(self, options, detector):
+        self.options = options
+        self.detector = detector
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    return InferenceDaemon(str(tmp_path / "inference.sock"), warmDetectors=0, detectorFactory=FakeDetector,
+                           idlePerOptions=2, maxIdle=3)
+
+
+def release(daemon, detector):
+    with daemon._condition:
+        daemon._releaseDetector(FakeSession(detector.options, detector))
+
+
+def test_reused_detectors_are_reset(daemon):
+    options = daemon._sessionOptions({})
+    detector = daemon._takeDetector(options)
+    assert detector.resets == 0
+    release(daemon, detector)
+    assert daemon._takeDetector(options) is detector and detector.resets == 1
+
+
+def test_idle_detectors_are_capped_per_options_and_in_total(daemon):
+    first = daemon._sessionOptions({"max_num_hands": 1})
+    second = daemon._sessionOptions({"max_num_hands": 2})
+    detectors = [daemon._takeDetector(first) for _ in range(3)]
+    for detector in detectors:
+        release(daemon, detector)
+    assert detectors[0].closed and not detectors[1].closed  # the one idle longest goes
+    assert daemon.stats()["idleDetectors"] == 2
+
+    others = [daemon._takeDetector(second) for _ in range(2)]
+    for detector in others:
+        release(daemon, detector)
+    # Over the total: the least recently used options lose a detector first
+    assert detectors[1].closed and not detectors[2].closed
+    assert not any(detector.closed for detector in others)
+    assert daemon.stats()["idleDetectors"] == 3 and daemon.evictedDetectors == 2
+
+
+def test_ring_follows_a_restarted_server(daemon, tmp_path):
+    path = str(tmp_path / "frames.ring")
+    writer = FrameRingWriter(path, shape=(4, 4, 3))
+    writer.write(np.full((4, 4, 3), 1, dtype=np.uint8))
+    ring = daemon._ring(path)
+    assert (ring.frameView(1) == 1).all()
+    writer.close()
+
+    writer = FrameRingWriter(path, shape=(2, 6, 3))
+    try:
+        writer.write(np.full((2, 6, 3), 7, dtype=np.uint8))
+        ring = daemon._ring(path)
+        assert ring.shape == (2, 6, 3) and (ring.frameView(1) == 7).all()
+    finally:
+        ring.close()
+        writer.close()
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+import instrumentation
+from instrumentation import BUCKET_COUNT, Histogram, bucket_index, bucket_upper_bound_ns
+
+SECOND = 1_000_000_000
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    """Instrumentation with fresh histograms and a manual clock; the globals are restored afterwards."""
+    clock = [SECOND]
+    monkeypatch.setattr(instrumentation, "enabled", True)
+    monkeypatch.setattr(instrumentation, "_clock", lambda: clock[0])
+    monkeypatch.setattr(instrumentation, "_sinks", [])
+    monkeypatch.setattr(instrumentation, "_histograms", {})
+    return clock
+
+
+@pytest.mark.parametrize("durationNs, index", [(0, 0), (1, 0), (1023, 0), (1024, 1), (1279, 1), (1280, 2),
+                                               (2047, 4), (2048, 5), (1 << 40, BUCKET_COUNT - 1)])
+def test_bucket_index_boundaries(durationNs, index):
+    assert bucket_index(durationNs) == index
+
+
+def test_each_bucket_covers_up_to_its_upper_bound():
+    assert bucket_upper_bound_ns(0) == 1024 and bucket_upper_bound_ns(1) == 1280 and bucket_upper_bound_ns(4) == 2048
+    rng = random.Random(13)
+    for durationNs in [rng.randrange(1 << rng.randrange(1, 34)) for _ in range(5000)]:
+        index = bucket_index(durationNs)
+        assert durationNs < bucket_upper_bound_ns(index)
+        if index:
+            assert durationNs >= bucket_upper_bound_ns(index - 1)
+
+
+def test_old_windows_rotate_out():
+    hist = Histogram("stage", windowSeconds=1.0, windowCount=3)
+    start = hist._windowStart
+    hist.record(5000, start)
+    hist.record(5000, start + SECOND)
+    assert hist.summary()["count"] == 2
+
+    hist.record(5000, start + 3 * SECOND)  # the first window is reused
+    assert hist.summary()["count"] == 2 and hist.total == 3
+
+    hist.record(5000, start + 10 * SECOND)  # long idle: everything older is gone
+    assert hist.summary()["count"] == 1 and hist.total == 4
+
+
+def test_percentiles_from_known_durations():
+    hist = Histogram("stage")
+    now = hist._windowStart
+    for _ in range(90):
+        hist.record(1500, now)  # bucket [1280, 1536)
+    for _ in range(9):
+        hist.record(100_000, now)  # bucket [98304, 114688)
+    hist.record(3_000_000, now)  # bucket [2621440, 3145728)
+
+    summary = hist.summary()
+    assert summary["count"] == 100
+    assert summary["mean_us"] == pytest.approx((90 * 1500 + 9 * 100_000 + 3_000_000) / 100 / 1e3)
+    assert (summary["p50_us"], summary["p95_us"], summary["p99_us"]) == (1.536, 114.688, 114.688)
+    hist.record(3_000_000, now)
+    assert hist.summary()["p99_us"] == 3145.728
+
+
+def test_spans_record_into_their_histograms(metrics):
+    seen = []
+    instrumentation.add_sink(lambda name, startNs, endNs: seen.append((name, endNs - startNs)))
+    start = instrumentation.start()
+    metrics[0] += 2000
+    instrumentation.stop("inference", start)
+    with instrumentation.span("draw"):
+        metrics[0] += 3000
+
+    assert seen == [("inference", 2000), ("draw", 3000)]
+    assert instrumentation.summary()["inference"]["count"] == 1
+    assert instrumentation.summary()["draw"]["mean_us"] == 3.0
+
+
+def test_disabled_instrumentation_records_nothing(metrics, monkeypatch):
+    monkeypatch.setattr(instrumentation, "enabled", False)
+    seen = []
+    instrumentation.add_sink(lambda *span: seen.append(span))
+
+    start = instrumentation.start()
+    assert start == 0
+    instrumentation.stop("inference", start)
+    instrumentation.record("queueWait", 5000)
+    with instrumentation.span("draw") as span:
+        pass
+
+    assert span is instrumentation._NULL_SPAN
+    assert instrumentation.summary() == {} and seen == []
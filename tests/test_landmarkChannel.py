@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from frameRing import FrameRingWriter
+from landmarkChannel import (LandmarkPublisher, LandmarkReader, LandmarkWriter, LANDMARK_RING_PATH, NUM_LANDMARKS,
+                             landmark_ring_path)
+from frameClient import FRAME_RING_PATH
+
+
+def hand(value):
+    return np.full((1, NUM_LANDMARKS, 3), value, dtype=np.float32)
+
+
+@pytest.fixture
+def channel(tmp_path):
+    writer = LandmarkWriter(str(tmp_path / "landmarks.ring"), slotCount=4)
+    reader = LandmarkReader(writer.ring.path)
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+
+def test_landmark_ring_sits_next_to_its_frame_ring():
+    assert landmark_ring_path(FRAME_RING_PATH) == LANDMARK_RING_PATH
+    assert landmark_ring_path("/dev/shm/second.ring") == os.path.join("/dev/shm", "second-landmarks.ring")
+
+
+def test_read_frame_returns_the_record_of_that_frame(channel):
+    writer, reader = channel
+    for frameSequence in (3, 4, 5):
+        writer.publish(frameSequence, None, 64, 48, hand(frameSequence / 10))
+
+    record = reader.readFrame(4)
+    assert record.frameSequence == 4 and np.allclose(record.landmarks, 0.4)
+    assert reader.readFrame(5).frameSequence == 5
+
+
+def test_read_frame_gives_up_on_skipped_and_overwritten_frames(channel):
+    writer, reader = channel
+    for frameSequence in (1, 2, 4, 5, 6, 7):
+        writer.publish(frameSequence, None, 64, 48, hand(0.5))
+
+    assert reader.readFrame(3) is None  # skipped by the publisher
+    assert reader.readFrame(2) is None  # its slot was reused
+    started = time.monotonic()
+    assert reader.readFrame(8, timeout=0.05) is None  # never published
+    assert time.monotonic() - started >= 0.05
+
+
+def test_read_frame_waits_for_the_record(channel):
+    writer, reader = channel
+    writer.publish(1, None, 64, 48, hand(0.1))
+    publisher = threading.Timer(0.05, lambda: writer.publish(2, None, 64, 48, hand(0.2)))
+    publisher.start()
+
+    record = reader.readFrame(2, timeout=2.0)
+    publisher.join()
+    assert record is not None and np.allclose(record.landmarks, 0.2)
+
+
+class SlowDetector():
+    duplicateFrames = 0
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.frames = []
+        self.landmarks = hand(0.5)
+        self.handedness = self.scores = None
+
+    def detectHands(self, img, draw=False, frameId=None):
+        self.frames.append(img)
+        time.sleep(self.delay)
+
+
+def test_publisher_detects_on_a_private_copy(tmp_path):
+    framePath = str(tmp_path / "frames.ring")
+    frames = FrameRingWriter(framePath, shape=(4, 4, 3), slotCount=2, notify=True)
+    detector = SlowDetector(0.0)
+    publisher = LandmarkPublisher(detector, framePath).start()
+    try:
+        frames.write(np.full((4, 4, 3), 9, dtype=np.uint8))
+        reader = LandmarkReader(publisher.landmarkPath)
+        assert reader.readFrame(1, timeout=2.0) is not None
+        reader.close()
+    finally:
+        publisher.stop()
+        frames.close()
+
+    assert publisher.landmarkPath == str(tmp_path / "frames-landmarks.ring")
+    assert detector.frames[0].flags.writeable and (detector.frames[0] == 9).all()
+
+
+def test_stop_leaves_the_ring_to_a_busy_publisher(tmp_path):
+    framePath = str(tmp_path / "frames.ring")
+    frames = FrameRingWriter(framePath, shape=(4, 4, 3), notify=True)
+    publisher = LandmarkPublisher(SlowDetector(1.5), framePath).start()
+    try:
+        frames.write(np.zeros((4, 4, 3), dtype=np.uint8))
+        deadline = time.monotonic() + 2.0
+        while not publisher.detector.frames and time.monotonic() < deadline:
+            time.sleep(0.01)
+        publisher.stop()
+        # Still detecting: the ring stays until the thread finishes and closes it
+        assert os.path.exists(publisher.landmarkPath)
+        publisher._thread.join(3.0)
+        assert not os.path.exists(publisher.landmarkPath)
+    finally:
+        frames.close()
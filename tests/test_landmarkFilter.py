@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from landmarkFilter import ConstantVelocityPredictor, OneEuroFilter
+
+
+def line(t, speed=0.5):
+    """(1 hand, 21 landmarks, x/y) moving right at `speed` normalized units per second."""
+    points = np.zeros((1, 21, 2))
+    points[..., 0] = 0.1 + speed * t
+    points[..., 1] = np.linspace(0.2, 0.8, 21)
+    return points
+
+
+@pytest.mark.parametrize("predictor", [ConstantVelocityPredictor(), OneEuroFilter()])
+def test_nothing_to_predict_before_the_first_update(predictor):
+    assert predictor.predict(1.0) is None and predictor.speed == 0.0
+    predictor.update(line(0.0), 0.0)
+    assert np.allclose(predictor.predict(0.5), line(0.0))  # no velocity from a single measurement
+    predictor.reset()
+    assert predictor.predict(1.0) is None
+
+
+def test_constant_velocity_extrapolates_linear_motion():
+    predictor = ConstantVelocityPredictor(velocitySmoothing=0.0)
+    predictor.update(line(0.0), 0.0)
+    predictor.update(line(0.1), 0.1)
+    assert predictor.speed == pytest.approx(0.5)
+    assert np.allclose(predictor.predict(0.3), line(0.3))
+
+
+def test_constant_velocity_smoothing_converges_to_the_true_velocity():
+    predictor = ConstantVelocityPredictor(velocitySmoothing=0.5)
+    predictor.update(line(0.0), 0.0)
+    predictor.update(line(0.1), 0.1)
+    assert predictor.speed == pytest.approx(0.25)  # half way from 0 to the measured 0.5
+    for step in range(2, 20):
+        predictor.update(line(step / 10), step / 10)
+    assert predictor.speed == pytest.approx(0.5, rel=1e-4)
+    assert np.allclose(predictor.predict(2.0), line(2.0), atol=1e-4)
+
+
+def test_constant_velocity_restarts_when_the_hands_change():
+    predictor = ConstantVelocityPredictor(velocitySmoothing=0.0)
+    predictor.update(line(0.0), 0.0)
+    predictor.update(line(0.1), 0.1)
+    twoHands = np.concatenate((line(0.2), line(0.4)))
+    predictor.update(twoHands, 0.2)
+    assert predictor.speed == 0.0 and np.allclose(predictor.predict(0.5), twoHands)
+
+
+def test_one_euro_smooths_jitter_of_a_resting_hand():
+    oneEuro = OneEuroFilter(minCutoff=1.0, beta=0.0)
+    noise = np.random.default_rng(0).normal(0.0, 0.01, 60)
+    filtered = [oneEuro.update(line(0.0) + offset, step / 30)[0, 0, 0] for step, offset in enumerate(noise)]
+    assert np.std(np.array(filtered[10:]) - line(0.0)[0, 0, 0]) < 0.5 * np.std(noise[10:])
+
+
+def test_one_euro_lags_less_when_beta_lets_it_follow_fast_motion():
+    lags = []
+    for beta in (0.0, 5.0):
+        oneEuro = OneEuroFilter(minCutoff=1.0, beta=beta)
+        for step in range(30):
+            value = oneEuro.update(line(step / 30, speed=2.0), step / 30)
+        lags.append(line(29 / 30, speed=2.0)[0, 0, 0] - value[0, 0, 0])
+    assert 0 < lags[1] < lags[0] / 2
+    assert oneEuro.speed > 1.5  # fast enough to shorten the inference interval (see HandDetector)
@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+import traceExport
+
+# Records spans with tracing on while the collector runs after every allocation. A GC pass started
+# inside the tracer's own flush used to wait forever on the lock that flush holds.
+_RECORD_UNDER_GC = """
+import gc, sys
+import instrumentation, traceExport
+traceExport.enable(sys.argv[1], "gc")
+gc.set_threshold(1)
+for frame in range(int(sys.argv[2])):
+    traceExport.set_frame(frame)
+    with instrumentation.span("work"):
+        [{"frame": frame}]
+traceExport.disable()
+"""
+
+
+def test_spans_under_constant_garbage_collection_do_not_deadlock(tmp_path):
+    spans = 3 * traceExport._FLUSH_EVENTS
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", _RECORD_UNDER_GC, str(tmp_path), str(spans)], cwd=root, check=True,
+                   timeout=60, env=dict(os.environ, PYTHONPATH=root))
+
+    (path,) = tmp_path.iterdir()
+    events = traceExport.load_events(str(path))
+    names = [event["name"] for event in events]
+    assert names.count("work") == spans
+    assert "gc" in names
+    assert all(event["args"]["frame"] == index for index, event
+               in enumerate(event for event in events if event["name"] == "work"))
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from volumeActuator import VolumeActuator
+from volumeState import VolumeState
+
+
+class FakeBackend():
+    """setVolume stand-in that records its calls; hold() makes the next call wait for release()."""
+
+    def __init__(self):
+        self.calls = []
+        self.times = []
+        self.failures = 0
+        self._entered = threading.Event()
+        self._released = threading.Event()
+        self._released.set()
+
+    def __call__(self, percent):
+        self.times.append(time.monotonic())
+        self._entered.set()
+        self._released.wait(5.0)
+        if self.failures:
+            self.failures -= 1
+            raise OSError("mixer gone")
+        self.calls.append(percent)
+
+    def hold(self):
+        self._entered.clear()
+        self._released.clear()
+
+    def waitUntilCalled(self):
+        assert self._entered.wait(2.0)
+
+    def release(self):
+        self._released.set()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+@pytest.fixture
+def make_actuator(backend):
+    actuators = []
+
+    def make(**options):
+        actuator = VolumeActuator(setVolume=backend, **options)
+        actuators.append(actuator)
+        return actuator
+
+    yield make
+    backend.release()
+    for actuator in actuators:
+        actuator.stop()
+
+
+def settled(actuator):
+    return lambda: actuator.applied + actuator.skipped + actuator.failed == actuator.posted
+
+
+def test_burst_posted_while_busy_applies_only_the_newest(make_actuator, backend):
+    actuator = make_actuator(deadband=0, maxRate=None)
+    backend.hold()
+    actuator.post(10)
+    backend.waitUntilCalled()
+    for percent in (20, 30, 40):
+        actuator.post(percent)
+    backend.release()
+
+    assert wait_for(settled(actuator))
+    assert backend.calls == [10, 40]
+    assert actuator.stats() == {"posted": 4, "applied": 2, "skipped": 2, "coalesced": 2, "skippedDeadband": 0,
+                                "failed": 0}
+
+
+def test_changes_inside_the_deadband_are_skipped(make_actuator, backend):
+    actuator = make_actuator(deadband=2, maxRate=None)
+    for percent in (50, 51, 48, 53):
+        actuator.post(percent)
+        assert wait_for(settled(actuator))
+
+    assert backend.calls == [50, 53]
+    assert actuator.lastApplied == 53
+    assert actuator.stats()["skippedDeadband"] == 2 and actuator.skipped == 2
+
+
+def test_backend_calls_are_rate_limited(make_actuator, backend):
+    actuator = make_actuator(deadband=0, maxRate=10.0)
+    actuator.post(10)
+    assert wait_for(lambda: actuator.applied == 1)
+    for percent in (20, 30):
+        actuator.post(percent)
+
+    assert wait_for(lambda: actuator.applied == 2)
+    assert backend.calls == [10, 30]
+    assert backend.times[1] - backend.times[0] >= 0.1 - 0.005
+    assert actuator.coalesced == 1
+
+
+def test_failures_are_counted_and_not_remembered(make_actuator, backend):
+    state = VolumeState(0)
+    actuator = make_actuator(deadband=1, maxRate=None, state=state)
+    backend.failures = 1
+    actuator.post(60)
+    assert wait_for(settled(actuator))
+    assert actuator.failed == 1 and actuator.lastApplied is None and state.get() == 0
+
+    actuator.post(60)
+    assert wait_for(settled(actuator))
+    assert backend.calls == [60] and state.get() == 60
+    assert actuator.stats() == {"posted": 2, "applied": 1, "skipped": 0, "coalesced": 0, "skippedDeadband": 0,
+                                "failed": 1}
+
+
+def test_outside_volume_changes_move_the_deadband(make_actuator, backend):
+    state = VolumeState(0)
+    actuator = make_actuator(deadband=2, maxRate=None, state=state)
+    actuator.post(40)
+    assert wait_for(settled(actuator))
+    state.update(70, "watcher")  # e.g. changed with the keyboard
+
+    actuator.post(41)
+    assert wait_for(settled(actuator))
+    assert backend.calls == [40, 41]
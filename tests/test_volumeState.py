@@ -0,0 +1,106 @@
+import os
+import select
+import sys
+import time
+
+import pytest
+
+import audio
+from fakes import FakeMixer
+from volumeState import AlsaVolumeWatcher, PollingVolumeWatcher, VolumeState, start_volume_watcher
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux mixer backend")
+
+
+class WatchableFakeMixer(FakeMixer):
+    """Signals every outside volume change on a pipe, like ALSA's poll descriptors."""
+
+    def __init__(self, volume=40):
+        super().__init__(volume)
+        self._read, self._write = os.pipe()
+        os.set_blocking(self._read, False)
+
+    def changeOutside(self, volume):
+        self.volume = volume
+        os.write(self._write, b"x")
+
+    def get_volume(self):
+        try:
+            os.read(self._read, 64)  # consume the pending events
+        except BlockingIOError:
+            pass
+        return self.volume
+
+    def poll_descriptors(self):
+        return [(self._read, select.POLLIN)]
+
+    def release(self):
+        os.close(self._read)
+        os.close(self._write)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def installed():
+    mixers = []
+
+    def install(mixer):
+        mixers.append(mixer)
+        audio.set_linux_mixer(mixer)
+        return mixer
+    yield install
+    audio.set_linux_mixer(None)
+    for mixer in mixers:
+        if hasattr(mixer, "release"):
+            mixer.release()
+
+
+def test_watches_the_installed_mixer(installed):
+    mixer = installed(WatchableFakeMixer(40))
+    state = VolumeState()
+    watcher = start_volume_watcher(state)
+    try:
+        assert isinstance(watcher, AlsaVolumeWatcher)
+        assert watcher.mixer is mixer
+        assert wait_for(lambda: state.volume == 40)
+        mixer.changeOutside(65)
+        assert wait_for(lambda: state.volume == 65)
+        assert state.source == "alsa"
+    finally:
+        watcher.stop()
+    assert not mixer.closed  # still the backend of audio.set_volume()
+
+
+def test_polls_a_mixer_that_cannot_be_watched(installed):
+    mixer = installed(FakeMixer(30))
+    state = VolumeState()
+    watcher = start_volume_watcher(state, pollInterval=0.01)
+    try:
+        assert isinstance(watcher, PollingVolumeWatcher)
+        assert wait_for(lambda: state.volume == 30)
+        mixer.volume = 80
+        assert wait_for(lambda: state.volume == 80)
+        assert state.source == "poll"
+    finally:
+        watcher.stop()
+    assert not mixer.closed
+
+
+def test_watcher_closes_a_mixer_it_was_given():
+    mixer = WatchableFakeMixer(10)
+    state = VolumeState()
+    watcher = AlsaVolumeWatcher(state, mixer, wakeupInterval=0.01).start()
+    try:
+        assert wait_for(lambda: state.volume == 10)
+    finally:
+        watcher.stop()
+        mixer.release()
+    assert mixer.closed
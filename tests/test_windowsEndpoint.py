@@ -0,0 +1,122 @@
+import pytest
+
+import audio
+
+
+class FakeEndpoint():
+    """Stands in for IAudioEndpointVolume."""
+
+    def __init__(self, level=0.5):
+        self.level = level
+        self.failures = 0  # calls that raise before the next one succeeds
+
+    def GetMasterVolumeLevelScalar(self):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("COM call failed")
+        return self.level
+
+    def SetMasterVolumeLevelScalar(self, level, context):
+        self.level = level
+
+
+class FakeCom():
+    def __init__(self):
+        self.deviceId = "speakers"
+        self.endpoints = []
+        self.lookups = 0
+
+    def get_speakers(self):
+        self.lookups += 1
+        return self.deviceId
+
+    def device_id(self, device):
+        return device
+
+    def activate(self, device):
+        self.endpoints.append(FakeEndpoint())
+        return self.endpoints[-1]
+
+    def cache(self, interval=60.0):
+        return audio._WindowsEndpointCache(self.get_speakers, self.device_id, self.activate, interval)
+
+
+def get_level(volume):
+    return volume.GetMasterVolumeLevelScalar()
+
+
+def test_interface_is_activated_once_and_reused():
+    com = FakeCom()
+    cache = com.cache()
+    for _ in range(5):
+        assert cache.call(get_level) == 0.5
+    assert len(com.endpoints) == 1 and com.lookups == 1
+    assert cache.stats()["activations"] == 1 and cache.stats()["hits"] == 4
+
+
+def test_failed_call_rebuilds_the_interface_and_retries():
+    com = FakeCom()
+    cache = com.cache()
+    cache.call(get_level)
+    com.endpoints[0].failures = 1
+    assert cache.call(get_level) == 0.5
+    assert len(com.endpoints) == 2  # the failed interface was thrown away
+    assert cache.failures == 1 and cache.invalidations == 1
+    assert cache.call(get_level) == 0.5
+    assert len(com.endpoints) == 2
+
+
+def test_second_failure_is_raised():
+    com = FakeCom()
+    original = com.activate
+
+    def activate_broken(device):
+        endpoint = original(device)
+        endpoint.failures = 1
+        return endpoint
+    com.activate = activate_broken
+    cache = com.cache()
+    with pytest.raises(OSError):
+        cache.call(get_level)
+    assert cache.failures == 2 and len(com.endpoints) == 2
+
+
+def test_explicit_invalidation():
+    com = FakeCom()
+    cache = com.cache()
+    cache.call(get_level)
+    cache.invalidate()
+    cache.call(get_level)
+    assert len(com.endpoints) == 2 and cache.invalidations == 1
+
+
+def test_default_device_change_is_detected():
+    com = FakeCom()
+    cache = com.cache(interval=0.0)  # check the device id on every call
+    cache.call(get_level)
+    cache.call(get_level)
+    assert len(com.endpoints) == 1  # same device: the interface is kept
+    com.deviceId = "headphones"
+    cache.call(get_level)
+    assert len(com.endpoints) == 2 and cache.invalidations == 1
+
+
+def test_device_is_not_looked_up_inside_the_check_interval():
+    com = FakeCom()
+    cache = com.cache(interval=60.0)
+    cache.call(get_level)
+    com.deviceId = "headphones"
+    cache.call(get_level)
+    assert com.lookups == 1 and len(com.endpoints) == 1
+
+
+def test_volume_functions_use_the_installed_cache():
+    com = FakeCom()
+    audio.set_windows_endpoint_cache(com.cache())
+    try:
+        audio._windows_get_set_volume(120)
+        assert com.endpoints[0].level == 1.0
+        audio._windows_get_set_volume(25)
+        assert audio._windows_get_set_volume(None) == 25
+    finally:
+        audio.set_windows_endpoint_cache(None)
@@ -0,0 +1,181 @@
+"""Opt-in Chrome trace / Perfetto export of per-frame spans.
+
+When FTVC_TRACE is set to a directory, every process that calls
+enable_from_env() (the camera server and frame clients) writes its
+instrumentation spans to `<dir>/trace-<process>-<pid>.json` in the Chrome
+trace event format. Timestamps come from time.monotonic_ns(), which is shared
+by all processes on the machine, and every span carries the sequence number of
+the frame being handled on that thread. Flow arrows link the server's
+`publish` of a frame to the client's `capture` of the same frame, and garbage
+collection pauses are recorded as `gc` spans.
+
+Merge the per-process files and open the result in chrome://tracing or
+https://ui.perfetto.dev:
+
+    python traceExport.py merge trace.json traces/*.json
+"""
+import atexit
+import collections
+import gc
+import json
+import os
+import sys
+import threading
+import time
+
+import instrumentation
+
+_FLUSH_EVENTS = 512
+
+_tracer = None
+
+
+class Tracer():
+    def __init__(self, path, processName):
+        self.path = path
+        self.pid = os.getpid()
+        # deque.append needs no lock, so the GC callback can record while _flush serializes on the same thread
+        self._events = collections.deque()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._gcStart = 0
+        self._flushing = False
+        self._file = open(path, "w")
+        self._file.write("[\n")
+        self._first = True
+        self._emit({"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": processName}})
+
+    def setFrame(self, sequence):
+        """Tag the spans recorded on this thread from now on with frame `sequence`."""
+        self._local.frame = sequence
+
+    def _emit(self, event):
+        self._events.append(event)
+        if len(self._events) >= _FLUSH_EVENTS:
+            with self._lock:
+                self._flush()
+
+    def _flush(self):
+        # Called with the lock held. Events appended meanwhile (e.g. by a GC pass json.dumps set off)
+        # wait for the next flush, so a busy collector cannot keep this loop going
+        if not self._file:
+            return
+        events = self._events
+        self._flushing = True
+        try:
+            for _ in range(len(events)):
+                event = events.popleft()
+                self._file.write(("" if self._first else ",\n") + json.dumps(event, separators=(",", ":")))
+                self._first = False
+            self._file.flush()
+        finally:
+            self._flushing = False
+
+    def span(self, name, startNs, endNs):
+        args = {}
+        frame = getattr(self._local, "frame", None)
+        if frame is not None:
+            args["frame"] = frame
+        self._emit({"name": name, "ph": "X", "ts": startNs / 1e3, "dur": (endNs - startNs) / 1e3,
+                    "pid": self.pid, "tid": threading.get_ident(), "args": args})
+
+    def flow(self, name, flowId, end=False):
+        """Start (or end) a flow arrow between processes, e.g. from publishing a frame to reading it."""
+        event = {"name": name, "cat": "frame", "ph": "f" if end else "s", "id": flowId,
+                 "ts": time.monotonic_ns() / 1e3, "pid": self.pid, "tid": threading.get_ident()}
+        if end:
+            event["bp"] = "e"
+        self._emit(event)
+
+    def _onGc(self, phase, info):
+        if self._flushing:
+            # The tracer's own garbage; recording it would refill the buffer being written
+            self._gcStart = 0
+            return
+        if phase == "start":
+            self._gcStart = time.monotonic_ns()
+        elif self._gcStart:
+            # Never _emit(): a collection can run inside _flush, which holds the lock
+            self._events.append({"name": "gc", "ph": "X", "ts": self._gcStart / 1e3,
+                                 "dur": (time.monotonic_ns() - self._gcStart) / 1e3, "pid": self.pid,
+                                 "tid": threading.get_ident(), "args": {"generation": info.get("generation")}})
+            self._gcStart = 0
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._file:
+                self._file.write("\n]\n")
+                self._file.close()
+                self._file = None
+
+
+def enable(directory, processName=None):
+    """Start tracing this process into `directory`. Returns the tracer."""
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    processName = processName or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+    os.makedirs(directory, exist_ok=True)
+    _tracer = Tracer(os.path.join(directory, f"trace-{processName}-{os.getpid()}.json"), processName)
+
+    # Spans must use the clock shared between processes
+    instrumentation.use_clock(time.monotonic_ns)
+    instrumentation.enable()
+    instrumentation.add_sink(_tracer.span)
+    gc.callbacks.append(_tracer._onGc)
+    atexit.register(disable)
+    return _tracer
+
+
+def enable_from_env(processName=None):
+    directory = os.environ.get("FTVC_TRACE")
+    if directory:
+        enable(directory, processName)
+    return _tracer
+
+
+def disable():
+    global _tracer
+    if _tracer is None:
+        return
+    instrumentation.remove_sink(_tracer.span)
+    if _tracer._onGc in gc.callbacks:
+        gc.callbacks.remove(_tracer._onGc)
+    _tracer.close()
+    _tracer = None
+
+
+def set_frame(sequence):
+    if _tracer is not None:
+        _tracer.setFrame(sequence)
+
+
+def flow(name, flowId, end=False):
+    if _tracer is not None:
+        _tracer.flow(name, flowId, end)
+
+
+def load_events(path):
+    with open(path) as f:
+        text = f.read().strip()
+    if not text.endswith("]"):
+        text = text.rstrip(",") + "]"  # Process was killed before closing the file
+    return json.loads(text)
+
+
+def merge(output, paths):
+    events = []
+    for path in paths:
+        events.extend(load_events(path))
+    with open(output, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] != "merge":
+        print("Usage: python traceExport.py merge OUTPUT.json TRACE.json [TRACE.json ...]")
+        sys.exit(2)
+    count = merge(sys.argv[2], sys.argv[3:])
+    print(f"Wrote {count} events to {sys.argv[2]}")
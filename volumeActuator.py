@@ -0,0 +1,125 @@
+"""Background volume actuator decoupled from the frame loop.
+
+The frame loop posts the volume it wants with `post()`, which only swaps a
+value in a one-slot mailbox. A worker thread applies the latest target through
+the (possibly slow) audio backend: targets posted while it is busy or waiting
+are coalesced so only the newest one is applied, changes within the deadband
+are dropped, and backend calls are limited to `maxRate` per second. Applied
+volumes are written to an optional VolumeState so the UI never has to read
+the volume back from the backend.
+
+Targets may carry the capture time of the frame they were derived from; the
+time from capture to the backend call is recorded in the "captureToActuation"
+histogram.
+"""
+import logging
+import threading
+import time
+
+import audio
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class VolumeActuator():
+    def __init__(self, setVolume=audio.set_volume, deadband=1, maxRate=5.0, state=None):
+        """
+        Args:
+            setVolume: Backend called with the target percent (defaults to audio.set_volume).
+            deadband: Targets within this many percent of the last applied volume are skipped.
+            maxRate: Maximum backend calls per second (None or 0 for no limit).
+            state: Optional VolumeState updated after every applied change.
+        """
+        self.setVolume = setVolume
+        self.state = state
+        self.deadband = deadband
+        self.minInterval = 1.0 / maxRate if maxRate else 0.0
+
+        self.lastApplied = None
+        self.posted = 0
+        self.applied = 0
+        self.coalesced = 0
+        self.skippedDeadband = 0
+        self.failed = 0
+
+        self._target = None
+        self._targetCaptureNs = None
+        self._lastApplyTime = 0.0
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="VolumeActuator", daemon=True)
+        self._thread.start()
+        if state is not None:
+            state.addListener(self._onVolumeChanged)
+
+    @property
+    def skipped(self):
+        """Number of posted targets that never reached the backend."""
+        return self.coalesced + self.skippedDeadband
+
+    def post(self, percent, captureNs=None):
+        """Hand a new target volume (0-100) to the actuator. Never waits for the backend.
+
+        captureNs is the time.monotonic_ns() at which the frame behind this target was captured.
+        """
+        with self._condition:
+            if self._target is not None:
+                self.coalesced += 1  # previous target was never picked up
+            self._target = percent
+            self._targetCaptureNs = captureNs
+            self.posted += 1
+            self._condition.notify()
+
+    def stats(self):
+        return {
+            "posted": self.posted,
+            "applied": self.applied,
+            "skipped": self.skipped,
+            "coalesced": self.coalesced,
+            "skippedDeadband": self.skippedDeadband,
+            "failed": self.failed,
+        }
+
+    def _onVolumeChanged(self, volume, source):
+        # Volume changed outside the actuator: measure the deadband from the real value
+        if source != "actuator":
+            self.lastApplied = volume
+
+    def stop(self, timeout=1.0):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._target is None and not self._stopped:
+                    self._condition.wait()
+                # Respect the rate limit; targets posted meanwhile replace the pending one
+                delay = self._lastApplyTime + self.minInterval - time.monotonic()
+                while delay > 0 and not self._stopped:
+                    self._condition.wait(delay)
+                    delay = self._lastApplyTime + self.minInterval - time.monotonic()
+                if self._stopped:
+                    return
+                target, self._target = self._target, None
+                captureNs = self._targetCaptureNs
+
+            if self.lastApplied is not None and abs(target - self.lastApplied) <= self.deadband:
+                self.skippedDeadband += 1
+                continue
+            try:
+                with instrumentation.span("audioActuation"):
+                    self.setVolume(target)
+                if captureNs is not None:
+                    instrumentation.record("captureToActuation", time.monotonic_ns() - captureNs)
+                self.applied += 1
+                self.lastApplied = target
+                if self.state is not None:
+                    self.state.update(target, "actuator")
+            except Exception:
+                self.failed += 1
+                logger.debug("Failed to set volume", exc_info=True)
+            self._lastApplyTime = time.monotonic()
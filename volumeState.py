@@ -0,0 +1,128 @@
+"""Last known system volume, shared between the actuator, change watchers and the UI.
+
+Reading the state is a plain attribute read, so the frame loop can draw the
+current volume every frame without touching the audio backend. The state is
+updated by:
+  - the VolumeActuator after each successful backend call
+  - a watcher thread that notices changes made outside this program: events of
+    the Linux mixer backend (see audio.open_linux_watch_mixer()), otherwise
+    polling `audio.get_volume()` as a fallback
+"""
+import logging
+import select
+import sys
+import threading
+import time
+
+import audio
+
+logger = logging.getLogger(__name__)
+
+
+class VolumeState():
+    def __init__(self, volume=0):
+        self.volume = volume
+        self.source = None
+        self.updatedAt = 0.0
+        self.updates = 0
+        self._listeners = []
+
+    def get(self):
+        return self.volume
+
+    def update(self, volume, source=None):
+        self.volume = int(volume)
+        self.source = source
+        self.updatedAt = time.monotonic()
+        self.updates += 1
+        for listener in self._listeners:
+            try:
+                listener(self.volume, source)
+            except Exception:
+                logger.debug("Volume listener failed", exc_info=True)
+
+    def addListener(self, listener):
+        """Call listener(volume, source) after every update (runs on the updating thread)."""
+        self._listeners.append(listener)
+
+
+class _WatcherThread():
+    def __init__(self, state, name):
+        self.state = state
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        self._stopped.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        raise NotImplementedError
+
+
+class PollingVolumeWatcher(_WatcherThread):
+    """Fallback: refresh the state from audio.get_volume() every `interval` seconds on a background thread."""
+
+    def __init__(self, state, interval=0.5, getVolume=audio.get_volume):
+        super().__init__(state, "PollingVolumeWatcher")
+        self.interval = interval
+        self.getVolume = getVolume
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                volume = int(self.getVolume())
+                if volume != self.state.volume:
+                    self.state.update(volume, "poll")
+            except Exception:
+                logger.debug("Volume poll failed", exc_info=True)
+            self._stopped.wait(self.interval)
+
+
+class AlsaVolumeWatcher(_WatcherThread):
+    """Update the state only when the Linux mixer backend reports a change (no polling of the volume itself)."""
+
+    def __init__(self, state, mixer=None, wakeupInterval=0.5):
+        super().__init__(state, "AlsaVolumeWatcher")
+        if mixer is None:
+            # Watch the backend audio.set_volume() uses, which may be a mixer installed with audio.set_linux_mixer()
+            mixer = audio.open_linux_watch_mixer()
+            if mixer is None:
+                raise OSError("The Linux mixer backend does not report volume changes")
+        self.mixer = mixer
+        # The installed backend is shared with audio.set_volume() and must stay open
+        self.closeMixer = not audio.is_linux_mixer(mixer)
+        # Bounds how long stop() may wait; no mixer calls happen on timeout
+        self.wakeupInterval = wakeupInterval
+
+    def _run(self):
+        poller = select.poll()
+        for fd, events in self.mixer.poll_descriptors():
+            poller.register(fd, events)
+        try:
+            self.state.update(self.mixer.get_volume(), "alsa")
+            while not self._stopped.is_set():
+                if not poller.poll(int(self.wakeupInterval * 1000)):
+                    continue
+                volume = self.mixer.get_volume()  # also consumes the pending mixer events
+                if volume != self.state.volume:
+                    self.state.update(volume, "alsa")
+        except Exception:
+            logger.debug("ALSA volume watcher failed", exc_info=True)
+        finally:
+            if self.closeMixer:
+                self.mixer.close()
+
+
+def start_volume_watcher(state, pollInterval=0.5):
+    """Start the cheapest available watcher for external volume changes and return it."""
+    if sys.platform.startswith("linux"):
+        try:
+            return AlsaVolumeWatcher(state).start()
+        except Exception as e:
+            logger.debug("Mixer events unavailable, polling get_volume instead: %s", e)
+    return PollingVolumeWatcher(state, interval=pollInterval).start()